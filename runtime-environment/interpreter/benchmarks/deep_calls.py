@@ -0,0 +1,66 @@
+"""Time calls made near and past the depth where the tree-walking backends
+stop recursing in Python, on every backend.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/deep_calls.py [calls]
+
+Past lrl.values.MAX_NESTED_CALLS nested calls, the tree and direct backends
+run the call, and every call it makes, on the VM's frame stack. The first
+two columns time a loop calling a one-line function from just above and
+just below that depth, so every call in the second crosses it; the third
+times one recursion 100000 calls deep.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+from lrl.values import MAX_NESTED_CALLS
+
+# Recurses `depth` calls deep, then calls leaf `calls` times from a loop
+NEAR_BOUNDARY = '''
+fun leaf(x) -> x + 1
+fun work(n)
+  total = 0
+  for i = 0 to n then total = leaf(total)
+  return total
+end
+fun descend(depth, n) -> if depth == 0 then 0 + work(n) else 0 + descend(depth - 1, n)
+descend({depth}, {calls})
+'''
+
+DEEP = '''
+fun s(n) -> if n == 0 then 0 else n + s(n - 1)
+s({depth})
+'''
+
+def run(backend, program):
+    start = time.perf_counter()
+    value, error = run_text('<bench>', program, backend=backend)
+    elapsed = time.perf_counter() - start
+    if error:
+        raise SystemExit(error.as_string())
+    return elapsed
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # descend and work take two nested calls below the given depth
+    above = NEAR_BOUNDARY.format(depth=MAX_NESTED_CALLS - 3, calls=calls)
+    across = NEAR_BOUNDARY.format(depth=MAX_NESTED_CALLS - 2, calls=calls)
+    print(f'{calls} calls')
+    print(f'{"backend":<8} {"above ns/call":>14} {"across ns/call":>15} {"100000 deep s":>14}')
+    for backend in BACKENDS:
+        if backend == 'python':
+            # Python backend calls are Python calls: no deeper than Python's
+            # recursion limit
+            deep = '-'
+        else:
+            deep = f'{run(backend, DEEP.format(depth=100000)):.2f}'
+        print(f'{backend:<8} {run(backend, above) / calls * 1e9:>14.1f} '
+              f'{run(backend, across) / calls * 1e9:>15.1f} {deep:>14}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Time counting keys in a Dict and testing a Set on every backend.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/dict_building.py [keys]
+
+`counts = counts + {k: counts / k + 1}` leaves the old Dict as it was, but
+only records the replaced entry on it: the new Dict takes over the shared
+Python dict (see lrl.values.Map), so each step costs O(1) whatever the size.
+Times should grow linearly with the number of keys; the programs are run
+for a quarter of them too for comparison.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+
+PROGRAMS = {
+    'count': '''
+counts = {{}}
+for i = 0 to {keys} then
+  k = i / 4
+  if k in counts then
+    counts = counts + {{k: counts / k + 1}}
+  else
+    counts = counts + {{k: 1}}
+  end
+end
+len(counts)
+''',
+    'set': '''
+seen = {{0}}
+hits = 0
+for i = 0 to {keys} then
+  if i / 2 in seen then hits = hits + 1 else seen = seen + i
+end
+hits
+''',
+}
+
+def time_program(program, backend, keys):
+    start = time.perf_counter()
+    value, error = run_text('<bench>', program.format(keys=keys), backend=backend)
+    elapsed = time.perf_counter() - start
+    if error:
+        raise SystemExit(error.as_string())
+    return elapsed
+
+def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    print(f'{"program":<8}{"keys":<8}' + ''.join(f'{backend:>9}' for backend in BACKENDS))
+    for name, program in PROGRAMS.items():
+        for count in (keys // 4, keys):
+            times = [time_program(program, backend, count) for backend in BACKENDS]
+            print(f'{name:<8}{count:<8}' + ''.join(f'{elapsed:>8.2f}s' for elapsed in times))
+
+if __name__ == '__main__':
+    main()
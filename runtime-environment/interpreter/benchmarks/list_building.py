@@ -0,0 +1,68 @@
+"""Time building a list element by element on every backend.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/list_building.py [elements]
+
+Lists never change once made, so `xs = xs + i` has to leave the old list
+as it was. It still runs in amortised constant time, as the new list
+grows the storage the old one ends at (see lrl.values.Vector). The other
+programs build the same list by concatenation and as the value of an
+expression-form loop, and drain a queue from the front.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+
+PROGRAMS = {
+    'append': '''
+xs = []
+for i = 0 to {elements} then
+  xs = xs + i
+end
+xs / -1
+''',
+    'concat': '''
+xs = []
+for i = 0 to {elements} then
+  xs = xs * [i]
+end
+xs / -1
+''',
+    'loop value': '''
+xs = for i = 0 to {elements} then i
+xs / -1
+''',
+    'queue': '''
+xs = for i = 0 to {elements} then i
+total = 0
+for i = 0 to {elements} then
+  total = total + xs / 0
+  xs = xs - 0
+end
+total
+''',
+}
+
+def time_program(program, backend, elements):
+    start = time.perf_counter()
+    value, error = run_text('<bench>', program.format(elements=elements), backend=backend)
+    elapsed = time.perf_counter() - start
+    if error:
+        raise SystemExit(error.as_string())
+    return elapsed
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f'{elements} elements')
+    print(f'{"program":<12}' + ''.join(f'{backend:>9}' for backend in BACKENDS))
+    for name, program in PROGRAMS.items():
+        times = [time_program(program, backend, elements) for backend in BACKENDS]
+        print(f'{name:<12}' + ''.join(f'{elapsed:>8.2f}s' for elapsed in times))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Count the runtime values allocated by a tight `for` loop.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/loop_allocations.py [iterations]
+
+Every Value subclass goes through Value.__init__, so wrapping it counts the
+Number/String/List/Function objects each backend creates per iteration.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+from lrl.values import Value
+
+PROGRAM = '''
+total = 0
+for i = 0 to {iterations} then
+  total = total + i * 2
+end
+'''
+
+def count_allocations(backend, iterations):
+    original_init = Value.__init__
+    count = 0
+
+    def counting_init(self):
+        nonlocal count
+        count += 1
+        original_init(self)
+
+    Value.__init__ = counting_init
+    try:
+        start = time.perf_counter()
+        value, error = run_text('<bench>', PROGRAM.format(iterations=iterations), backend=backend)
+        elapsed = time.perf_counter() - start
+    finally:
+        Value.__init__ = original_init
+    if error:
+        raise SystemExit(error.as_string())
+    return count, elapsed
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f'{"backend":<8} {"values":>10} {"per iter":>9} {"seconds":>8}')
+    for backend in BACKENDS:
+        count, elapsed = count_allocations(backend, iterations)
+        print(f'{backend:<8} {count:>10} {count / iterations:>9.2f} {elapsed:>8.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Compare arithmetic on a numeric array with the same work done by an LRL
+loop over a list.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/numeric_arrays.py [elements]
+
+`xs * 2 + 1` on an Array is two operations on unboxed array.arrays;
+the loop dispatches each operation on each element separately and reads
+each element with `/`.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+
+PROGRAMS = {
+    'list loop': '''
+xs = for i = 0 to {elements} then i
+ys = for i = 0 to {elements} then xs / i * 2 + 1
+total = 0
+for i = 0 to {elements} then total = total + ys / i
+total
+''',
+    'array': '''
+xs = array(for i = 0 to {elements} then i)
+ys = xs * 2 + 1
+sum(ys)
+''',
+}
+
+def time_program(program, backend, elements):
+    start = time.perf_counter()
+    value, error = run_text('<bench>', program.format(elements=elements), backend=backend)
+    elapsed = time.perf_counter() - start
+    if error:
+        raise SystemExit(error.as_string())
+    return elapsed
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print(f'{elements} elements')
+    print(f'{"program":<12}' + ''.join(f'{backend:>9}' for backend in BACKENDS))
+    for name, program in PROGRAMS.items():
+        times = [time_program(program, backend, elements) for backend in BACKENDS]
+        print(f'{name:<12}' + ''.join(f'{elapsed:>8.2f}s' for elapsed in times))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Time building a report line by line with `out = out + line + "\\n"`.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/string_building.py [lines]
+
+Each concatenation onto a long String adds a piece to its rope (see
+lrl.values.String), and the text is joined once, when the final
+comparison reads it. Times should grow linearly with the number of lines;
+the program is run for a quarter of them too for comparison.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+
+PROGRAM = '''
+out = ""
+for i = 0 to {lines} then
+  out = out + "report line " + "*" * 20 + "\\n"
+end
+out == ""
+'''
+
+def time_program(backend, lines):
+    start = time.perf_counter()
+    value, error = run_text('<bench>', PROGRAM.format(lines=lines), backend=backend)
+    elapsed = time.perf_counter() - start
+    if error:
+        raise SystemExit(error.as_string())
+    return elapsed
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f'{"lines":<8}' + ''.join(f'{backend:>9}' for backend in BACKENDS))
+    for count in (lines // 4, lines):
+        times = [time_program(backend, count) for backend in BACKENDS]
+        print(f'{count:<8}' + ''.join(f'{elapsed:>8.2f}s' for elapsed in times))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Time arithmetic and measure the memory a list of numbers takes on every
+backend.
+
+Run from the interpreter directory:
+
+    python3 benchmarks/unboxed_values.py [elements]
+
+Numbers and strings are plain Python values while a program runs (see
+lrl.values.box), so an operation makes no object beyond its Python result
+and a list element costs what the Python number does. The memory column
+is what the list built by the second program holds on to, per element.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lrl.runner import run_text, BACKENDS
+
+ARITHMETIC = '''
+total = 0
+for i = 0 to {elements} then
+  if i / 2 > 100 then total = total + i * 2 - 1 else total = total - 1
+end
+total
+'''
+
+LIST = '''
+for i = 0 to {elements} then i * 1.5
+'''
+
+def time_arithmetic(backend, elements):
+    start = time.perf_counter()
+    value, error = run_text('<bench>', ARITHMETIC.format(elements=elements), backend=backend)
+    elapsed = time.perf_counter() - start
+    if error:
+        raise SystemExit(error.as_string())
+    return elapsed
+
+def list_memory(backend, elements):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value, error = run_text('<bench>', LIST.format(elements=elements), backend=backend)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if error:
+        raise SystemExit(error.as_string())
+    return held
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f'{elements} elements')
+    print(f'{"backend":<8} {"ns/op":>8} {"bytes/element":>14}')
+    for backend in BACKENDS:
+        # Seven operations per iteration: the loop step, /, >, +, * and -,
+        # and the condition's test
+        elapsed = time_arithmetic(backend, elements)
+        held = list_memory(backend, elements)
+        print(f'{backend:<8} {elapsed / elements / 7 * 1e9:>8.1f} {held / elements:>14.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+from bisect import bisect_right
+from .values import box
+
+# Opcodes. Every instruction is an (opcode, argument) pair stored flat in
+# Code.instructions; instructions that take no argument carry a 0.
+LOAD_CONST = 0
+LOAD_FAST = 1
+STORE_FAST = 2
+POP_TOP = 3
+BINARY_OP = 4
+UNARY_NEG = 5
+UNARY_NOT = 6
+BUILD_LIST = 7
+NEW_LIST = 8
+LIST_APPEND = 9
+JUMP = 10
+POP_JUMP_IF_FALSE = 11
+CALL = 12
+RETURN_VALUE = 13
+MAKE_FUNCTION = 14
+FOR_PREP = 15
+FOR_ITER = 16
+POP_TO = 17
+LOAD_GLOBAL = 18
+STORE_GLOBAL = 19
+LOAD_DYNAMIC = 20
+# Quickened forms of BINARY_OP and UNARY_NEG/UNARY_NOT, written over them by
+# the VM; the argument indexes Code.quick
+BINARY_OP_QUICK = 21
+UNARY_QUICK = 22
+# Short-circuit 'and'/'or': when the top of the stack is a number that is
+# false (true), replace it with its int value and jump over the right operand
+JUMP_IF_FALSE_NUMBER = 23
+JUMP_IF_TRUE_NUMBER = 24
+# Pop `arg` key/value pairs (`arg` elements) and push a Dict (Set) of them
+BUILD_DICT = 25
+BUILD_SET = 26
+# A break (arg 0) or continue (arg 1) outside of any loop in a function ends
+# the current iteration of the loop its caller is running, as it does on the
+# tree-walking interpreters: frames are left until one whose call was made
+# in a loop body (see Code.loops)
+LOOP_ESCAPE = 27
+
+OPNAMES = {
+    LOAD_CONST: 'LOAD_CONST',
+    LOAD_FAST: 'LOAD_FAST',
+    STORE_FAST: 'STORE_FAST',
+    POP_TOP: 'POP_TOP',
+    BINARY_OP: 'BINARY_OP',
+    UNARY_NEG: 'UNARY_NEG',
+    UNARY_NOT: 'UNARY_NOT',
+    BUILD_LIST: 'BUILD_LIST',
+    NEW_LIST: 'NEW_LIST',
+    LIST_APPEND: 'LIST_APPEND',
+    JUMP: 'JUMP',
+    POP_JUMP_IF_FALSE: 'POP_JUMP_IF_FALSE',
+    CALL: 'CALL',
+    RETURN_VALUE: 'RETURN_VALUE',
+    MAKE_FUNCTION: 'MAKE_FUNCTION',
+    FOR_PREP: 'FOR_PREP',
+    FOR_ITER: 'FOR_ITER',
+    POP_TO: 'POP_TO',
+    LOAD_GLOBAL: 'LOAD_GLOBAL',
+    STORE_GLOBAL: 'STORE_GLOBAL',
+    LOAD_DYNAMIC: 'LOAD_DYNAMIC',
+    BINARY_OP_QUICK: 'BINARY_OP_QUICK',
+    UNARY_QUICK: 'UNARY_QUICK',
+    JUMP_IF_FALSE_NUMBER: 'JUMP_IF_FALSE_NUMBER',
+    JUMP_IF_TRUE_NUMBER: 'JUMP_IF_TRUE_NUMBER',
+    BUILD_DICT: 'BUILD_DICT',
+    BUILD_SET: 'BUILD_SET',
+    LOOP_ESCAPE: 'LOOP_ESCAPE',
+}
+
+# Value methods behind BINARY_OP, which the VM calls to rebuild the error of
+# a failed operation; the instruction argument indexes this tuple.
+BINARY_OPERATORS = (
+    'added_to',
+    'subbed_by',
+    'multed_by',
+    'dived_by',
+    'powed_by',
+    'get_comparison_eq',
+    'get_comparison_ne',
+    'get_comparison_lt',
+    'get_comparison_gt',
+    'get_comparison_lte',
+    'get_comparison_gte',
+    'anded_by',
+    'ored_by',
+    'contained_in',
+)
+
+class Site:
+    """Type feedback for one operator instruction: the operand types seen
+    in a row, the executions left before it is quickened, and, once it is,
+    the fast path. `opcode` and `arg` are the generic instruction, put back
+    when the site deoptimises."""
+    __slots__ = ('opcode', 'arg', 'left_type', 'right_type', 'warmup', 'deopts', 'fast', 'index')
+
+    def __init__(self, opcode, arg, warmup):
+        self.opcode = opcode
+        self.arg = arg
+        self.left_type = self.right_type = None
+        self.warmup = warmup
+        self.deopts = 0
+        self.fast = None
+        self.index = None
+
+class Code:
+    """A compiled function or program body.
+
+    `instructions` is the flat opcode/argument array and `consts` the
+    constant pool. LOAD_FAST/STORE_FAST index the frame slots laid out by
+    `scope` (function bodies only); LOAD_GLOBAL/STORE_GLOBAL/LOAD_DYNAMIC
+    index `names` and the parallel list of global `cells`. The line table
+    maps instruction offsets to the AST node they were compiled from, so
+    positions are only looked up when an error is reported. `feedback` holds
+    the Site of each operator instruction by offset, and `quick` the sites
+    whose instruction has been quickened. `loops` lists the body of each
+    loop, innermost first, as (start, end, stack depth, continue target,
+    break target) offsets.
+    """
+
+    def __init__(self, name, arg_names=(), is_function=False, scope=None):
+        self.name = name
+        self.arg_names = list(arg_names)
+        self.is_function = is_function
+        self.scope = scope
+        # FuncDefNode this code was compiled from, for function bodies
+        self.func_node = None
+        self.instructions = []
+        self.consts = []
+        self.names = []
+        self.cells = []
+        self.line_offsets = []
+        self.line_nodes = []
+        self.feedback = {}
+        self.quick = []
+        self.loops = []
+
+    def loop_at(self, offset):
+        """The innermost entry of `loops` whose body holds `offset`, or None."""
+        for loop in self.loops:
+            if loop[0] <= offset < loop[1]:
+                return loop
+        return None
+
+    def node_at(self, offset):
+        index = bisect_right(self.line_offsets, offset) - 1
+        return self.line_nodes[index] if index >= 0 else None
+
+    def disassemble(self):
+        lines = [f'<code {self.name}>']
+        for offset in range(0, len(self.instructions), 2):
+            op = self.instructions[offset]
+            arg = self.instructions[offset + 1]
+            if op == LOAD_CONST or op == MAKE_FUNCTION:
+                detail = repr(box(self.consts[arg]))
+            elif op == LOAD_FAST or op == STORE_FAST:
+                detail = self.scope.names[arg]
+            elif op == LOAD_GLOBAL or op == STORE_GLOBAL or op == LOAD_DYNAMIC:
+                detail = self.names[arg]
+            elif op == BINARY_OP:
+                detail = BINARY_OPERATORS[arg]
+            elif op == BINARY_OP_QUICK or op == UNARY_QUICK:
+                site = self.quick[arg]
+                types = ', '.join(t.__name__ for t in (site.left_type, site.right_type) if t is not None)
+                name = BINARY_OPERATORS[site.arg] if op == BINARY_OP_QUICK else OPNAMES[site.opcode]
+                detail = f'{name} ({types})'
+            elif op == CALL:
+                detail = f'{self.consts[arg][0]} args'
+            elif op == LOOP_ESCAPE:
+                detail = 'continue' if arg else 'break'
+            else:
+                detail = str(arg)
+            lines.append(f'{offset:6} {OPNAMES[op]:<20} {detail}')
+        for const in self.consts:
+            if isinstance(const, Code):
+                lines.append('')
+                lines.append(const.disassemble())
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'<code {self.name}>'
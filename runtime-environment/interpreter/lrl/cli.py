@@ -1,16 +1,46 @@
+import argparse
 import sys
-from .runner import run_file
+from .runner import run_file, BACKENDS, TIERED_BACKENDS
+from .tiering import Tiering, HOT_CALL_THRESHOLD
 
+def call_threshold(text):
+    # A whole number of calls; a negative one would promote on the first call
+    try:
+        threshold = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected a whole number, not {text!r}')
+    if threshold < 0:
+        raise argparse.ArgumentTypeError(f'must be 0 or more, not {threshold}')
+    return threshold
 
 def main():
-    if len(sys.argv) != 2:
-        print('Usage: lrl <file.lrl>')
-        sys.exit(1)
-    file_path = sys.argv[1]
+    arg_parser = argparse.ArgumentParser(prog='lrl', description='Run an LRL program.')
+    arg_parser.add_argument('file', help='path to a .lrl file')
+    arg_parser.add_argument('--backend', choices=BACKENDS, default='tree',
+                            help="execution backend: the tree-walking interpreter (default), its exception-based direct mode, "
+                                 "the bytecode VM, or the program translated to Python and compiled (whose calls, "
+                                 "other than a function's tail calls to itself, nest at most about 990 deep)")
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='memory-map the file and lex it lazily instead of reading it into memory')
+    arg_parser.add_argument('-O', dest='optimize', action='store_true',
+                            help='fold constant expressions, drop unreachable branches and precompute literals before running')
+    arg_parser.add_argument('--hot-threshold', type=call_threshold, default=HOT_CALL_THRESHOLD, metavar='N',
+                            help='calls after which the tree-walking backends compile a function to closures '
+                                 f'(default {HOT_CALL_THRESHOLD}; 0 interprets every call)')
+    arg_parser.add_argument('--tier-report', action='store_true',
+                            help='print the promoted functions and their compile times to stderr when the program ends')
+    args = arg_parser.parse_args()
+    file_path = args.file
     if not file_path.endswith('.lrl'):
         print('Only .lrl files are allowed')
         sys.exit(1)
-    value, error = run_file(file_path)
+    tiering = Tiering(args.hot_threshold)
+    value, error = run_file(file_path, args.backend, args.stream, tiering, args.optimize)
+    if args.tier_report:
+        if args.backend in TIERED_BACKENDS:
+            print(tiering.report(), file=sys.stderr)
+        else:
+            print(f'tiering: does not apply to the {args.backend} backend', file=sys.stderr)
     if error:
         print(error.as_string())
         sys.exit(1)
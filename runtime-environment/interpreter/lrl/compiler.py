@@ -0,0 +1,374 @@
+from .tokens import *
+from .bytecode import *
+from .nodes import ForNode
+from .values import NULL
+
+BINARY_OPCODE_ARGS = {
+    TT_PLUS: 0,
+    TT_MINUS: 1,
+    TT_MUL: 2,
+    TT_DIV: 3,
+    TT_POW: 4,
+    TT_EE: 5,
+    TT_NE: 6,
+    TT_LT: 7,
+    TT_GT: 8,
+    TT_LTE: 9,
+    TT_GTE: 10,
+    (TT_KEYWORD, 'and'): 11,
+    (TT_KEYWORD, 'or'): 12,
+    # 'is' behaves like equality check in this language
+    (TT_KEYWORD, 'is'): 5,
+    (TT_KEYWORD, 'in'): 13,
+}
+
+# Jump emitted after the left operand of a short-circuit operator
+SHORT_CIRCUIT_JUMPS = {
+    (TT_KEYWORD, 'and'): JUMP_IF_FALSE_NUMBER,
+    (TT_KEYWORD, 'or'): JUMP_IF_TRUE_NUMBER,
+}
+
+# Net stack effect of each opcode given its argument
+STACK_EFFECTS = {
+    LOAD_CONST: lambda arg: 1,
+    LOAD_FAST: lambda arg: 1,
+    STORE_FAST: lambda arg: 0,
+    LOAD_GLOBAL: lambda arg: 1,
+    STORE_GLOBAL: lambda arg: 0,
+    LOAD_DYNAMIC: lambda arg: 1,
+    POP_TOP: lambda arg: -1,
+    BINARY_OP: lambda arg: -1,
+    UNARY_NEG: lambda arg: 0,
+    UNARY_NOT: lambda arg: 0,
+    BUILD_LIST: lambda arg: 1 - arg,
+    BUILD_DICT: lambda arg: 1 - 2 * arg,
+    BUILD_SET: lambda arg: 1 - arg,
+    LOOP_ESCAPE: lambda arg: 0,
+    NEW_LIST: lambda arg: 1,
+    LIST_APPEND: lambda arg: -1,
+    JUMP: lambda arg: 0,
+    POP_JUMP_IF_FALSE: lambda arg: -1,
+    JUMP_IF_FALSE_NUMBER: lambda arg: 0,
+    JUMP_IF_TRUE_NUMBER: lambda arg: 0,
+    RETURN_VALUE: lambda arg: -1,
+    MAKE_FUNCTION: lambda arg: 1,
+    FOR_PREP: lambda arg: -2,
+    FOR_ITER: lambda arg: 1,
+}
+
+class Loop:
+    def __init__(self, depth):
+        # Stack depth the loop body starts from; break/continue truncate to it
+        self.depth = depth
+        self.continue_target = None
+        self.break_jumps = []
+        self.continue_jumps = []
+
+def function_code(node):
+    """The Code for the body of resolved FuncDefNode `node`, compiled the
+    first time a function made by a tree-walking interpreter is called on the
+    VM, and kept on the node."""
+    if node.code is None:
+        node.code = Compiler().compile_function(node)
+    return node.code
+
+class Compiler:
+    """Compiles an AST from lrl.nodes into Code objects for lrl.vm.VM.
+
+    The AST must have been through lrl.scope.resolve_scopes.
+    """
+
+    def __init__(self):
+        self.code = None
+        self.depth = 0
+        self.loops = []
+
+    def compile(self, node, name='<program>'):
+        return self.compile_code(node, name)
+
+    def compile_code(self, node, name, arg_names=(), is_function=False, should_auto_return=False, scope=None):
+        outer = self.code, self.depth, self.loops
+        self.code = Code(name, arg_names, is_function, scope)
+        self.depth = 0
+        self.loops = []
+        self.visit(node)
+        if is_function and not should_auto_return:
+            # Block bodies only produce a value through 'return'
+            self.emit(POP_TOP)
+            self.emit(LOAD_CONST, self.add_const(NULL))
+        self.emit(RETURN_VALUE)
+        code = self.code
+        self.code, self.depth, self.loops = outer
+        return code
+
+    # --- Emission helpers ---
+
+    def emit(self, op, arg=0, node=None):
+        code = self.code
+        offset = len(code.instructions)
+        if node is not None and (not code.line_nodes or code.line_nodes[-1] is not node):
+            code.line_offsets.append(offset)
+            code.line_nodes.append(node)
+        code.instructions.append(op)
+        code.instructions.append(arg)
+        if op == POP_TO:
+            self.depth = arg
+        elif op == CALL:
+            self.depth -= code.consts[arg][0]
+        else:
+            self.depth += STACK_EFFECTS[op](arg)
+        return offset
+
+    def emit_jump(self, op):
+        return self.emit(op, -1)
+
+    def patch_jump(self, offset, target=None):
+        self.code.instructions[offset + 1] = len(self.code.instructions) if target is None else target
+
+    def add_const(self, value):
+        self.code.consts.append(value)
+        return len(self.code.consts) - 1
+
+    def add_name(self, name, cell):
+        names = self.code.names
+        if name not in names:
+            names.append(name)
+            self.code.cells.append(cell)
+        return names.index(name)
+
+    def emit_load(self, node):
+        name = node.var_name_tok.value
+        if node.slot is not None:
+            self.emit(LOAD_FAST, node.slot, node)
+        elif node.dynamic:
+            self.emit(LOAD_DYNAMIC, self.add_name(name, node.cell), node)
+        else:
+            self.emit(LOAD_GLOBAL, self.add_name(name, node.cell), node)
+
+    def emit_store(self, node):
+        # `node` binds a name: VarAssignNode, ForNode or a named FuncDefNode
+        if node.slot is not None:
+            self.emit(STORE_FAST, node.slot)
+        else:
+            self.emit(STORE_GLOBAL, self.add_name(node.var_name_tok.value, node.cell))
+
+    def emit_null(self, node=None):
+        self.emit(LOAD_CONST, self.add_const(NULL), node)
+
+    def emit_exit(self, node):
+        # A top-level return/break/continue ends the program without a result,
+        # matching the tree-walking interpreter.
+        if self.code.is_function:
+            self.emit_null(node)
+        else:
+            self.emit(LOAD_CONST, self.add_const(None), node)
+        self.emit(RETURN_VALUE)
+        # Code after an unconditional exit is unreachable, but keep the
+        # bookkeeping consistent for whatever follows in the same block.
+        self.depth += 1
+
+    # --- Visitors ---
+
+    def visit(self, node):
+        method_name = f'compile_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_compile_method)
+        return method(node)
+
+    def no_compile_method(self, node):
+        raise Exception(f'No compile_{type(node).__name__} method defined')
+
+    def compile_NumberNode(self, node):
+        self.emit(LOAD_CONST, self.add_const(node.tok.value), node)
+
+    def compile_StringNode(self, node):
+        self.emit(LOAD_CONST, self.add_const(node.tok.value), node)
+
+    def compile_ListNode(self, node):
+        for element_node in node.element_nodes:
+            self.visit(element_node)
+        self.emit(BUILD_LIST, len(node.element_nodes), node)
+
+    def compile_DictNode(self, node):
+        for key_node, value_node in node.entry_nodes:
+            self.visit(key_node)
+            self.visit(value_node)
+        self.emit(BUILD_DICT, len(node.entry_nodes), node)
+
+    def compile_SetNode(self, node):
+        for element_node in node.element_nodes:
+            self.visit(element_node)
+        self.emit(BUILD_SET, len(node.element_nodes), node)
+
+    def compile_StatementsNode(self, node):
+        if not node.statements:
+            self.emit_null(node)
+            return
+        for index, statement in enumerate(node.statements):
+            if index > 0:
+                self.emit(POP_TOP)
+            self.visit(statement)
+
+    def compile_VarAccessNode(self, node):
+        self.emit_load(node)
+
+    def compile_VarAssignNode(self, node):
+        self.visit(node.value_node)
+        self.emit_store(node)
+
+    def compile_BinOpNode(self, node):
+        op_tok = node.op_tok
+        key = (op_tok.type, op_tok.value) if op_tok.type == TT_KEYWORD else op_tok.type
+        if key not in BINARY_OPCODE_ARGS:
+            raise Exception(f'Unknown binary operator {op_tok}')
+        self.visit(node.left_node)
+        skip_jump = None
+        if key in SHORT_CIRCUIT_JUMPS:
+            skip_jump = self.emit(SHORT_CIRCUIT_JUMPS[key], -1, node)
+        self.visit(node.right_node)
+        self.emit(BINARY_OP, BINARY_OPCODE_ARGS[key], node)
+        if skip_jump is not None:
+            self.patch_jump(skip_jump)
+
+    def compile_UnaryOpNode(self, node):
+        self.visit(node.node)
+        if node.op_tok.type == TT_MINUS:
+            self.emit(UNARY_NEG, 0, node)
+        elif node.op_tok.matches(TT_KEYWORD, 'not'):
+            self.emit(UNARY_NOT, 0, node)
+
+    def compile_IfNode(self, node):
+        base_depth = self.depth
+        end_jumps = []
+        for condition, expr, should_return_null in node.cases:
+            self.visit(condition)
+            next_jump = self.emit_jump(POP_JUMP_IF_FALSE)
+            self.compile_branch(expr, should_return_null)
+            end_jumps.append(self.emit_jump(JUMP))
+            self.patch_jump(next_jump)
+            self.depth = base_depth
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            self.compile_branch(expr, should_return_null)
+        else:
+            self.emit_null(node)
+        for offset in end_jumps:
+            self.patch_jump(offset)
+
+    def compile_branch(self, expr, should_return_null):
+        self.visit(expr)
+        if should_return_null:
+            self.emit(POP_TOP)
+            self.emit_null()
+
+    def compile_ForNode(self, node):
+        if not node.should_return_null:
+            self.emit(NEW_LIST, 0, node)
+        self.visit(node.start_value_node)
+        self.visit(node.end_value_node)
+        if node.step_value_node:
+            self.visit(node.step_value_node)
+        else:
+            self.emit(LOAD_CONST, self.add_const(1))
+        self.emit(FOR_PREP, 0, node)
+        loop = Loop(self.depth)
+        loop.continue_target = self.emit_jump(FOR_ITER)
+        exit_jump = loop.continue_target
+        self.emit_store(node)
+        self.emit(POP_TOP)
+        self.compile_loop_body(node, loop)
+        self.patch_jump(exit_jump)
+        # FOR_ITER leaves the stack untouched when it exits
+        self.depth = loop.depth
+        self.patch_loop_exits(loop)
+        # Drop the loop state, leaving the result list for expression loops
+        self.emit(POP_TOP)
+        if node.should_return_null:
+            self.emit_null()
+
+    def compile_WhileNode(self, node):
+        if not node.should_return_null:
+            self.emit(NEW_LIST, 0, node)
+        loop = Loop(self.depth)
+        loop.continue_target = len(self.code.instructions)
+        self.visit(node.condition_node)
+        exit_jump = self.emit_jump(POP_JUMP_IF_FALSE)
+        self.compile_loop_body(node, loop)
+        self.patch_jump(exit_jump)
+        self.patch_loop_exits(loop)
+        if node.should_return_null:
+            self.emit_null()
+
+    def compile_loop_body(self, node, loop):
+        self.loops.append(loop)
+        loop.body_start = len(self.code.instructions)
+        self.visit(node.body_node)
+        self.loops.pop()
+        if node.should_return_null:
+            self.emit(POP_TOP)
+        else:
+            # The result list sits below the for-loop state, if any
+            self.emit(LIST_APPEND, 2 if isinstance(node, ForNode) else 1)
+        self.emit(JUMP, loop.continue_target)
+        loop.body_end = len(self.code.instructions)
+        for offset in loop.continue_jumps:
+            self.patch_jump(offset, loop.continue_target)
+
+    def patch_loop_exits(self, loop):
+        for offset in loop.break_jumps:
+            self.patch_jump(offset)
+        # Inner loops are patched first, so Code.loops lists them first
+        self.code.loops.append((loop.body_start, loop.body_end, loop.depth, loop.continue_target,
+                                len(self.code.instructions)))
+
+    def compile_FuncDefNode(self, node):
+        self.emit(MAKE_FUNCTION, self.add_const(self.compile_function(node)), node)
+        if node.var_name_tok:
+            self.emit_store(node)
+
+    def compile_function(self, node):
+        """The Code for the body of FuncDefNode `node`."""
+        func_name = node.var_name_tok.value if node.var_name_tok else '<anonymous>'
+        arg_names = [arg_name.value for arg_name in node.arg_name_toks]
+        code = self.compile_code(node.body_node, func_name, arg_names, True, node.should_auto_return, node.scope)
+        code.func_node = node
+        return code
+
+    def compile_CallNode(self, node):
+        self.visit(node.node_to_call)
+        for arg_node in node.arg_nodes:
+            self.visit(arg_node)
+        self.emit(CALL, self.add_const((len(node.arg_nodes), node)), node)
+
+    def compile_ReturnNode(self, node):
+        if node.node_to_return:
+            self.visit(node.node_to_return)
+            if self.code.is_function:
+                self.emit(RETURN_VALUE, 0, node)
+                self.depth += 1
+                return
+            self.emit(POP_TOP)
+        self.emit_exit(node)
+
+    def compile_ContinueNode(self, node):
+        self.compile_loop_jump(node, 'continue_jumps')
+
+    def compile_BreakNode(self, node):
+        self.compile_loop_jump(node, 'break_jumps')
+
+    def compile_loop_jump(self, node, kind):
+        if not self.loops:
+            if not self.code.is_function:
+                self.emit_exit(node)
+                return
+            # Outside of a loop, break/continue reach the caller's loop
+            self.emit(LOOP_ESCAPE, int(kind == 'continue_jumps'), node)
+            self.depth += 1
+            return
+        loop = self.loops[-1]
+        depth = self.depth
+        if depth > loop.depth:
+            self.emit(POP_TO, loop.depth, node)
+        getattr(loop, kind).append(self.emit_jump(JUMP))
+        # The jump never falls through; keep the depth the statement is
+        # expected to leave behind (one value).
+        self.depth = depth + 1
@@ -0,0 +1,228 @@
+from itertools import repeat
+from .interpreter import Interpreter, loop_range, literal_entries
+from .values import List, Dict, Set, box, is_true, NUMBER_TYPES, NULL
+from .operations import OPERATION_ERRORS
+from .runtime import ReturnSignal, BreakSignal, ContinueSignal, ErrorSignal, TailCall
+from .errors import RTError
+
+class DirectInterpreter(Interpreter):
+    """Tree-walking evaluator whose visit_* methods return plain values.
+
+    Runtime errors and return/break/continue unwind as the signal
+    exceptions from lrl.runtime. They are only caught in execute_body,
+    the loop visitors and run_text, so the common path allocates no
+    RTResult and checks nothing after each child.
+    """
+
+    def execute_body(self, function, exec_ctx, res):
+        body = function.compiled
+        if body is None and self.tiering is not None:
+            body = self.tiering.record_call(function, exec_ctx)
+        if body is not None:
+            # Break and continue leave compiled bodies as signals already
+            return body(exec_ctx, res)
+        try:
+            value = self.visit(function.body_node, exec_ctx)
+        except ReturnSignal as signal:
+            return signal.value
+        except ErrorSignal as signal:
+            res.failure(signal.error)
+            return None
+        return value if function.should_auto_return else NULL
+
+    def execute_deep(self, function, exec_ctx, res):
+        if self.frame_stack is None:
+            return self.execute_body(function, exec_ctx, res)
+        # Break and continue leave the VM as signals already
+        return self.frame_stack.execute_body(function, exec_ctx, res)
+
+    def visit_constant(self, node, context):
+        return node.constant
+
+    def visit_constant_list(self, node, context):
+        return List(list(node.constant))
+
+    def visit_NumberNode(self, node, context):
+        return node.tok.value
+
+    def visit_StringNode(self, node, context):
+        return node.tok.value
+
+    def visit_ListNode(self, node, context):
+        elements = [self.visit(element_node, context) for element_node in node.element_nodes]
+        return List(elements)
+
+    def visit_DictNode(self, node, context):
+        keys = []
+        values = []
+        for key_node, value_node in node.entry_nodes:
+            keys.append(self.visit(key_node, context))
+            values.append(self.visit(value_node, context))
+        entries, error = literal_entries(node, keys, values, context)
+        if error:
+            raise ErrorSignal(error)
+        return Dict(entries)
+
+    def visit_SetNode(self, node, context):
+        elements = [self.visit(element_node, context) for element_node in node.element_nodes]
+        entries, error = literal_entries(node, elements, repeat(None), context)
+        if error:
+            raise ErrorSignal(error)
+        return Set(entries)
+
+    def visit_StatementsNode(self, node, context):
+        last_value = NULL
+        for statement in node.statements:
+            last_value = self.visit(statement, context)
+        return last_value
+
+    def visit_VarAccessNode(self, node, context):
+        if node.slot is not None:
+            value = context.slots[node.slot]
+        else:
+            value = None if node.dynamic else node.cell.value
+        if value is None:
+            var_name = node.var_name_tok.value
+            value = context.lookup(var_name)
+            if value is None:
+                raise ErrorSignal(RTError(node.pos_start, node.pos_end, f"'{var_name}' is not defined", context))
+        return value
+
+    def visit_VarAssignNode(self, node, context):
+        value = self.visit(node.value_node, context)
+        self.store(node, context, value)
+        return value
+
+    def visit_BinOpNode(self, node, context):
+        left = self.visit(node.left_node, context)
+        right = self.visit(node.right_node, context)
+        if not node.operator:
+            raise ErrorSignal(RTError(node.pos_start, node.pos_end, 'Unknown binary operator', context))
+        try:
+            result = node.operator(left, right)
+        except OPERATION_ERRORS:
+            raise ErrorSignal(self.binary_error(node, left, right, context))
+        if node.warmup:
+            self.observe(node, left.__class__, right.__class__)
+        return result
+
+    def quick_BinOpNode(self, node, context):
+        left = self.visit(node.left_node, context)
+        right = self.visit(node.right_node, context)
+        if left.__class__ is node.left_type and right.__class__ is node.right_type:
+            result = node.fast(left, right)
+            if result is not None:
+                return result
+        else:
+            self.deoptimise(node)
+        try:
+            result = node.operator(left, right)
+        except OPERATION_ERRORS:
+            raise ErrorSignal(self.binary_error(node, left, right, context))
+        return result
+
+    def visit_short_circuit(self, node, context):
+        left = self.visit(node.left_node, context)
+        if left.__class__ in NUMBER_TYPES and (left != 0) is node.decides:
+            return int(left)
+        right = self.visit(node.right_node, context)
+        try:
+            result = node.operator(left, right)
+        except OPERATION_ERRORS:
+            raise ErrorSignal(self.binary_error(node, left, right, context))
+        return result
+
+    def visit_UnaryOpNode(self, node, context):
+        number = self.visit(node.node, context)
+        if node.operator:
+            try:
+                result = node.operator(number)
+            except OPERATION_ERRORS:
+                raise ErrorSignal(self.unary_error(node, number, context))
+            if node.warmup:
+                self.observe(node, number.__class__)
+            return result
+        return number
+
+    def quick_UnaryOpNode(self, node, context):
+        number = self.visit(node.node, context)
+        if number.__class__ is node.left_type:
+            return node.fast(number)
+        self.deoptimise(node)
+        try:
+            result = node.operator(number)
+        except OPERATION_ERRORS:
+            raise ErrorSignal(self.unary_error(node, number, context))
+        return result
+
+    def visit_IfNode(self, node, context):
+        for condition, expr, should_return_null in node.cases:
+            if is_true(self.visit(condition, context)):
+                expr_value = self.visit(expr, context)
+                return NULL if should_return_null else expr_value
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            expr_value = self.visit(expr, context)
+            return NULL if should_return_null else expr_value
+        return NULL
+
+    def visit_ForNode(self, node, context):
+        start_value = self.visit(node.start_value_node, context)
+        end_value = self.visit(node.end_value_node, context)
+        if node.step_value_node:
+            step_value = self.visit(node.step_value_node, context)
+        else:
+            step_value = 1
+        elements = None if node.should_return_null else []
+        body_node = node.body_node
+        for i in loop_range(start_value, end_value, step_value):
+            self.store(node, context, i)
+            try:
+                value = self.visit(body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+            if elements is not None:
+                elements.append(value)
+        return NULL if elements is None else List(elements)
+
+    def visit_WhileNode(self, node, context):
+        elements = None if node.should_return_null else []
+        while is_true(self.visit(node.condition_node, context)):
+            try:
+                value = self.visit(node.body_node, context)
+            except ContinueSignal:
+                continue
+            except BreakSignal:
+                break
+            if elements is not None:
+                elements.append(value)
+        return NULL if elements is None else List(elements)
+
+    def visit_FuncDefNode(self, node, context):
+        func_value = self.make_function(node)
+        if node.var_name_tok:
+            self.store(node, context, func_value)
+        return func_value
+
+    def visit_CallNode(self, node, context):
+        value_to_call = self.visit(node.node_to_call, context)
+        args = [self.visit(arg_node, context) for arg_node in node.arg_nodes]
+        if node.tail:
+            return TailCall(value_to_call, args, node)
+        res = box(value_to_call).execute(args, context, node)
+        if res.error:
+            raise ErrorSignal(res.error)
+        return res.value
+
+    def visit_ReturnNode(self, node, context):
+        if node.node_to_return:
+            raise ReturnSignal(self.visit(node.node_to_return, context))
+        raise ReturnSignal(NULL)
+
+    def visit_ContinueNode(self, node, context):
+        raise ContinueSignal()
+
+    def visit_BreakNode(self, node, context):
+        raise BreakSignal()
@@ -1,17 +1,17 @@
-def string_with_arrows(text, pos_start, pos_end):
+def string_with_arrows(source, pos_start, pos_end):
     """Return a caret (^) highlighted snippet for an error span.
 
-    The implementation uses the line (ln) and column (col) metadata from
-    the provided positions to render one or more lines with carets under
-    the offending span.
+    `pos_start` and `pos_end` are offsets into `source`; they are resolved
+    to line (ln) and column (col) numbers here, when the error is rendered,
+    and one or more lines are shown with carets under the offending span.
     """
     if pos_end is None:
         pos_end = pos_start
 
-    # Clamp inputs
-    pos_end_col = getattr(pos_end, 'col', getattr(pos_start, 'col', 0))
-    start_line_idx = getattr(pos_start, 'ln', 0)
-    end_line_idx = getattr(pos_end, 'ln', start_line_idx)
+    # Resolve offsets to lines and columns
+    start_line_idx, start_col = source.line_col(pos_start)
+    end_line_idx, pos_end_col = source.line_col(pos_end)
+    text = source.text
 
     lines = text.split('\n') if isinstance(text, str) else []
     if not lines:
@@ -27,8 +27,8 @@ def string_with_arrows(text, pos_start, pos_end):
 
     result_lines = []
     for line_index in range(start_line_idx, end_line_idx + 1):
-        line_text = lines[line_index]
-        col_start = pos_start.col if line_index == start_line_idx else 0
+        line_text = lines[line_index].rstrip('\r')
+        col_start = start_col if line_index == start_line_idx else 0
         col_end = pos_end_col if line_index == end_line_idx else len(line_text)
         # Clamp to valid range for the current line
         col_start = max(0, min(col_start, len(line_text)))
@@ -55,12 +55,20 @@ def string_with_arrows(text, pos_start, pos_end):
 
     return '\n'.join(result_lines)
 
+# Identical consecutive frames shown in an execution trace before the rest of
+# the run is summarised
+TRACEBACK_REPEAT_LIMIT = 3
+
+def repeated_frames_line(count):
+    return f"  [Previous line repeated {count} more time{'s' if count != 1 else ''}]\n"
+
 class Error:
-    def __init__(self, pos_start, pos_end, error_name, details):
+    def __init__(self, pos_start, pos_end, error_name, details, source=None):
         self.pos_start = pos_start
         self.pos_end = pos_end
         self.error_name = error_name
         self.details = details
+        self.source = source
 
     def hint(self):
         """Optional short, beginner-friendly hint for how to fix the error."""
@@ -68,11 +76,12 @@ class Error:
 
     def as_string(self):
         # Friendly header
-        location = f"File '{self.pos_start.fn}', line {self.pos_start.ln + 1}, column {getattr(self.pos_start, 'col', 0) + 1}"
+        ln, col = self.source.line_col(self.pos_start)
+        location = f"File '{self.source.fn}', line {ln + 1}, column {col + 1}"
         result  = f"{self.error_name}: {self.details}\n\n"
         result += f"Where: {location}\n\n"
         # Code snippet with arrows
-        result += string_with_arrows(self.pos_start.ftxt, self.pos_start, self.pos_end)
+        result += string_with_arrows(self.source, self.pos_start, self.pos_end)
 
         # Add a very short hint if available
         hint_text = self.hint()
@@ -83,22 +92,22 @@ class Error:
         return result
 
 class IllegalCharError(Error):
-    def __init__(self, pos_start, pos_end, details):
-        super().__init__(pos_start, pos_end, 'Illegal Character', details)
+    def __init__(self, pos_start, pos_end, details, source=None):
+        super().__init__(pos_start, pos_end, 'Illegal Character', details, source)
 
     def hint(self):
         return 'There is an unsupported character at the highlighted spot. Remove or replace it with a valid character (letters, numbers, parentheses, operators, etc.).'
 
 class ExpectedCharError(Error):
-    def __init__(self, pos_start, pos_end, details):
-        super().__init__(pos_start, pos_end, 'Expected Character', details)
+    def __init__(self, pos_start, pos_end, details, source=None):
+        super().__init__(pos_start, pos_end, 'Expected Character', details, source)
 
     def hint(self):
         return 'A character (like ), ], or a colon) is missing. Check for unmatched parentheses or missing separators near the highlighted area.'
 
 class InvalidSyntaxError(Error):
-    def __init__(self, pos_start, pos_end, details=''):
-        super().__init__(pos_start, pos_end, 'Invalid Syntax', details)
+    def __init__(self, pos_start, pos_end, details='', source=None):
+        super().__init__(pos_start, pos_end, 'Invalid Syntax', details, source)
 
     def hint(self):
         # Provide a contextual, actionable hint when possible.
@@ -130,14 +139,14 @@ class InvalidSyntaxError(Error):
 
 class RTError(Error):
     def __init__(self, pos_start, pos_end, details, context):
-        super().__init__(pos_start, pos_end, 'Runtime Error', details)
+        super().__init__(pos_start, pos_end, 'Runtime Error', details, context.source if context else None)
         self.context = context
 
     def as_string(self):
         # Generate a shorter, friendly call stack then the code snippet
         result  = self.generate_traceback()
         result += f"{self.error_name}: {self.details}\n\n"
-        result += string_with_arrows(self.pos_start.ftxt, self.pos_start, self.pos_end)
+        result += string_with_arrows(self.source, self.pos_start, self.pos_end)
 
         hint_text = self.hint()
         if hint_text:
@@ -146,12 +155,13 @@ class RTError(Error):
         return result
 
     def generate_traceback(self):
-        # Build a list of frames (line number, context name).
+        # Build a list of frames (line number, context name). Each entry
+        # offset belongs to the source of the context it was recorded in.
         frames = []
         pos = self.pos_start
         ctx = self.context
         while ctx:
-            frames.append((pos.ln + 1, ctx.display_name))
+            frames.append((ctx.source.line_col(pos)[0] + 1, ctx.display_name))
             pos = ctx.parent_entry_pos
             ctx = ctx.parent
 
@@ -165,9 +175,24 @@ class RTError(Error):
 
         # Otherwise produce a short, beginner-friendly header and list frames.
         result_lines = []
-        # Show frames in the same order as before (most recent last).
-        for ln, name in reversed(frames):
-            result_lines.append(f"  Line {ln}, in {name}\n")
+        # Show frames in the same order as before (most recent last). Runs of
+        # the same frame, as deep recursion produces, are collapsed after the
+        # first few.
+        last = None
+        repeats = 0
+        for frame in reversed(frames):
+            if frame == last:
+                repeats += 1
+                if repeats >= TRACEBACK_REPEAT_LIMIT:
+                    continue
+            else:
+                if repeats >= TRACEBACK_REPEAT_LIMIT:
+                    result_lines.append(repeated_frames_line(repeats - TRACEBACK_REPEAT_LIMIT + 1))
+                last = frame
+                repeats = 0
+            result_lines.append(f"  Line {frame[0]}, in {frame[1]}\n")
+        if repeats >= TRACEBACK_REPEAT_LIMIT:
+            result_lines.append(repeated_frames_line(repeats - TRACEBACK_REPEAT_LIMIT + 1))
 
         return 'Execution trace:\n' + ''.join(result_lines)
 
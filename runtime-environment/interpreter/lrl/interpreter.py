@@ -1,22 +1,300 @@
+import operator
+from itertools import repeat
 from .tokens import *
-from .values import Number, String, List, BaseFunction, Function, BuiltInFunction
-from .runtime import RTResult
+from .nodes import walk, BinOpNode, UnaryOpNode, ListNode, DictNode
+from .scope import resolve_scopes
+from .values import (Number, String, List, Dict, Set, BaseFunction, Function, BuiltInFunction, key_of, unhashable,
+                     box, is_true, NUMBER_TYPES, NULL, ROPE_MIN_LENGTH)
+from .operations import BINARY_FUNCTIONS, UNARY_FUNCTIONS, OPERATION_ERRORS, op_not
+from .runtime import RTResult, TailCall, BreakSignal, ContinueSignal
 from .errors import RTError
 
+# Operators on Values. Evaluation uses lrl.operations instead, on run-time
+# values; these rebuild the error of an operation that failed there, from
+# operands boxed and stamped with their positions.
+BINARY_OPERATIONS = {
+    TT_PLUS: lambda left, right: left.added_to(right),
+    TT_MINUS: lambda left, right: left.subbed_by(right),
+    TT_MUL: lambda left, right: left.multed_by(right),
+    TT_DIV: lambda left, right: left.dived_by(right),
+    TT_POW: lambda left, right: left.powed_by(right),
+    TT_EE: lambda left, right: left.get_comparison_eq(right),
+    TT_NE: lambda left, right: left.get_comparison_ne(right),
+    TT_LT: lambda left, right: left.get_comparison_lt(right),
+    TT_GT: lambda left, right: left.get_comparison_gt(right),
+    TT_LTE: lambda left, right: left.get_comparison_lte(right),
+    TT_GTE: lambda left, right: left.get_comparison_gte(right),
+    (TT_KEYWORD, 'and'): lambda left, right: left.anded_by(right),
+    (TT_KEYWORD, 'or'): lambda left, right: left.ored_by(right),
+    # 'is' behaves like equality check in this language
+    (TT_KEYWORD, 'is'): lambda left, right: left.get_comparison_eq(right),
+    (TT_KEYWORD, 'in'): lambda left, right: left.contained_in(right),
+}
+
+# Operators that skip their right operand when the left one decides the
+# result: a number that is false for 'and', or true for 'or'. That number,
+# truncated to an int as the full operation would, is the result.
+SHORT_CIRCUIT = {
+    (TT_KEYWORD, 'and'): False,
+    (TT_KEYWORD, 'or'): True,
+}
+
+UNARY_OPERATIONS = {
+    TT_PLUS: lambda number: (number, None),
+    TT_MINUS: lambda number: number.multed_by(Number(-1)),
+    (TT_KEYWORD, 'not'): lambda number: number.notted(),
+}
+
+# Fast paths for quickened operator sites, by operator and operand types
+# (run-time types: int, float and str for numbers and strings). Each skips
+# the type tests of the lrl.operations helper; one returning None defers
+# to it.
+NUMBER_PAIRS = [(int, int), (int, float), (float, int), (float, float)]
+
+def for_numbers(fast):
+    return dict.fromkeys(NUMBER_PAIRS, fast)
+
+FAST_BINARY = {
+    TT_PLUS: {
+        **for_numbers(operator.add),
+        (str, str): lambda left, right: left + right if len(left) + len(right) < ROPE_MIN_LENGTH else None,
+        (String, str): lambda left, right: left.concatenated(right),
+        (String, String): lambda left, right: left.concatenated(right.value),
+        **{(List, element_type): lambda left, right: List(left.elements.appended(right))
+           for element_type in (int, float, str, List)},
+    },
+    TT_MINUS: for_numbers(operator.sub),
+    TT_MUL: {
+        **for_numbers(operator.mul),
+        (str, int): operator.mul,
+    },
+    TT_DIV: {
+        **for_numbers(lambda left, right: left / right if right != 0 else None),
+        (List, int): lambda left, right: left.elements.get(right),
+        **{(Dict, key_type): lambda left, right: left.entries.get(right) for key_type in (int, float, str)},
+    },
+    # 0 to a negative power is left to the generic path to report
+    TT_POW: for_numbers(lambda left, right: left ** right if left or right >= 0 else None),
+    TT_EE: {
+        **for_numbers(lambda left, right: 1 if left == right else 0),
+        (str, str): lambda left, right: 1 if left == right else 0,
+    },
+    TT_NE: {
+        **for_numbers(lambda left, right: 1 if left != right else 0),
+        (str, str): lambda left, right: 1 if left != right else 0,
+    },
+    TT_LT: for_numbers(lambda left, right: 1 if left < right else 0),
+    TT_GT: for_numbers(lambda left, right: 1 if left > right else 0),
+    TT_LTE: for_numbers(lambda left, right: 1 if left <= right else 0),
+    TT_GTE: for_numbers(lambda left, right: 1 if left >= right else 0),
+    (TT_KEYWORD, 'and'): for_numbers(lambda left, right: int(left and right)),
+    (TT_KEYWORD, 'or'): for_numbers(lambda left, right: int(left or right)),
+}
+FAST_BINARY[(TT_KEYWORD, 'is')] = FAST_BINARY[TT_EE]
+FAST_BINARY[(TT_KEYWORD, 'in')] = {
+    (key_type, collection_type): lambda left, right: 1 if left in right.entries else 0
+    for key_type in (int, float, str) for collection_type in (Dict, Set)
+}
+
+FAST_UNARY = {
+    TT_MINUS: {int: operator.neg, float: operator.neg},
+    (TT_KEYWORD, 'not'): {int: op_not, float: op_not},
+}
+
+# Executions in a row with the same operand types after which an operator
+# site is quickened, and the deoptimisations after which it stays generic
+QUICKEN_THRESHOLD = 8
+MAX_DEOPTS = 4
+
+def loop_range(start, end, step):
+    """The values a for loop's variable takes: from `start` while below
+    `end` (above it, for a negative step), moving by `step`. Integer bounds
+    iterate a native range; anything else is counted by hand."""
+    if type(start) is int and type(end) is int and type(step) is int and step != 0:
+        return range(start, end, step)
+    return count_by(start, end, step)
+
+def count_by(i, end, step):
+    if step >= 0:
+        while i < end:
+            yield i
+            i += step
+    else:
+        while i > end:
+            yield i
+            i += step
+
+def literal_entries(node, keys, values, context):
+    """The Python dict behind DictNode or SetNode `node`, from the values of
+    its keys (or elements) and the values to file under them. Every backend
+    evaluates all of them before checking any key. Returns (entries, error)."""
+    entries = {}
+    for index, (key, value) in enumerate(zip(keys, values)):
+        hashed = key_of(key)
+        if hashed is None:
+            key_node = node.entry_nodes[index][0] if isinstance(node, DictNode) else node.element_nodes[index]
+            return None, unhashable(box(key).copy().set_pos(key_node.pos_start, key_node.pos_end).set_context(context))
+        entries[hashed] = value
+    return entries, None
+
+def operator_key(op_tok):
+    return (TT_KEYWORD, op_tok.value) if op_tok.type == TT_KEYWORD else op_tok.type
+
 class Interpreter:
+    # lrl.tiering.Tiering that promotes hot functions, or None to interpret
+    # every call
+    tiering = None
+    # lrl.vm.VM that runs the calls nested too deep for the Python stack
+    # (see execute_deep), or None to keep recursing
+    frame_stack = None
+
     def visit(self, node, context):
-        method_name = f'visit_{type(node).__name__}'
-        method = getattr(self, method_name, self.no_visit_method)
-        return method(node, context)
+        try:
+            handler = node.handler
+        except AttributeError:
+            # Not resolved yet, e.g. an AST built without going through run_text
+            self.resolve(node, context.symbol_table)
+            handler = node.handler
+        return handler(node, context)
+
+    def resolve(self, node, global_table):
+        """Attach a visit handler to every node under `node`, and the
+        lrl.operations helper to each BinOpNode and UnaryOpNode, so evaluation needs no
+        name lookups or operator comparisons. Variables are bound to frame
+        slots and cells of `global_table` (see lrl.scope.resolve_scopes)."""
+        resolve_scopes(node, global_table)
+        return self.attach_handlers(node)
+
+    def attach_handlers(self, node):
+        """The handler and operator half of resolve, for a subtree whose
+        scopes are already resolved."""
+        for child in walk(node):
+            child.handler = getattr(self, f'visit_{type(child).__name__}', self.no_visit_method)
+            if getattr(child, 'constant', None) is not None:
+                # Literal precomputed by lrl.optimizer
+                child.handler = self.visit_constant_list if isinstance(child, ListNode) else self.visit_constant
+            elif isinstance(child, BinOpNode):
+                key = operator_key(child.op_tok)
+                child.operator = BINARY_FUNCTIONS.get(key)
+                if key in SHORT_CIRCUIT:
+                    child.decides = SHORT_CIRCUIT[key]
+                    child.handler = self.visit_short_circuit
+                    self.reset_feedback(child, None)
+                else:
+                    self.reset_feedback(child, FAST_BINARY.get(key))
+            elif isinstance(child, UnaryOpNode):
+                child.operator = UNARY_FUNCTIONS.get(operator_key(child.op_tok))
+                self.reset_feedback(child, FAST_UNARY.get(operator_key(child.op_tok)))
+        return node
+
+    # --- Quickening ---
+    #
+    # Each BinOpNode and UnaryOpNode records the operand types it sees.
+    # After QUICKEN_THRESHOLD executions with the same types, and if there
+    # is a fast path for them, its handler becomes quick_BinOpNode or
+    # quick_UnaryOpNode, which guard on those types and compute the result
+    # directly. Other operand types send the node back to the generic
+    # handler to gather feedback again.
+
+    def reset_feedback(self, node, fast_paths):
+        node.fast_paths = fast_paths
+        node.fast = None
+        node.left_type = node.right_type = None
+        node.deopts = 0
+        # Executions left before quickening; 0 stops recording feedback
+        node.warmup = QUICKEN_THRESHOLD if fast_paths else 0
+
+    def observe(self, node, left_type, right_type=None):
+        if left_type is not node.left_type or right_type is not node.right_type:
+            node.left_type, node.right_type = left_type, right_type
+            node.warmup = QUICKEN_THRESHOLD
+            return
+        node.warmup -= 1
+        if node.warmup:
+            return
+        fast = node.fast_paths.get(left_type if right_type is None else (left_type, right_type))
+        if fast is not None:
+            node.fast = fast
+            node.handler = self.quick_BinOpNode if right_type is not None else self.quick_UnaryOpNode
+
+    def deoptimise(self, node):
+        node.fast = None
+        node.left_type = node.right_type = None
+        node.deopts += 1
+        if node.deopts < MAX_DEOPTS:
+            node.warmup = QUICKEN_THRESHOLD
+        node.handler = self.visit_BinOpNode if isinstance(node, BinOpNode) else self.visit_UnaryOpNode
 
     def no_visit_method(self, node, context):
         raise Exception(f'No visit_{type(node).__name__} method defined')
 
+    def store(self, node, context, value):
+        if node.slot is not None:
+            context.slots[node.slot] = value
+        else:
+            node.cell.value = value
+
+    def execute_body(self, function, exec_ctx, res):
+        """Evaluate the body of user `function` in its frame `exec_ctx`.
+        Returns the call's value, possibly a TailCall for Function.execute to
+        make, or None with the error (or an escaping break/continue) left in
+        `res`."""
+        body = function.compiled
+        if body is None and self.tiering is not None:
+            body = self.tiering.record_call(function, exec_ctx)
+        if body is not None:
+            try:
+                return body(exec_ctx, res)
+            except BreakSignal:
+                res.success_break()
+            except ContinueSignal:
+                res.success_continue()
+            return None
+        value = res.register(self.visit(function.body_node, exec_ctx))
+        if res.func_return_value is not None:
+            return res.func_return_value
+        if res.should_return():
+            return None
+        return value if function.should_auto_return else NULL
+
+    def execute_deep(self, function, exec_ctx, res):
+        """execute_body for a call nested too deep to recurse further
+        (see lrl.values.MAX_NESTED_CALLS): the body, and every call it
+        makes, runs on the VM's frame stack."""
+        if self.frame_stack is None:
+            return self.execute_body(function, exec_ctx, res)
+        try:
+            return self.frame_stack.execute_body(function, exec_ctx, res)
+        except BreakSignal:
+            res.success_break()
+        except ContinueSignal:
+            res.success_continue()
+        return None
+
+    def stamp(self, value, node, context):
+        return box(value).copy().set_pos(node.pos_start, node.pos_end).set_context(context)
+
+    def binary_error(self, node, left, right, context):
+        # Operands carry no positions, so redo the failed operation on Value
+        # copies stamped with their nodes' spans to build the error.
+        left = self.stamp(left, node.left_node, context)
+        right = self.stamp(right, node.right_node, context)
+        return BINARY_OPERATIONS[operator_key(node.op_tok)](left, right)[1]
+
+    def unary_error(self, node, operand, context):
+        return UNARY_OPERATIONS[operator_key(node.op_tok)](self.stamp(operand, node.node, context))[1]
+
+    def visit_constant(self, node, context):
+        return RTResult().success(node.constant)
+
+    def visit_constant_list(self, node, context):
+        return RTResult().success(List(list(node.constant)))
+
     def visit_NumberNode(self, node, context):
-        return RTResult().success(Number(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end))
+        return RTResult().success(node.tok.value)
 
     def visit_StringNode(self, node, context):
-        return RTResult().success(String(node.tok.value).set_context(context).set_pos(node.pos_start, node.pos_end))
+        return RTResult().success(node.tok.value)
 
     def visit_ListNode(self, node, context):
         res = RTResult()
@@ -24,11 +302,34 @@ class Interpreter:
         for element_node in node.element_nodes:
             elements.append(res.register(self.visit(element_node, context)))
             if res.should_return(): return res
-        return res.success(List(elements).set_context(context).set_pos(node.pos_start, node.pos_end))
+        return res.success(List(elements))
+
+    def visit_DictNode(self, node, context):
+        res = RTResult()
+        keys = []
+        values = []
+        for key_node, value_node in node.entry_nodes:
+            keys.append(res.register(self.visit(key_node, context)))
+            if res.should_return(): return res
+            values.append(res.register(self.visit(value_node, context)))
+            if res.should_return(): return res
+        entries, error = literal_entries(node, keys, values, context)
+        if error: return res.failure(error)
+        return res.success(Dict(entries))
+
+    def visit_SetNode(self, node, context):
+        res = RTResult()
+        elements = []
+        for element_node in node.element_nodes:
+            elements.append(res.register(self.visit(element_node, context)))
+            if res.should_return(): return res
+        entries, error = literal_entries(node, elements, repeat(None), context)
+        if error: return res.failure(error)
+        return res.success(Set(entries))
 
     def visit_StatementsNode(self, node, context):
         res = RTResult()
-        last_value = Number.null
+        last_value = NULL
         for statement in node.statements:
             last_value = res.register(self.visit(statement, context))
             if res.should_return():
@@ -37,19 +338,22 @@ class Interpreter:
 
     def visit_VarAccessNode(self, node, context):
         res = RTResult()
-        var_name = node.var_name_tok.value
-        value = context.symbol_table.get(var_name)
-        if not value:
-            return res.failure(RTError(node.pos_start, node.pos_end, f"'{var_name}' is not defined", context))
-        value = value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
+        if node.slot is not None:
+            value = context.slots[node.slot]
+        else:
+            value = None if node.dynamic else node.cell.value
+        if value is None:
+            var_name = node.var_name_tok.value
+            value = context.lookup(var_name)
+            if value is None:
+                return res.failure(RTError(node.pos_start, node.pos_end, f"'{var_name}' is not defined", context))
         return res.success(value)
 
     def visit_VarAssignNode(self, node, context):
         res = RTResult()
-        var_name = node.var_name_tok.value
         value = res.register(self.visit(node.value_node, context))
         if res.should_return(): return res
-        context.symbol_table.set(var_name, value)
+        self.store(node, context, value)
         return res.success(value)
 
     def visit_BinOpNode(self, node, context):
@@ -59,74 +363,93 @@ class Interpreter:
         right = res.register(self.visit(node.right_node, context))
         if res.should_return(): return res
 
-        if node.op_tok.type == TT_PLUS:
-            result, error = left.added_to(right)
-        elif node.op_tok.type == TT_MINUS:
-            result, error = left.subbed_by(right)
-        elif node.op_tok.type == TT_MUL:
-            result, error = left.multed_by(right)
-        elif node.op_tok.type == TT_DIV:
-            result, error = left.dived_by(right)
-        elif node.op_tok.type == TT_POW:
-            result, error = left.powed_by(right)
-        elif node.op_tok.type == TT_EE:
-            result, error = left.get_comparison_eq(right)
-        elif node.op_tok.type == TT_NE:
-            result, error = left.get_comparison_ne(right)
-        elif node.op_tok.type == TT_LT:
-            result, error = left.get_comparison_lt(right)
-        elif node.op_tok.type == TT_GT:
-            result, error = left.get_comparison_gt(right)
-        elif node.op_tok.type == TT_LTE:
-            result, error = left.get_comparison_lte(right)
-        elif node.op_tok.type == TT_GTE:
-            result, error = left.get_comparison_gte(right)
-        elif node.op_tok.matches(TT_KEYWORD, 'and'):
-            result, error = left.anded_by(right)
-        elif node.op_tok.matches(TT_KEYWORD, 'or'):
-            result, error = left.ored_by(right)
-        elif node.op_tok.matches(TT_KEYWORD, 'is'):
-            # 'is' behaves like equality check in this language
-            result, error = left.get_comparison_eq(right)
+        if not node.operator:
+            return res.failure(RTError(node.pos_start, node.pos_end, 'Unknown binary operator', context))
+        try:
+            result = node.operator(left, right)
+        except OPERATION_ERRORS:
+            return res.failure(self.binary_error(node, left, right, context))
+        if node.warmup:
+            self.observe(node, left.__class__, right.__class__)
+        return res.success(result)
+
+    def quick_BinOpNode(self, node, context):
+        res = RTResult()
+        left = res.register(self.visit(node.left_node, context))
+        if res.should_return(): return res
+        right = res.register(self.visit(node.right_node, context))
+        if res.should_return(): return res
+        if left.__class__ is node.left_type and right.__class__ is node.right_type:
+            result = node.fast(left, right)
+            if result is not None:
+                return res.success(result)
         else:
-            result, error = None, RTError(node.pos_start, node.pos_end, 'Unknown binary operator', context)
+            self.deoptimise(node)
+        try:
+            result = node.operator(left, right)
+        except OPERATION_ERRORS:
+            return res.failure(self.binary_error(node, left, right, context))
+        return res.success(result)
 
-        if error:
-            return res.failure(error)
-        return res.success(result.set_pos(node.pos_start, node.pos_end))
+    def visit_short_circuit(self, node, context):
+        res = RTResult()
+        left = res.register(self.visit(node.left_node, context))
+        if res.should_return(): return res
+        if left.__class__ in NUMBER_TYPES and (left != 0) is node.decides:
+            return res.success(int(left))
+        right = res.register(self.visit(node.right_node, context))
+        if res.should_return(): return res
+        try:
+            result = node.operator(left, right)
+        except OPERATION_ERRORS:
+            return res.failure(self.binary_error(node, left, right, context))
+        return res.success(result)
 
     def visit_UnaryOpNode(self, node, context):
         res = RTResult()
         number = res.register(self.visit(node.node, context))
         if res.should_return(): return res
-        error = None
-        if node.op_tok.type == TT_MINUS:
-            number, error = number.multed_by(Number(-1))
-        elif node.op_tok.matches(TT_KEYWORD, 'not'):
-            number, error = number.notted()
-        if error:
-            return res.failure(error)
-        return res.success(number.set_pos(node.pos_start, node.pos_end))
+        if node.operator:
+            try:
+                result = node.operator(number)
+            except OPERATION_ERRORS:
+                return res.failure(self.unary_error(node, number, context))
+            if node.warmup:
+                self.observe(node, number.__class__)
+            return res.success(result)
+        return res.success(number)
+
+    def quick_UnaryOpNode(self, node, context):
+        res = RTResult()
+        number = res.register(self.visit(node.node, context))
+        if res.should_return(): return res
+        if number.__class__ is node.left_type:
+            return res.success(node.fast(number))
+        self.deoptimise(node)
+        try:
+            result = node.operator(number)
+        except OPERATION_ERRORS:
+            return res.failure(self.unary_error(node, number, context))
+        return res.success(result)
 
     def visit_IfNode(self, node, context):
         res = RTResult()
         for condition, expr, should_return_null in node.cases:
             condition_value = res.register(self.visit(condition, context))
             if res.should_return(): return res
-            if condition_value.is_true():
+            if is_true(condition_value):
                 expr_value = res.register(self.visit(expr, context))
                 if res.should_return(): return res
-                return res.success(Number.null if should_return_null else expr_value)
+                return res.success(NULL if should_return_null else expr_value)
         if node.else_case:
             expr, should_return_null = node.else_case
             expr_value = res.register(self.visit(expr, context))
             if res.should_return(): return res
-            return res.success(Number.null if should_return_null else expr_value)
-        return res.success(Number.null)
+            return res.success(NULL if should_return_null else expr_value)
+        return res.success(NULL)
 
     def visit_ForNode(self, node, context):
         res = RTResult()
-        elements = []
         start_value = res.register(self.visit(node.start_value_node, context))
         if res.should_return(): return res
         end_value = res.register(self.visit(node.end_value_node, context))
@@ -135,67 +458,70 @@ class Interpreter:
             step_value = res.register(self.visit(node.step_value_node, context))
             if res.should_return(): return res
         else:
-            step_value = Number(1)
-        i = start_value.value
-        if step_value.value >= 0:
-            condition = lambda: i < end_value.value
-        else:
-            condition = lambda: i > end_value.value
-        while condition():
-            context.symbol_table.set(node.var_name_tok.value, Number(i))
-            i += step_value.value
-            value = res.register(self.visit(node.body_node, context))
-            if res.should_return() and not res.loop_should_continue and not res.loop_should_break:
+            step_value = 1
+        # Statement-form loops discard their body values, so don't keep them
+        elements = None if node.should_return_null else []
+        body_node = node.body_node
+        for i in loop_range(start_value, end_value, step_value):
+            self.store(node, context, i)
+            value = res.register(self.visit(body_node, context))
+            if res.should_return():
+                if res.loop_should_continue:
+                    continue
+                if res.loop_should_break:
+                    break
                 return res
-            if res.loop_should_continue:
-                continue
-            if res.loop_should_break:
-                break
-            elements.append(value)
-        from .values import List
-        return res.success(Number.null if node.should_return_null else List(elements).set_context(context).set_pos(node.pos_start, node.pos_end))
+            if elements is not None:
+                elements.append(value)
+        return res.success(NULL if elements is None else List(elements))
 
     def visit_WhileNode(self, node, context):
         res = RTResult()
-        elements = []
+        elements = None if node.should_return_null else []
         while True:
             condition = res.register(self.visit(node.condition_node, context))
             if res.should_return(): return res
-            if not condition.is_true():
+            if not is_true(condition):
                 break
             value = res.register(self.visit(node.body_node, context))
-            if res.should_return() and not res.loop_should_continue and not res.loop_should_break:
+            if res.should_return():
+                if res.loop_should_continue:
+                    continue
+                if res.loop_should_break:
+                    break
                 return res
-            if res.loop_should_continue:
-                continue
-            if res.loop_should_break:
-                break
-            elements.append(value)
-        from .values import List
-        return res.success(Number.null if node.should_return_null else List(elements).set_context(context).set_pos(node.pos_start, node.pos_end))
+            if elements is not None:
+                elements.append(value)
+        return res.success(NULL if elements is None else List(elements))
 
-    def visit_FuncDefNode(self, node, context):
-        res = RTResult()
+    def make_function(self, node):
         func_name = node.var_name_tok.value if node.var_name_tok else None
-        body_node = node.body_node
         arg_names = [arg_name.value for arg_name in node.arg_name_toks]
-        func_value = Function(func_name, body_node, arg_names, node.should_auto_return).set_context(context).set_pos(node.pos_start, node.pos_end)
+        func_value = Function(func_name, node.body_node, arg_names, node.should_auto_return)
+        func_value.interpreter = self
+        func_value.scope = node.scope
+        func_value.definition = node
+        func_value.compiled = node.compiled
+        return func_value
+
+    def visit_FuncDefNode(self, node, context):
+        func_value = self.make_function(node)
         if node.var_name_tok:
-            context.symbol_table.set(func_name, func_value)
-        return res.success(func_value)
+            self.store(node, context, func_value)
+        return RTResult().success(func_value)
 
     def visit_CallNode(self, node, context):
         res = RTResult()
         args = []
         value_to_call = res.register(self.visit(node.node_to_call, context))
         if res.should_return(): return res
-        value_to_call = value_to_call.copy().set_pos(node.pos_start, node.pos_end)
         for arg_node in node.arg_nodes:
             args.append(res.register(self.visit(arg_node, context)))
             if res.should_return(): return res
-        return_value = res.register(value_to_call.execute(args))
+        if node.tail:
+            return res.success(TailCall(value_to_call, args, node))
+        return_value = res.register(box(value_to_call).execute(args, context, node))
         if res.should_return(): return res
-        return_value = return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
         return res.success(return_value)
 
     def visit_ReturnNode(self, node, context):
@@ -204,7 +530,7 @@ class Interpreter:
             value = res.register(self.visit(node.node_to_return, context))
             if res.should_return(): return res
         else:
-            value = Number.null
+            value = NULL
         return res.success_return(value)
 
     def visit_ContinueNode(self, node, context):
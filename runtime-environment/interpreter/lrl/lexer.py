@@ -1,179 +1,135 @@
-from .position import Position
+import re
+from .position import Source
 from .tokens import *
 from .errors import IllegalCharError, ExpectedCharError
 
-DIGITS = '0123456789'
-LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
-LETTERS_DIGITS = LETTERS + DIGITS
+# One alternative per token class, tried in order after any run of blanks
+# and an optional comment. END matches once at the end of the text and the
+# ILLEGAL catch-all guarantees every offset is covered. A carriage return
+# counts as a blank, so CRLF text lexes the same as LF text whether it was
+# read as a str or memory-mapped as bytes.
+TOKEN_PATTERNS = [
+    ('NAME', r'[A-Za-z_][A-Za-z0-9_]*'),
+    ('OP', r'->|==|!=|<=|>=|[-+*/^()\[\]{},:.=<>]'),
+    ('NEWLINE', r'[;\n]'),
+    ('NUMBER', r'[0-9]+(?:\.[0-9]*)?'),
+    ('STRING', r'"(?P<STRING_BODY>(?:[^"\\]|\\[\s\S])*)["\\]?'),
+    ('BANG', r'!'),
+    ('END', r'\Z'),
+    ('ILLEGAL', r'[\s\S]'),
+]
+TOKEN_SOURCE = (
+    r'[ \t\r]*(?:#[^\r\n]*)?[ \t\r]*(?:'
+    + '|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_PATTERNS)
+    + ')'
+)
+TOKEN_RE = re.compile(TOKEN_SOURCE)
+# Same scanner over UTF-8 bytes, for memory-mapped files
+BYTES_TOKEN_RE = re.compile(TOKEN_SOURCE.encode())
+
+OPERATORS = {
+    '+': TT_PLUS,
+    '-': TT_MINUS,
+    '*': TT_MUL,
+    '/': TT_DIV,
+    '^': TT_POW,
+    '(': TT_LPAREN,
+    ')': TT_RPAREN,
+    '[': TT_LSQUARE,
+    ']': TT_RSQUARE,
+    '{': TT_LBRACE,
+    '}': TT_RBRACE,
+    ':': TT_COLON,
+    ',': TT_COMMA,
+    '.': TT_DOT,
+    '=': TT_EQ,
+    '<': TT_LT,
+    '>': TT_GT,
+    '->': TT_ARROW,
+    '==': TT_EE,
+    '!=': TT_NE,
+    '<=': TT_LTE,
+    '>=': TT_GTE,
+}
+BYTES_OPERATORS = {op.encode(): tok_type for op, tok_type in OPERATORS.items()}
+
+ESCAPE_RE = re.compile(r'\\([\s\S])')
+ESCAPES = {'n': '\n', 't': '\t'}
+
+def unescape(match):
+    char = match.group(1)
+    return ESCAPES.get(char, char)
 
 class Lexer:
     def __init__(self, fn, text):
         self.fn = fn
         self.text = text
-        self.pos = Position(-1, 0, -1, fn, text)
-        self.current_char = None
-        self.advance()
-
-    def advance(self):
-        self.pos.advance(self.current_char)
-        self.current_char = self.text[self.pos.idx] if self.pos.idx < len(self.text) else None
-
-    def skip_comment(self):
-        # skip until end of line
-        while self.current_char is not None and self.current_char != '\n':
-            self.advance()
+        self.source = Source(fn, text)
+        self.error = None
 
     def make_tokens(self):
-        tokens = []
-        while self.current_char is not None:
-            if self.current_char in ' \t':
-                self.advance()
-            elif self.current_char == '#':
-                self.skip_comment()
-            elif self.current_char in ';\n':
-                tokens.append(Token(TT_NEWLINE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char in DIGITS:
-                tokens.append(self.make_number())
-            elif self.current_char == '"':
-                tokens.append(self.make_string())
-            elif self.current_char in LETTERS or self.current_char == '_':
-                tokens.append(self.make_identifier())
-            elif self.current_char == '+':
-                tokens.append(Token(TT_PLUS, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '-':
-                tokens.append(self.make_minus_or_arrow())
-            elif self.current_char == '*':
-                tokens.append(Token(TT_MUL, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '/':
-                tokens.append(Token(TT_DIV, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '^':
-                tokens.append(Token(TT_POW, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '(':
-                tokens.append(Token(TT_LPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ')':
-                tokens.append(Token(TT_RPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '[':
-                tokens.append(Token(TT_LSQUARE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ']':
-                tokens.append(Token(TT_RSQUARE, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == ',':
-                tokens.append(Token(TT_COMMA, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '.':
-                tokens.append(Token(TT_DOT, pos_start=self.pos))
-                self.advance()
-            elif self.current_char == '!':
-                tok, err = self.make_not_equals()
-                if err: return [], err
-                tokens.append(tok)
-            elif self.current_char == '=':
-                tokens.append(self.make_equals())
-            elif self.current_char == '<':
-                tokens.append(self.make_less_than())
-            elif self.current_char == '>':
-                tokens.append(self.make_greater_than())
-            else:
-                pos_start = self.pos.copy()
-                char = self.current_char
-                self.advance()
-                return [], IllegalCharError(pos_start, self.pos, "'" + char + "'")
-        tokens.append(Token(TT_EOF, pos_start=self.pos))
+        tokens = list(self.generate_tokens())
+        if self.error:
+            return [], self.error
         return tokens, None
 
-    def make_number(self):
-        num_str = ''
-        dot_count = 0
-        pos_start = self.pos.copy()
-        while self.current_char is not None and self.current_char in DIGITS + '.':
-            if self.current_char == '.':
-                if dot_count == 1:
-                    break
-                dot_count += 1
-            num_str += self.current_char
-            self.advance()
-        if dot_count == 0:
-            return Token(TT_INT, int(num_str), pos_start, self.pos)
-        return Token(TT_FLOAT, float(num_str), pos_start, self.pos)
+    def generate_tokens(self):
+        """Yield tokens lazily, ending with EOF.
 
-    def make_string(self):
-        s = ''
-        pos_start = self.pos.copy()
-        escape = False
-        self.advance()  # skip opening quote
-        mapping = {'n': '\n', 't': '\t'}
-        while self.current_char is not None and (self.current_char != '"' or escape):
-            if escape:
-                s += mapping.get(self.current_char, self.current_char)
-            else:
-                if self.current_char == '\\':
-                    escape = True
+        On an illegal character the generator records the error in
+        `self.error` and stops with an EOF token at the offending offset.
+        """
+        source = self.source
+        binary = source.binary
+        token_re = BYTES_TOKEN_RE if binary else TOKEN_RE
+        operators = BYTES_OPERATORS if binary else OPERATORS
+        dot = b'.' if binary else '.'
+        for match in token_re.finditer(self.text):
+            kind = match.lastgroup
+            start = match.start(kind)
+            if kind == 'NAME':
+                value = match.group(kind)
+                if binary:
+                    value = value.decode('ascii')
+                lower = value.lower()
+                if lower in KEYWORDS:
+                    yield Token(TT_KEYWORD, lower, start, match.end(), source)
                 else:
-                    s += self.current_char
-            self.advance()
-            escape = False
-        self.advance()  # skip closing quote
-        return Token(TT_STRING, s, pos_start, self.pos)
-
-    def make_identifier(self):
-        id_str = ''
-        pos_start = self.pos.copy()
-        while self.current_char is not None and (self.current_char in LETTERS_DIGITS + '_'):
-            id_str += self.current_char
-            self.advance()
-        lower = id_str.lower()
-        tok_type = TT_KEYWORD if lower in KEYWORDS else TT_IDENTIFIER
-        return Token(tok_type, lower if tok_type == TT_KEYWORD else id_str, pos_start, self.pos)
-
-    def make_minus_or_arrow(self):
-        tok_type = TT_MINUS
-        pos_start = self.pos.copy()
-        self.advance()
-        if self.current_char == '>':
-            self.advance()
-            tok_type = TT_ARROW
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_not_equals(self):
-        pos_start = self.pos.copy()
-        self.advance()
-        if self.current_char == '=':
-            self.advance()
-            return Token(TT_NE, pos_start=pos_start, pos_end=self.pos), None
-        self.advance()
-        return None, ExpectedCharError(pos_start, self.pos, "'=' (after '!')")
-
-    def make_equals(self):
-        tok_type = TT_EQ
-        pos_start = self.pos.copy()
-        self.advance()
-        if self.current_char == '=':
-            self.advance()
-            tok_type = TT_EE
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_less_than(self):
-        tok_type = TT_LT
-        pos_start = self.pos.copy()
-        self.advance()
-        if self.current_char == '=':
-            self.advance()
-            tok_type = TT_LTE
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
-
-    def make_greater_than(self):
-        tok_type = TT_GT
-        pos_start = self.pos.copy()
-        self.advance()
-        if self.current_char == '=':
-            self.advance()
-            tok_type = TT_GTE
-        return Token(tok_type, pos_start=pos_start, pos_end=self.pos)
+                    yield Token(TT_IDENTIFIER, value, start, match.end(), source)
+            elif kind == 'OP':
+                yield Token(operators[match.group(kind)], None, start, match.end(), source)
+            elif kind == 'NEWLINE':
+                # Zero width, so error carets stay on the line that ends here
+                yield Token(TT_NEWLINE, None, start, start, source)
+            elif kind == 'NUMBER':
+                text = match.group(kind)
+                if dot in text:
+                    yield Token(TT_FLOAT, float(text), start, match.end(), source)
+                else:
+                    yield Token(TT_INT, int(text), start, match.end(), source)
+            elif kind == 'STRING':
+                body = match.group('STRING_BODY')
+                if binary:
+                    body = body.decode('utf-8', 'replace')
+                if '\\' in body:
+                    body = ESCAPE_RE.sub(unescape, body)
+                yield Token(TT_STRING, body, start, match.end(), source)
+            elif kind == 'END':
+                yield Token(TT_EOF, None, start, start, source)
+                return
+            elif kind == 'BANG':
+                self.error = ExpectedCharError(start, start + 2, "'=' (after '!')", source)
+                yield Token(TT_EOF, None, start, start, source)
+                return
+            else:
+                end = start + 1
+                if binary:
+                    # Report the whole UTF-8 sequence, not its first byte
+                    while end < len(self.text) and 0x80 <= self.text[end] < 0xc0:
+                        end += 1
+                char = self.text[start:end]
+                if binary:
+                    char = bytes(char).decode('utf-8', 'replace')
+                self.error = IllegalCharError(start, end, "'" + char + "'", source)
+                yield Token(TT_EOF, None, start, start, source)
+                return
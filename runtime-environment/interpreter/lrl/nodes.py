@@ -1,46 +1,69 @@
 from dataclasses import dataclass
 
+# Every node spans [pos_start, pos_end): integer offsets into the Source its
+# tokens came from.
+
+# NumberNode, StringNode and ListNode carry a `constant` when lrl.optimizer
+# has precomputed their value: the raw Python int, float or str the program
+# runs with (see lrl.values.box), or for a list the tuple of its elements'.
+
 @dataclass
 class NumberNode:
+    constant = None
     tok: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+        self.pos_start = self.tok.start
+        self.pos_end = self.tok.end
 
 @dataclass
 class StringNode:
+    constant = None
     tok: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
-        self.pos_start = self.tok.pos_start
-        self.pos_end = self.tok.pos_end
+        self.pos_start = self.tok.start
+        self.pos_end = self.tok.end
 
 @dataclass
 class ListNode:
+    constant = None
+    element_nodes: list
+    pos_start: int
+    pos_end: int
+
+@dataclass
+class DictNode:
+    # (key node, value node) pairs, in source order
+    entry_nodes: list
+    pos_start: int
+    pos_end: int
+
+@dataclass
+class SetNode:
     element_nodes: list
-    pos_start: any
-    pos_end: any
+    pos_start: int
+    pos_end: int
 
 @dataclass
 class VarAccessNode:
     var_name_tok: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
-        self.pos_start = self.var_name_tok.pos_start
-        self.pos_end = self.var_name_tok.pos_end
+        self.pos_start = self.var_name_tok.start
+        self.pos_end = self.var_name_tok.end
 
 @dataclass
 class VarAssignNode:
     var_name_tok: any
     value_node: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
-        self.pos_start = self.var_name_tok.pos_start
+        self.pos_start = self.var_name_tok.start
         self.pos_end = self.value_node.pos_end
 
 @dataclass
@@ -48,8 +71,8 @@ class BinOpNode:
     left_node: any
     op_tok: any
     right_node: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
         self.pos_start = self.left_node.pos_start
         self.pos_end = self.right_node.pos_end
@@ -58,18 +81,18 @@ class BinOpNode:
 class UnaryOpNode:
     op_tok: any
     node: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
-        self.pos_start = self.op_tok.pos_start
+        self.pos_start = self.op_tok.start
         self.pos_end = self.node.pos_end
 
 @dataclass
 class IfNode:
     cases: list
     else_case: any
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
         self.pos_start = self.cases[0][0].pos_start
         self.pos_end = (self.else_case or self.cases[len(self.cases) - 1])[0].pos_end
@@ -82,10 +105,10 @@ class ForNode:
     step_value_node: any
     body_node: any
     should_return_null: bool
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
-        self.pos_start = self.var_name_tok.pos_start
+        self.pos_start = self.var_name_tok.start
         self.pos_end = self.body_node.pos_end
 
 @dataclass
@@ -93,8 +116,8 @@ class WhileNode:
     condition_node: any
     body_node: any
     should_return_null: bool
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
         self.pos_start = self.condition_node.pos_start
         self.pos_end = self.body_node.pos_end
@@ -105,23 +128,29 @@ class FuncDefNode:
     arg_name_toks: list
     body_node: any
     should_auto_return: bool
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
         if self.var_name_tok:
-            self.pos_start = self.var_name_tok.pos_start
+            self.pos_start = self.var_name_tok.start
         elif len(self.arg_name_toks) > 0:
-            self.pos_start = self.arg_name_toks[0].pos_start
+            self.pos_start = self.arg_name_toks[0].start
         else:
             self.pos_start = self.body_node.pos_start
         self.pos_end = self.body_node.pos_end
+        # Body compiled to closures once a function made here is hot (see
+        # lrl.tiering.Tiering)
+        self.compiled = None
+        # Body compiled to bytecode once a function made here is called on
+        # the VM by a tree-walking interpreter (see lrl.compiler.function_code)
+        self.code = None
 
 @dataclass
 class CallNode:
     node_to_call: any
     arg_nodes: list
-    pos_start: any = None
-    pos_end: any = None
+    pos_start: int = None
+    pos_end: int = None
     def __post_init__(self):
         self.pos_start = self.node_to_call.pos_start
         self.pos_end = (self.arg_nodes[-1].pos_end if len(self.arg_nodes) > 0 else self.node_to_call.pos_end)
@@ -129,21 +158,46 @@ class CallNode:
 @dataclass
 class ReturnNode:
     node_to_return: any
-    pos_start: any
-    pos_end: any
+    pos_start: int
+    pos_end: int
 
 @dataclass
 class ContinueNode:
-    pos_start: any
-    pos_end: any
+    pos_start: int
+    pos_end: int
 
 @dataclass
 class BreakNode:
-    pos_start: any
-    pos_end: any
+    pos_start: int
+    pos_end: int
 
 @dataclass
 class StatementsNode:
     statements: list
-    pos_start: any
-    pos_end: any
+    pos_start: int
+    pos_end: int
+
+def iter_child_nodes(node):
+    """Yield the direct child nodes of `node`, in source order."""
+    for name in node.__dataclass_fields__:
+        value = getattr(node, name)
+        if isinstance(value, (list, tuple)):
+            # Statement lists, call arguments, the (condition, body, flag)
+            # tuples of IfNode cases and the (key, value) pairs of DictNode
+            for item in value:
+                if isinstance(item, tuple):
+                    for part in item:
+                        if hasattr(part, 'pos_start'):
+                            yield part
+                elif hasattr(item, 'pos_start'):
+                    yield item
+        elif hasattr(value, 'pos_start'):
+            yield value
+
+def walk(node):
+    """Yield `node` and all of its descendants, without recursing in Python."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(list(iter_child_nodes(node))))
@@ -0,0 +1,180 @@
+import operator
+from .tokens import *
+from .values import (String, List, Array, Dict, Set, elementwise, NUMBER_TYPES, TEXT_TYPES)
+
+# LRL operators on values as every backend holds them while a program runs
+# (see lrl.values.box): Python numbers and strings, String ropes, and List,
+# Array, Dict, Set and function values. Each helper gives the result, or
+# raises OperationFailed, or a Python error such as ZeroDivisionError, for
+# anything the Value classes reject. The backends then rebuild the error by
+# running the Value operation on boxed copies of the operands, stamped with
+# their positions, so only failing operations ever make a Number or String.
+
+class OperationFailed(Exception):
+    pass
+
+# What the helpers raise for an operation that fails
+OPERATION_ERRORS = (OperationFailed, ArithmeticError, LookupError, TypeError, ValueError)
+
+def op_add(a, b):
+    if a.__class__ is List:
+        return List(a.elements.appended(b))
+    if a.__class__ is Dict and b.__class__ is Dict:
+        return Dict(a.entries.updated(b.entries.items()))
+    if a.__class__ is Set:
+        return Set(a.entries.updated(((dict_key(b), None),)))
+    if a.__class__ is Array or b.__class__ is Array:
+        return array_op(operator.add, a, b)
+    if a.__class__ in NUMBER_TYPES and b.__class__ in NUMBER_TYPES:
+        return a + b
+    if a.__class__ in TEXT_TYPES and b.__class__ in TEXT_TYPES:
+        # String.concatenated, keeping a short result a plain str
+        result = (a if a.__class__ is String else String(a)).concatenated(flat(b))
+        return result if result.parts is not None else result.value
+    raise OperationFailed()
+
+def flat(a):
+    return a.value if a.__class__ is String else a
+
+def dict_key(a):
+    # lrl.values.key_of, raising for a value that cannot be a key
+    if a.__class__ in NUMBER_TYPES:
+        return a
+    if a.__class__ in TEXT_TYPES:
+        return flat(a)
+    raise OperationFailed()
+
+def op_sub(a, b):
+    if a.__class__ is List and b.__class__ in NUMBER_TYPES:
+        return List(a.elements.removed(b))
+    if a.__class__ is Dict:
+        return Dict(a.entries.removed(dict_key(b)))
+    if a.__class__ is Set:
+        return Set(a.entries.removed(dict_key(b)))
+    if a.__class__ is Array or b.__class__ is Array:
+        return array_op(operator.sub, a, b)
+    if a.__class__ in NUMBER_TYPES and b.__class__ in NUMBER_TYPES:
+        return a - b
+    raise OperationFailed()
+
+def op_mul(a, b):
+    if a.__class__ is List and b.__class__ is List:
+        return List(a.elements.extended(b.elements))
+    if a.__class__ is Set and b.__class__ is Set:
+        return Set(a.entries.updated(b.entries.items()))
+    if a.__class__ is Array or b.__class__ is Array:
+        return array_op(operator.mul, a, b)
+    if (a.__class__ in NUMBER_TYPES or a.__class__ in TEXT_TYPES) and b.__class__ in NUMBER_TYPES:
+        return flat(a) * b
+    raise OperationFailed()
+
+def op_div(a, b):
+    if a.__class__ is List and b.__class__ in NUMBER_TYPES:
+        return a.elements[b]
+    if a.__class__ is Dict:
+        return a.entries[dict_key(b)]
+    if a.__class__ is Array or b.__class__ is Array:
+        return array_op(operator.truediv, a, b)
+    if a.__class__ in NUMBER_TYPES and b.__class__ in NUMBER_TYPES:
+        return a / b
+    raise OperationFailed()
+
+def array_op(operation, a, b):
+    # Array.operate on unboxed operands; errors are rebuilt by it
+    if a.__class__ is Array:
+        a = a.values
+    elif a.__class__ not in NUMBER_TYPES:
+        raise OperationFailed()
+    if b.__class__ is Array:
+        b = b.values
+    elif b.__class__ not in NUMBER_TYPES:
+        raise OperationFailed()
+    return Array(elementwise(operation, a, b))
+
+def op_pow(a, b):
+    if a.__class__ in NUMBER_TYPES and b.__class__ in NUMBER_TYPES:
+        return a ** b
+    raise OperationFailed()
+
+def op_eq(a, b):
+    if a.__class__ in NUMBER_TYPES and b.__class__ in NUMBER_TYPES:
+        return 1 if a == b else 0
+    if a.__class__ in TEXT_TYPES and b.__class__ in TEXT_TYPES:
+        return 1 if flat(a) == flat(b) else 0
+    raise OperationFailed()
+
+def op_ne(a, b):
+    return 1 - op_eq(a, b)
+
+def numbers(a, b):
+    if a.__class__ not in NUMBER_TYPES or b.__class__ not in NUMBER_TYPES:
+        raise OperationFailed()
+
+def op_lt(a, b):
+    numbers(a, b)
+    return 1 if a < b else 0
+
+def op_gt(a, b):
+    numbers(a, b)
+    return 1 if a > b else 0
+
+def op_lte(a, b):
+    numbers(a, b)
+    return 1 if a <= b else 0
+
+def op_gte(a, b):
+    numbers(a, b)
+    return 1 if a >= b else 0
+
+def op_and(a, b):
+    numbers(a, b)
+    return int(a and b)
+
+def op_or(a, b):
+    numbers(a, b)
+    return int(a or b)
+
+def op_in(a, b):
+    if b.__class__ is Dict or b.__class__ is Set:
+        return 1 if dict_key(a) in b.entries else 0
+    raise OperationFailed()
+
+def op_pos(a):
+    return a
+
+def op_neg(a):
+    if a.__class__ in NUMBER_TYPES or a.__class__ in TEXT_TYPES:
+        return flat(a) * -1
+    if a.__class__ is Array:
+        return array_op(operator.mul, a, -1)
+    raise OperationFailed()
+
+def op_not(a):
+    if a.__class__ in NUMBER_TYPES:
+        return 1 if a == 0 else 0
+    raise OperationFailed()
+
+# Helpers by operator, keyed like lrl.interpreter.BINARY_OPERATIONS
+BINARY_FUNCTIONS = {
+    TT_PLUS: op_add,
+    TT_MINUS: op_sub,
+    TT_MUL: op_mul,
+    TT_DIV: op_div,
+    TT_POW: op_pow,
+    TT_EE: op_eq,
+    TT_NE: op_ne,
+    TT_LT: op_lt,
+    TT_GT: op_gt,
+    TT_LTE: op_lte,
+    TT_GTE: op_gte,
+    (TT_KEYWORD, 'and'): op_and,
+    (TT_KEYWORD, 'or'): op_or,
+    (TT_KEYWORD, 'is'): op_eq,
+    (TT_KEYWORD, 'in'): op_in,
+}
+
+UNARY_FUNCTIONS = {
+    TT_PLUS: op_pos,
+    TT_MINUS: op_neg,
+    (TT_KEYWORD, 'not'): op_not,
+}
@@ -0,0 +1,316 @@
+import copy
+import math
+from collections import Counter
+from .tokens import *
+from .nodes import (
+    NumberNode, StringNode, ListNode, VarAccessNode, VarAssignNode, BinOpNode, UnaryOpNode, IfNode,
+    FuncDefNode, CallNode, StatementsNode, walk
+)
+from .values import String, is_true
+from .interpreter import SHORT_CIRCUIT, operator_key
+from .operations import BINARY_FUNCTIONS, UNARY_FUNCTIONS, OPERATION_ERRORS
+from .scope import bound_name
+
+# Folding a power or a repeated string must not stall or bloat the program:
+# larger results are left to run time
+MAX_FOLDED_POW = 1024
+MAX_FOLDED_STRING = 4096
+# Largest arrow function body, in nodes, that Inliner copies into callers
+MAX_INLINE_NODES = 16
+# Nodes an inlined body may contain: expressions that bind no names and make
+# no calls, so running them in the caller's frame is indistinguishable
+INLINABLE_NODES = (NumberNode, StringNode, ListNode, VarAccessNode, BinOpNode, UnaryOpNode, IfNode)
+
+class Optimizer:
+    """Rewrites a parsed program before it runs (`-O`):
+
+    - calls to small arrow functions are inlined (see Inliner);
+    - arithmetic, comparisons and logic on literals are folded into a
+      single literal spanning the original expression, as is an `and`/`or`
+      whose literal left operand decides it;
+    - if/elif cases whose condition is a literal are dropped when it is
+      false, and end the chain when it is true; `while` loops with a false
+      literal condition are removed;
+    - number and string literals, and list literals made only of them, get
+      a `constant` the tree-walking interpreters reuse instead of building
+      the value again on every evaluation.
+
+    An operation that would fail, such as a division by zero, is left in
+    place so the error is still raised at run time, at the same position.
+    """
+
+    def run(self, program):
+        """The whole pipeline, for the root node of a program."""
+        return self.optimize(Inliner().inline(program))
+
+    def optimize(self, node):
+        method = getattr(self, f'optimize_{type(node).__name__}', self.optimize_children)
+        return method(node)
+
+    def optimize_children(self, node):
+        for name in node.__dataclass_fields__:
+            value = getattr(node, name)
+            if isinstance(value, list):
+                setattr(node, name, [self.optimize_item(item) for item in value])
+            elif isinstance(value, tuple):
+                setattr(node, name, self.optimize_item(value))
+            elif hasattr(value, 'pos_start'):
+                setattr(node, name, self.optimize(value))
+        return node
+
+    def optimize_item(self, item):
+        if isinstance(item, tuple):
+            # IfNode cases and else_case, nodes followed by a should_return_null
+            # flag, and the (key, value) pairs of DictNode
+            return tuple(self.optimize(part) if hasattr(part, 'pos_start') else part for part in item)
+        return self.optimize(item) if hasattr(item, 'pos_start') else item
+
+    # --- Literals ---
+
+    def optimize_NumberNode(self, node):
+        node.constant = node.tok.value
+        return node
+
+    def optimize_StringNode(self, node):
+        node.constant = node.tok.value
+        return node
+
+    def optimize_ListNode(self, node):
+        self.optimize_children(node)
+        if all(isinstance(element, (NumberNode, StringNode)) for element in node.element_nodes):
+            # Numbers and strings are never changed in place, so each
+            # evaluation only needs a new list holding the same values
+            node.constant = tuple(element.constant for element in node.element_nodes)
+        return node
+
+    def literal(self, value, node):
+        """A literal for run-time value `value` spanning `node`, or None if
+        there is none."""
+        if value.__class__ is String:
+            value = value.value
+        if value.__class__ is str:
+            tok_type = TT_STRING
+        elif value.__class__ is int:
+            tok_type = TT_INT
+        elif value.__class__ is float and math.isfinite(value):
+            tok_type = TT_FLOAT
+        else:
+            return None
+        tok = Token(tok_type, value, node.pos_start, node.pos_end)
+        return self.optimize(NumberNode(tok) if tok_type != TT_STRING else StringNode(tok))
+
+    def null(self, pos_start, pos_end):
+        return self.optimize(NumberNode(Token(TT_INT, 0, pos_start, pos_end)))
+
+    # --- Folding ---
+
+    def optimize_BinOpNode(self, node):
+        self.optimize_children(node)
+        left, right = node.left_node, node.right_node
+        key = operator_key(node.op_tok)
+        if key in SHORT_CIRCUIT and isinstance(left, NumberNode) and (left.tok.value != 0) is SHORT_CIRCUIT[key]:
+            # The right operand would never run
+            return self.literal(int(left.tok.value), node)
+        if not isinstance(left, (NumberNode, StringNode)) or not isinstance(right, (NumberNode, StringNode)):
+            return node
+        operation = BINARY_FUNCTIONS.get(key)
+        if operation is None or not self.small_enough(node.op_tok, left.tok.value, right.tok.value):
+            return node
+        try:
+            result = operation(left.constant, right.constant)
+        except OPERATION_ERRORS:
+            return node
+        return self.literal(result, node) or node
+
+    def small_enough(self, op_tok, left, right):
+        if op_tok.type == TT_POW:
+            return isinstance(left, (int, float)) and isinstance(right, (int, float)) and abs(right) <= MAX_FOLDED_POW
+        if op_tok.type == TT_MUL and isinstance(left, str):
+            return isinstance(right, int) and len(left) * right <= MAX_FOLDED_STRING
+        return True
+
+    def optimize_UnaryOpNode(self, node):
+        self.optimize_children(node)
+        operand = node.node
+        if not isinstance(operand, (NumberNode, StringNode)):
+            return node
+        operation = UNARY_FUNCTIONS.get(operator_key(node.op_tok))
+        if operation is None:
+            return node
+        try:
+            result = operation(operand.constant)
+        except OPERATION_ERRORS:
+            return node
+        return self.literal(result, node) or node
+
+    # --- Unreachable branches ---
+
+    def truth(self, node):
+        """True or False for a literal condition, None for anything else."""
+        if isinstance(node, (NumberNode, StringNode)):
+            return is_true(node.constant)
+        return None
+
+    def optimize_IfNode(self, node):
+        self.optimize_children(node)
+        cases = []
+        else_case = node.else_case
+        for condition, expr, should_return_null in node.cases:
+            truth = self.truth(condition)
+            if truth is False:
+                continue
+            if truth is True:
+                else_case = (expr, should_return_null)
+                break
+            cases.append((condition, expr, should_return_null))
+        if cases:
+            node.cases = cases
+            node.else_case = else_case
+            return node
+        if else_case is None:
+            return self.null(node.pos_start, node.pos_end)
+        expr, should_return_null = else_case
+        if not should_return_null:
+            return expr
+        return StatementsNode([expr, self.null(expr.pos_end, expr.pos_end)], expr.pos_start, expr.pos_end)
+
+    def optimize_WhileNode(self, node):
+        self.optimize_children(node)
+        if self.truth(node.condition_node) is not False:
+            return node
+        if node.should_return_null:
+            return self.null(node.pos_start, node.pos_end)
+        return self.optimize(ListNode([], node.pos_start, node.pos_end))
+
+    def optimize_StatementsNode(self, node):
+        statements = []
+        for statement in node.statements:
+            statement = self.optimize(statement)
+            # Branches left behind by a removed if are spliced in
+            if isinstance(statement, StatementsNode) and statement.statements:
+                statements.extend(statement.statements)
+            else:
+                statements.append(statement)
+        node.statements = statements
+        return node
+
+class Inliner:
+    """Replaces calls to small arrow functions with a copy of their body.
+
+    LRL looks callees up by name when the call runs, so a function is only
+    inlined when nothing can rebind its name: it is defined by a top-level
+    `fun name(...) -> expr` and the name is bound nowhere else in the
+    program, not even as a parameter or a local. Only calls after the
+    definition are inlined, and only with the right number of arguments.
+    The body must be a small expression that assigns nothing and calls
+    nothing (calls in it are inlined first where possible), so it cannot
+    recurse or observe the missing frame.
+
+    Each argument is stored in a fresh temporary before the body runs, in
+    order, as the call would have evaluated them; literal arguments are
+    substituted directly. The copied nodes keep the positions of the
+    original body, so errors still point into the function, although the
+    execution trace no longer lists a frame for it.
+    """
+
+    def inline(self, program):
+        if not isinstance(program, StatementsNode):
+            return program
+        self.bindings = Counter()
+        self.names = set()
+        for node in walk(program):
+            name = bound_name(node)
+            if name is not None:
+                self.bindings[name] += 1
+            if isinstance(node, FuncDefNode):
+                self.bindings.update(arg_tok.value for arg_tok in node.arg_name_toks)
+            if isinstance(node, (VarAccessNode, VarAssignNode)) or name is not None:
+                self.names.add(node.var_name_tok.value)
+        self.names.update(self.bindings)
+        self.functions = {}
+        self.temps = 0
+        statements = []
+        for statement in program.statements:
+            statement = self.rewrite(statement)
+            if self.inlinable(statement):
+                self.functions[statement.var_name_tok.value] = statement
+            statements.append(statement)
+        program.statements = statements
+        return program
+
+    def inlinable(self, node):
+        if not isinstance(node, FuncDefNode) or not node.var_name_tok or not node.should_auto_return:
+            return False
+        arg_names = [arg_tok.value for arg_tok in node.arg_name_toks]
+        if self.bindings[node.var_name_tok.value] != 1 or len(set(arg_names)) != len(arg_names):
+            return False
+        body = list(walk(node.body_node))
+        return len(body) <= MAX_INLINE_NODES and all(isinstance(child, INLINABLE_NODES) for child in body)
+
+    def rewrite(self, node):
+        """Inline the calls under `node`, returning its replacement."""
+        for name in node.__dataclass_fields__:
+            value = getattr(node, name)
+            if isinstance(value, list):
+                setattr(node, name, [self.rewrite_item(item) for item in value])
+            elif isinstance(value, tuple):
+                setattr(node, name, self.rewrite_item(value))
+            elif hasattr(value, 'pos_start'):
+                setattr(node, name, self.rewrite(value))
+        if isinstance(node, CallNode) and isinstance(node.node_to_call, VarAccessNode):
+            function = self.functions.get(node.node_to_call.var_name_tok.value)
+            if function is not None and len(function.arg_name_toks) == len(node.arg_nodes):
+                return self.expand(function, node)
+        return node
+
+    def rewrite_item(self, item):
+        if isinstance(item, tuple):
+            return tuple(self.rewrite(part) if hasattr(part, 'pos_start') else part for part in item)
+        return self.rewrite(item) if hasattr(item, 'pos_start') else item
+
+    def expand(self, function, call):
+        bindings = {}
+        statements = []
+        for arg_tok, arg_node in zip(function.arg_name_toks, call.arg_nodes):
+            if isinstance(arg_node, (NumberNode, StringNode)):
+                bindings[arg_tok.value] = arg_node
+                continue
+            temp = self.temp(function.var_name_tok.value, arg_tok.value)
+            statements.append(VarAssignNode(Token(TT_IDENTIFIER, temp, arg_node.pos_start, arg_node.pos_start), arg_node))
+            bindings[arg_tok.value] = temp
+        body = self.copy(function.body_node, bindings)
+        if not statements:
+            return body
+        return StatementsNode(statements + [body], call.pos_start, call.pos_end)
+
+    def temp(self, function_name, arg_name):
+        while True:
+            self.temps += 1
+            name = f'_{function_name}{self.temps}_{arg_name}'
+            if name not in self.names:
+                return name
+
+    def copy(self, node, bindings):
+        """A copy of body `node` with its parameters replaced by `bindings`:
+        the temporary holding each argument, or the literal argument."""
+        if isinstance(node, VarAccessNode) and node.var_name_tok.value in bindings:
+            binding = bindings[node.var_name_tok.value]
+            tok = node.var_name_tok
+            if isinstance(binding, str):
+                return VarAccessNode(Token(TT_IDENTIFIER, binding, tok.start, tok.end, tok.source))
+            return type(binding)(Token(binding.tok.type, binding.tok.value, tok.start, tok.end, tok.source))
+        node = copy.copy(node)
+        for name in node.__dataclass_fields__:
+            value = getattr(node, name)
+            if isinstance(value, list):
+                setattr(node, name, [self.copy_item(item, bindings) for item in value])
+            elif isinstance(value, tuple):
+                setattr(node, name, self.copy_item(value, bindings))
+            elif hasattr(value, 'pos_start'):
+                setattr(node, name, self.copy(value, bindings))
+        return node
+
+    def copy_item(self, item, bindings):
+        if isinstance(item, tuple):
+            return tuple(self.copy(part, bindings) if hasattr(part, 'pos_start') else part for part in item)
+        return self.copy(item, bindings) if hasattr(item, 'pos_start') else item
@@ -1,414 +1,361 @@
+from collections import deque
 from .tokens import *
 from .parse_result import ParseResult
 from .nodes import *
 from .errors import InvalidSyntaxError
 
+# Tokens that can begin an expression or a statement. Every grammar rule picks
+# its alternative from the current token (plus one token of lookahead for
+# assignments and 'else if'), so the parser never backtracks.
+EXPR_START_TYPES = (TT_INT, TT_FLOAT, TT_STRING, TT_IDENTIFIER, TT_LPAREN, TT_LSQUARE, TT_LBRACE, TT_PLUS, TT_MINUS)
+EXPR_START_KEYWORDS = ('if', 'for', 'while', 'fun', 'not')
+STATEMENT_START_KEYWORDS = EXPR_START_KEYWORDS + ('return', 'continue', 'break')
+
+# Messages for a construct that cannot start at the current token
+STATEMENT_EXPECTED = "Expected 'return', 'continue', 'break', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[', '{' or 'not'"
+EXPR_EXPECTED = "Expected 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[', '{' or 'not'"
+COMP_EXPR_EXPECTED = "Expected int, float, identifier, '+', '-', '(', '[', '{', 'if', 'for', 'while', 'fun' or 'not'"
+ATOM_EXPECTED = "Expected int, float, identifier, '+', '-', '(', '[', '{', 'if', 'for', 'while', 'fun'"
+ARG_EXPECTED = "Expected ')', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[', '{' or 'not'"
+ELEMENT_EXPECTED = "Expected ']', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[', '{' or 'not'"
+ENTRY_EXPECTED = "Expected '}', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[', '{' or 'not'"
+
+# (left, right) binding powers of the binary operators. Left-associative
+# operators bind their right operand one step tighter; '^' is
+# right-associative, and its right operand may carry a unary sign.
+BINDING_POWERS = {
+    (TT_KEYWORD, 'or'): (1, 2),
+    (TT_KEYWORD, 'and'): (2, 3),
+    TT_EE: (4, 5),
+    TT_NE: (4, 5),
+    TT_LT: (4, 5),
+    TT_GT: (4, 5),
+    TT_LTE: (4, 5),
+    TT_GTE: (4, 5),
+    (TT_KEYWORD, 'is'): (4, 5),
+    (TT_KEYWORD, 'in'): (4, 5),
+    TT_PLUS: (6, 7),
+    TT_MINUS: (6, 7),
+    TT_MUL: (8, 9),
+    TT_DIV: (8, 9),
+    TT_POW: (11, 10),
+}
+# Binding power of the operands of the prefix operators. 'not' takes a whole
+# comparison and is only allowed where one could start.
+NOT_BP = 3
+UNARY_BP = 10
+
+class ParseError(Exception):
+    """Raised at the point a parse fails; carries the InvalidSyntaxError."""
+
+    def __init__(self, error):
+        super().__init__(error.details)
+        self.error = error
+
 class Parser:
+    """Predictive recursive-descent parser.
+
+    `tokens` may be a list or any iterator (such as Lexer.generate_tokens());
+    tokens are pulled on demand through a small lookahead buffer. Rules return
+    nodes directly and raise ParseError on the first syntax error, which
+    parse() turns into a ParseResult.
+    """
+
     def __init__(self, tokens):
-        self.tokens = tokens
-        self.tok_idx = -1
+        self.tokens = iter(tokens)
+        self.lookahead = deque()
+        self.current_tok = None
         self.advance()
 
     def advance(self):
-        self.tok_idx += 1
-        self.update_current_tok()
+        if self.lookahead:
+            self.current_tok = self.lookahead.popleft()
+        else:
+            # Stay on EOF once the stream is exhausted
+            self.current_tok = next(self.tokens, self.current_tok)
         return self.current_tok
 
     def peek(self, offset=1):
-        idx = self.tok_idx + offset
-        if 0 <= idx < len(self.tokens):
-            return self.tokens[idx]
-        return None
-
-    def reverse(self, amount=1):
-        self.tok_idx -= amount
-        self.update_current_tok()
-        return self.current_tok
-
-    def update_current_tok(self):
-        if self.tok_idx >= 0 and self.tok_idx < len(self.tokens):
-            self.current_tok = self.tokens[self.tok_idx]
+        while len(self.lookahead) < offset:
+            tok = next(self.tokens, None)
+            if tok is None:
+                return None
+            self.lookahead.append(tok)
+        return self.lookahead[offset - 1]
+
+    def starts_expr(self, tok):
+        return tok.type in EXPR_START_TYPES or (tok.type == TT_KEYWORD and tok.value in EXPR_START_KEYWORDS)
+
+    def starts_statement(self, tok):
+        return tok.type in EXPR_START_TYPES or (tok.type == TT_KEYWORD and tok.value in STATEMENT_START_KEYWORDS)
+
+    def fail(self, details, tok=None):
+        tok = tok or self.current_tok
+        raise ParseError(InvalidSyntaxError(tok.start, tok.end, details, tok.source))
+
+    def expect_keyword(self, value):
+        if not self.current_tok.matches(TT_KEYWORD, value):
+            self.fail(f"Expected '{value}'")
+        self.advance()
 
     def parse(self):
-        res = self.statements()
-        if not res.error and self.current_tok.type != TT_EOF:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Token cannot appear after previous tokens"
-            ))
-        return res
+        res = ParseResult()
+        try:
+            node = self.statements()
+            if self.current_tok.type != TT_EOF:
+                self.fail("Token cannot appear after previous tokens")
+        except ParseError as e:
+            return res.failure(e.error)
+        return res.success(node)
 
     def statements(self):
-        res = ParseResult()
         statements = []
-        pos_start = self.current_tok.pos_start.copy()
+        pos_start = self.current_tok.start
 
         while self.current_tok.type == TT_NEWLINE:
-            res.register_advancement()
             self.advance()
 
-        statement = res.register(self.statement())
-        if res.error: return res
-        statements.append(statement)
+        statements.append(self.statement())
 
-        while True:
-            newline_count = 0
+        while self.current_tok.type == TT_NEWLINE:
             while self.current_tok.type == TT_NEWLINE:
-                res.register_advancement()
                 self.advance()
-                newline_count += 1
-            if newline_count == 0:
+            if not self.starts_statement(self.current_tok):
                 break
-            statement = res.try_register(self.statement())
-            if not statement:
-                self.reverse(res.to_reverse_count)
-                break
-            statements.append(statement)
-
-        # Determine a safe pos_end for the statements node
-        if getattr(self.current_tok, 'pos_end', None) is not None:
-            pos_end = self.current_tok.pos_end.copy()
-        elif getattr(self.current_tok, 'pos_start', None) is not None:
-            pos_end = self.current_tok.pos_start.copy()
-        else:
-            pos_end = pos_start
+            statements.append(self.statement())
 
-        return res.success(StatementsNode(
-            statements,
-            pos_start,
-            pos_end
-        ))
+        return StatementsNode(statements, pos_start, self.current_tok.end)
 
     def statement(self):
-        res = ParseResult()
-        pos_start = self.current_tok.pos_start.copy()
-
-        if self.current_tok.matches(TT_KEYWORD, 'return'):
-            res.register_advancement()
-            self.advance()
-            expr = res.try_register(self.expr())
-            if not expr:
-                self.reverse(res.to_reverse_count)
-            return res.success(ReturnNode(expr, pos_start, self.current_tok.pos_start.copy()))
-
-        if self.current_tok.matches(TT_KEYWORD, 'continue'):
-            res.register_advancement()
-            self.advance()
-            return res.success(ContinueNode(pos_start, self.current_tok.pos_start.copy()))
+        tok = self.current_tok
+        pos_start = tok.start
 
-        if self.current_tok.matches(TT_KEYWORD, 'break'):
-            res.register_advancement()
-            self.advance()
-            return res.success(BreakNode(pos_start, self.current_tok.pos_start.copy()))
+        if tok.type == TT_KEYWORD:
+            if tok.value == 'return':
+                self.advance()
+                expr = self.expr() if self.starts_expr(self.current_tok) else None
+                return ReturnNode(expr, pos_start, self.current_tok.start)
+            if tok.value == 'continue':
+                self.advance()
+                return ContinueNode(pos_start, self.current_tok.start)
+            if tok.value == 'break':
+                self.advance()
+                return BreakNode(pos_start, self.current_tok.start)
 
-        expr = res.register(self.expr())
-        if res.error:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'return', 'continue', 'break', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[' or 'not'"
-            ))
-        return res.success(expr)
+        if not self.starts_expr(tok):
+            self.fail(STATEMENT_EXPECTED)
+        return self.expr()
 
-    def expr(self):
-        res = ParseResult()
+    def expr(self, expected=EXPR_EXPECTED):
+        tok = self.current_tok
 
         # dynamic assignment: IDENTIFIER EQ expr
-        if self.current_tok.type == TT_IDENTIFIER:
+        if tok.type == TT_IDENTIFIER:
             next_tok = self.peek()
             if next_tok and next_tok.type == TT_EQ:
-                var_name = self.current_tok
-                res.register_advancement()
                 self.advance()
-                res.register_advancement()
                 self.advance()
-                expr = res.register(self.expr())
-                if res.error: return res
-                return res.success(VarAssignNode(var_name, expr))
-
-        node = res.register(self.comp_expr())
-        if res.error:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[' or 'not'"
-            ))
-        return res.success(node)
-
-    def comp_expr(self):
-        res = ParseResult()
-
-        if self.current_tok.matches(TT_KEYWORD, 'not'):
-            op_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-            node = res.register(self.comp_expr())
-            if res.error: return res
-            return res.success(UnaryOpNode(op_tok, node))
-
-        node = res.register(self.bin_op(self.arith_expr, (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE, (TT_KEYWORD,'is'))))
-        if res.error:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected int, float, identifier, '+', '-', '(', '[', 'if', 'for', 'while', 'fun' or 'not'"
-            ))
-        return res.success(node)
+                return VarAssignNode(tok, self.expr())
 
-    def arith_expr(self):
-        return self.bin_op(self.term, (TT_PLUS, TT_MINUS))
+        if not self.starts_expr(tok):
+            self.fail(expected)
+        return self.binary_expr()
 
-    def term(self):
-        return self.bin_op(self.factor, (TT_MUL, TT_DIV))
+    def binary_expr(self, min_bp=0):
+        """Parse operators and operands by precedence climbing.
 
-    def factor(self):
-        res = ParseResult()
+        Only operators whose left binding power is at least `min_bp` are
+        consumed; each right operand is parsed with the operator's right
+        binding power, so one loop covers every precedence level.
+        """
         tok = self.current_tok
-        if tok.type in (TT_PLUS, TT_MINUS):
-            res.register_advancement()
+        if tok.type == TT_PLUS or tok.type == TT_MINUS:
+            self.advance()
+            left = UnaryOpNode(tok, self.binary_expr(UNARY_BP))
+        elif tok.type == TT_KEYWORD and tok.value == 'not':
+            if min_bp > NOT_BP:
+                self.fail(ATOM_EXPECTED)
             self.advance()
-            factor = res.register(self.factor())
-            if res.error: return res
-            return res.success(UnaryOpNode(tok, factor))
-        return self.power()
+            if not self.starts_expr(self.current_tok):
+                self.fail(COMP_EXPR_EXPECTED)
+            left = UnaryOpNode(tok, self.binary_expr(NOT_BP))
+        else:
+            left = self.call()
 
-    def power(self):
-        return self.bin_op(self.call, (TT_POW,), self.factor)
+        while True:
+            op_tok = self.current_tok
+            if op_tok.type == TT_IDENTIFIER and op_tok.value.lower() == 'in':
+                # 'in' is only a keyword after an operand, so it can still
+                # name a variable
+                op_tok = Token(TT_KEYWORD, 'in', op_tok.start, op_tok.end, op_tok.source)
+            if op_tok.type == TT_KEYWORD:
+                binding_power = BINDING_POWERS.get((TT_KEYWORD, op_tok.value))
+            else:
+                binding_power = BINDING_POWERS.get(op_tok.type)
+            if binding_power is None or binding_power[0] < min_bp:
+                return left
+            self.advance()
+            if op_tok.type == TT_KEYWORD and op_tok.value != 'is' and not self.starts_expr(self.current_tok):
+                self.fail(COMP_EXPR_EXPECTED)
+            left = BinOpNode(left, op_tok, self.binary_expr(binding_power[1]))
 
     def call(self):
-        res = ParseResult()
-        atom = res.register(self.atom())
-        if res.error: return res
-
-        if self.current_tok.type == TT_LPAREN:
-            res.register_advancement()
+        atom = self.atom()
+        if self.current_tok.type != TT_LPAREN:
+            return atom
+        self.advance()
+        arg_nodes = []
+        if self.current_tok.type == TT_RPAREN:
             self.advance()
-            arg_nodes = []
-            if self.current_tok.type == TT_RPAREN:
-                res.register_advancement()
-                self.advance()
-            else:
-                arg_nodes.append(res.register(self.expr()))
-                if res.error:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        "Expected ')', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[' or 'not'"
-                    ))
-                while self.current_tok.type == TT_COMMA:
-                    res.register_advancement()
-                    self.advance()
-                    arg_nodes.append(res.register(self.expr()))
-                    if res.error: return res
-                if self.current_tok.type != TT_RPAREN:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        "Expected ',' or ')'"
-                    ))
-                res.register_advancement()
-                self.advance()
-            return res.success(CallNode(atom, arg_nodes))
-        return res.success(atom)
+            return CallNode(atom, arg_nodes)
+        arg_nodes.append(self.expr(ARG_EXPECTED))
+        while self.current_tok.type == TT_COMMA:
+            self.advance()
+            arg_nodes.append(self.expr())
+        if self.current_tok.type != TT_RPAREN:
+            self.fail("Expected ',' or ')'")
+        self.advance()
+        return CallNode(atom, arg_nodes)
 
     def atom(self):
-        res = ParseResult()
         tok = self.current_tok
+        tok_type = tok.type
 
-        if tok.type in (TT_INT, TT_FLOAT):
-            res.register_advancement()
+        if tok_type == TT_INT or tok_type == TT_FLOAT:
             self.advance()
-            return res.success(NumberNode(tok))
-        elif tok.type == TT_STRING:
-            res.register_advancement()
+            return NumberNode(tok)
+        if tok_type == TT_IDENTIFIER:
             self.advance()
-            return res.success(StringNode(tok))
-        elif tok.type == TT_IDENTIFIER:
-            res.register_advancement()
+            return VarAccessNode(tok)
+        if tok_type == TT_STRING:
             self.advance()
-            return res.success(VarAccessNode(tok))
-        elif tok.type == TT_LPAREN:
-            res.register_advancement()
+            return StringNode(tok)
+        if tok_type == TT_LPAREN:
             self.advance()
-            expr = res.register(self.expr())
-            if res.error: return res
-            if self.current_tok.type == TT_RPAREN:
-                res.register_advancement()
-                self.advance()
-                return res.success(expr)
-            else:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected ')'"
-                ))
-        elif tok.type == TT_LSQUARE:
-            list_expr = res.register(self.list_expr())
-            if res.error: return res
-            return res.success(list_expr)
-        elif tok.matches(TT_KEYWORD, 'if'):
-            if_expr = res.register(self.if_expr())
-            if res.error: return res
-            return res.success(if_expr)
-        elif tok.matches(TT_KEYWORD, 'for'):
-            for_expr = res.register(self.for_expr())
-            if res.error: return res
-            return res.success(for_expr)
-        elif tok.matches(TT_KEYWORD, 'while'):
-            while_expr = res.register(self.while_expr())
-            if res.error: return res
-            return res.success(while_expr)
-        elif tok.matches(TT_KEYWORD, 'fun'):
-            func_def = res.register(self.func_def())
-            if res.error: return res
-            return res.success(func_def)
-
-        return res.failure(InvalidSyntaxError(
-            tok.pos_start, tok.pos_end,
-            "Expected int, float, identifier, '+', '-', '(', '[', 'if', 'for', 'while', 'fun'"
-        ))
+            expr = self.expr()
+            if self.current_tok.type != TT_RPAREN:
+                self.fail("Expected ')'")
+            self.advance()
+            return expr
+        if tok_type == TT_LSQUARE:
+            return self.list_expr()
+        if tok_type == TT_LBRACE:
+            return self.brace_expr()
+        if tok_type == TT_KEYWORD:
+            if tok.value == 'if':
+                return self.if_expr()
+            if tok.value == 'for':
+                return self.for_expr()
+            if tok.value == 'while':
+                return self.while_expr()
+            if tok.value == 'fun':
+                return self.func_def()
+
+        self.fail(ATOM_EXPECTED)
 
     def list_expr(self):
-        res = ParseResult()
         element_nodes = []
-        pos_start = self.current_tok.pos_start.copy()
+        pos_start = self.current_tok.start
         if self.current_tok.type != TT_LSQUARE:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected '['"
-            ))
-        res.register_advancement()
+            self.fail("Expected '['")
         self.advance()
         if self.current_tok.type == TT_RSQUARE:
-            res.register_advancement()
             self.advance()
         else:
-            element_nodes.append(res.register(self.expr()))
-            if res.error:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected ']', 'if', 'for', 'while', 'fun', int, float, identifier, '+', '-', '(', '[' or 'not'"
-                ))
+            element_nodes.append(self.expr(ELEMENT_EXPECTED))
             while self.current_tok.type == TT_COMMA:
-                res.register_advancement()
                 self.advance()
-                element_nodes.append(res.register(self.expr()))
-                if res.error: return res
+                element_nodes.append(self.expr())
             if self.current_tok.type != TT_RSQUARE:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected ',' or ']'"
-                ))
-            res.register_advancement()
+                self.fail("Expected ',' or ']'")
             self.advance()
-        return res.success(ListNode(
-            element_nodes,
-            pos_start,
-            self.current_tok.pos_end.copy()
-        ))
+        return ListNode(element_nodes, pos_start, self.current_tok.end)
+
+    def brace_expr(self):
+        """A dict literal, `{key: value, ...}` or `{}`, or a set literal,
+        `{element, ...}`: a ':' after the first expression makes a dict."""
+        pos_start = self.current_tok.start
+        self.advance()
+        if self.current_tok.type == TT_RBRACE:
+            pos_end = self.current_tok.end
+            self.advance()
+            return DictNode([], pos_start, pos_end)
+        first = self.expr(ENTRY_EXPECTED)
+        if self.current_tok.type != TT_COLON:
+            element_nodes = [first]
+            while self.current_tok.type == TT_COMMA:
+                self.advance()
+                element_nodes.append(self.expr())
+            if self.current_tok.type != TT_RBRACE:
+                self.fail("Expected ',' or '}'")
+            pos_end = self.current_tok.end
+            self.advance()
+            return SetNode(element_nodes, pos_start, pos_end)
+        self.advance()
+        entry_nodes = [(first, self.expr())]
+        while self.current_tok.type == TT_COMMA:
+            self.advance()
+            key_node = self.expr()
+            if self.current_tok.type != TT_COLON:
+                self.fail("Expected ':'")
+            self.advance()
+            entry_nodes.append((key_node, self.expr()))
+        if self.current_tok.type != TT_RBRACE:
+            self.fail("Expected ',' or '}'")
+        pos_end = self.current_tok.end
+        self.advance()
+        return DictNode(entry_nodes, pos_start, pos_end)
 
     def if_expr(self):
-        res = ParseResult()
-        all_cases = res.register(self.if_expr_cases('if'))
-        if res.error: return res
-        cases, else_case = all_cases
-        return res.success(IfNode(cases, else_case))
+        cases, else_case = self.if_expr_cases('if')
+        return IfNode(cases, else_case)
 
     def if_expr_b(self):
         return self.if_expr_cases('elif', allow_else_if=True)
 
     def if_expr_c(self):
-        res = ParseResult()
         else_case = None
         if self.current_tok.matches(TT_KEYWORD, 'else'):
-            res.register_advancement()
             self.advance()
             if self.current_tok.type == TT_NEWLINE:
-                res.register_advancement()
                 self.advance()
-                statements = res.register(self.statements())
-                if res.error: return res
-                else_case = (statements, True)
-                if self.current_tok.matches(TT_KEYWORD, 'end'):
-                    res.register_advancement()
-                    self.advance()
-                else:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        "Expected 'end'"
-                    ))
+                else_case = (self.statements(), True)
+                self.expect_keyword('end')
             else:
-                expr = res.register(self.statement())
-                if res.error: return res
-                else_case = (expr, False)
-        return res.success(else_case)
+                else_case = (self.statement(), False)
+        return else_case
 
     def if_expr_b_or_c(self):
-        res = ParseResult()
-        cases, else_case = [], None
         if self.current_tok.matches(TT_KEYWORD, 'elif') or self._is_else_if():
-            all_cases = res.register(self.if_expr_b())
-            if res.error: return res
-            cases, else_case = all_cases
-        else:
-            else_case = res.register(self.if_expr_c())
-            if res.error: return res
-        return res.success((cases, else_case))
+            return self.if_expr_b()
+        return [], self.if_expr_c()
 
     def if_expr_cases(self, case_keyword, allow_else_if=False):
-        res = ParseResult()
         cases = []
         else_case = None
         if self.current_tok.matches(TT_KEYWORD, case_keyword):
-            res.register_advancement()
             self.advance()
         elif allow_else_if and self._is_else_if():
             # consume 'else' and following 'if'
-            res.register_advancement()
-            else_tok = self.current_tok
             self.advance()
-            if not self.current_tok or not self.current_tok.matches(TT_KEYWORD, 'if'):
-                pos_end = self.current_tok.pos_end.copy() if self.current_tok and getattr(self.current_tok, 'pos_end', None) else else_tok.pos_end
-                return res.failure(InvalidSyntaxError(
-                    else_tok.pos_start, pos_end,
-                    "Expected 'if' after 'else'"
-                ))
-            res.register_advancement()
             self.advance()
         else:
-            expected = f"Expected '{case_keyword}'"
-            if allow_else_if:
-                expected = "Expected 'elif' or 'else if'"
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                expected
-            ))
-        condition = res.register(self.expr())
-        if res.error: return res
-        if not self.current_tok.matches(TT_KEYWORD, 'then'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'then'"
-            ))
-        res.register_advancement()
-        self.advance()
+            self.fail("Expected 'elif' or 'else if'" if allow_else_if else f"Expected '{case_keyword}'")
+        condition = self.expr()
+        self.expect_keyword('then')
         if self.current_tok.type == TT_NEWLINE:
-            res.register_advancement()
             self.advance()
-            statements = res.register(self.statements())
-            if res.error: return res
-            cases.append((condition, statements, True))
+            cases.append((condition, self.statements(), True))
             if self.current_tok.matches(TT_KEYWORD, 'end'):
-                res.register_advancement()
                 self.advance()
             else:
-                all_cases = res.register(self.if_expr_b_or_c())
-                if res.error: return res
-                new_cases, else_case = all_cases
+                new_cases, else_case = self.if_expr_b_or_c()
                 cases.extend(new_cases)
         else:
-            expr = res.register(self.statement())
-            if res.error: return res
-            cases.append((condition, expr, False))
-            all_cases = res.register(self.if_expr_b_or_c())
-            if res.error: return res
-            new_cases, else_case = all_cases
+            cases.append((condition, self.statement(), False))
+            new_cases, else_case = self.if_expr_b_or_c()
             cases.extend(new_cases)
-        return res.success((cases, else_case))
+        return cases, else_case
 
     def _is_else_if(self):
         if not self.current_tok.matches(TT_KEYWORD, 'else'):
@@ -417,213 +364,80 @@ class Parser:
         return next_tok is not None and next_tok.matches(TT_KEYWORD, 'if')
 
     def for_expr(self):
-        res = ParseResult()
-        if not self.current_tok.matches(TT_KEYWORD, 'for'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'for'"
-            ))
-        res.register_advancement()
-        self.advance()
+        self.expect_keyword('for')
         if self.current_tok.type != TT_IDENTIFIER:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected identifier"
-            ))
+            self.fail("Expected identifier")
         var_name = self.current_tok
-        res.register_advancement()
         self.advance()
         if self.current_tok.type != TT_EQ:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected '='"
-            ))
-        res.register_advancement()
+            self.fail("Expected '='")
         self.advance()
-        start_value = res.register(self.expr())
-        if res.error: return res
+        start_value = self.expr()
 
         # support either python-like range 'to' or 'repeat N times'
+        step_value = None
         if self.current_tok.matches(TT_KEYWORD, 'repeat'):
-            res.register_advancement()
-            self.advance()
-            end_value = res.register(self.expr())
-            if res.error: return res
-            if not self.current_tok.matches(TT_KEYWORD, 'times'):
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected 'times'"
-                ))
-            res.register_advancement()
             self.advance()
-            step_value = None
+            end_value = self.expr()
+            self.expect_keyword('times')
         else:
-            if not self.current_tok.matches(TT_KEYWORD, 'to'):
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected 'to'"
-                ))
-            res.register_advancement()
-            self.advance()
-            end_value = res.register(self.expr())
-            if res.error: return res
+            self.expect_keyword('to')
+            end_value = self.expr()
             if self.current_tok.matches(TT_KEYWORD, 'step'):
-                res.register_advancement()
                 self.advance()
-                step_value = res.register(self.expr())
-                if res.error: return res
-            else:
-                step_value = None
-        if not self.current_tok.matches(TT_KEYWORD, 'then'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'then'"
-            ))
-        res.register_advancement()
-        self.advance()
+                step_value = self.expr()
+        self.expect_keyword('then')
         if self.current_tok.type == TT_NEWLINE:
-            res.register_advancement()
             self.advance()
-            body = res.register(self.statements())
-            if res.error: return res
-            if not self.current_tok.matches(TT_KEYWORD, 'end'):
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected 'end'"
-                ))
-            res.register_advancement()
-            self.advance()
-            return res.success(ForNode(var_name, start_value, end_value, step_value, body, True))
-        body = res.register(self.statement())
-        if res.error: return res
-        return res.success(ForNode(var_name, start_value, end_value, step_value, body, False))
+            body = self.statements()
+            self.expect_keyword('end')
+            return ForNode(var_name, start_value, end_value, step_value, body, True)
+        return ForNode(var_name, start_value, end_value, step_value, self.statement(), False)
 
     def while_expr(self):
-        res = ParseResult()
-        if not self.current_tok.matches(TT_KEYWORD, 'while'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'while'"
-            ))
-        res.register_advancement()
-        self.advance()
-        condition = res.register(self.expr())
-        if res.error: return res
-        if not self.current_tok.matches(TT_KEYWORD, 'then'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'then'"
-            ))
-        res.register_advancement()
-        self.advance()
+        self.expect_keyword('while')
+        condition = self.expr()
+        self.expect_keyword('then')
         if self.current_tok.type == TT_NEWLINE:
-            res.register_advancement()
-            self.advance()
-            body = res.register(self.statements())
-            if res.error: return res
-            if not self.current_tok.matches(TT_KEYWORD, 'end'):
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected 'end'"
-                ))
-            res.register_advancement()
             self.advance()
-            return res.success(WhileNode(condition, body, True))
-        body = res.register(self.statement())
-        if res.error: return res
-        return res.success(WhileNode(condition, body, False))
+            body = self.statements()
+            self.expect_keyword('end')
+            return WhileNode(condition, body, True)
+        return WhileNode(condition, self.statement(), False)
 
     def func_def(self):
-        res = ParseResult()
-        if not self.current_tok.matches(TT_KEYWORD, 'fun'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'fun'"
-            ))
-        res.register_advancement()
-        self.advance()
+        self.expect_keyword('fun')
         if self.current_tok.type == TT_IDENTIFIER:
             var_name_tok = self.current_tok
-            res.register_advancement()
             self.advance()
             if self.current_tok.type != TT_LPAREN:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected '('"
-                ))
+                self.fail("Expected '('")
         else:
             var_name_tok = None
             if self.current_tok.type != TT_LPAREN:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected identifier or '('"
-                ))
-        res.register_advancement()
+                self.fail("Expected identifier or '('")
         self.advance()
         arg_name_toks = []
         if self.current_tok.type == TT_IDENTIFIER:
             arg_name_toks.append(self.current_tok)
-            res.register_advancement()
             self.advance()
             while self.current_tok.type == TT_COMMA:
-                res.register_advancement()
                 self.advance()
                 if self.current_tok.type != TT_IDENTIFIER:
-                    return res.failure(InvalidSyntaxError(
-                        self.current_tok.pos_start, self.current_tok.pos_end,
-                        "Expected identifier"
-                    ))
+                    self.fail("Expected identifier")
                 arg_name_toks.append(self.current_tok)
-                res.register_advancement()
                 self.advance()
             if self.current_tok.type != TT_RPAREN:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected ',' or ')'"
-                ))
-        else:
-            if self.current_tok.type != TT_RPAREN:
-                return res.failure(InvalidSyntaxError(
-                    self.current_tok.pos_start, self.current_tok.pos_end,
-                    "Expected identifier or ')'"
-                ))
-        res.register_advancement()
+                self.fail("Expected ',' or ')'")
+        elif self.current_tok.type != TT_RPAREN:
+            self.fail("Expected identifier or ')'")
         self.advance()
         if self.current_tok.type == TT_ARROW:
-            res.register_advancement()
             self.advance()
-            body = res.register(self.expr())
-            if res.error: return res
-            return res.success(FuncDefNode(var_name_tok, arg_name_toks, body, True))
+            return FuncDefNode(var_name_tok, arg_name_toks, self.expr(), True)
         if self.current_tok.type != TT_NEWLINE:
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected '->' or NEWLINE"
-            ))
-        res.register_advancement()
+            self.fail("Expected '->' or NEWLINE")
         self.advance()
-        body = res.register(self.statements())
-        if res.error: return res
-        if not self.current_tok.matches(TT_KEYWORD, 'end'):
-            return res.failure(InvalidSyntaxError(
-                self.current_tok.pos_start, self.current_tok.pos_end,
-                "Expected 'end'"
-            ))
-        res.register_advancement()
-        self.advance()
-        return res.success(FuncDefNode(var_name_tok, arg_name_toks, body, False))
-
-    def bin_op(self, func_a, ops, func_b=None):
-        if func_b is None:
-            func_b = func_a
-        res = ParseResult()
-        left = res.register(func_a())
-        if res.error: return res
-        while self.current_tok.type in ops or (self.current_tok.type, self.current_tok.value) in ops:
-            op_tok = self.current_tok
-            res.register_advancement()
-            self.advance()
-            right = res.register(func_b())
-            if res.error: return res
-            left = BinOpNode(left, op_tok, right)
-        return res.success(left)
+        body = self.statements()
+        self.expect_keyword('end')
+        return FuncDefNode(var_name_tok, arg_name_toks, body, False)
@@ -1,18 +1,42 @@
-class Position:
-    def __init__(self, idx, ln, col, fn, ftxt):
-        self.idx = idx
-        self.ln = ln
-        self.col = col
+from bisect import bisect_right
+
+class Source:
+    """A source file. Tokens, nodes and errors refer to it by integer
+    offsets; line starts are indexed on first use, so line and column
+    numbers cost nothing until an error is rendered.
+
+    `data` is either the program text or a bytes-like buffer of UTF-8 (such
+    as an mmap of the file); offsets index into `data` in both cases.
+    """
+
+    def __init__(self, fn, data):
         self.fn = fn
-        self.ftxt = ftxt
+        self.data = data
+        self.binary = not isinstance(data, str)
+        self._line_starts = None
+
+    @property
+    def text(self):
+        if self.binary:
+            return bytes(self.data).decode('utf-8', 'replace')
+        return self.data
 
-    def advance(self, current_char=None):
-        self.idx += 1
-        self.col += 1
-        if current_char == '\n':
-            self.ln += 1
-            self.col = 0
-        return self
+    def line_starts(self):
+        if self._line_starts is None:
+            starts = [0]
+            find = self.data.find
+            newline = b'\n' if self.binary else '\n'
+            idx = find(newline)
+            while idx != -1:
+                starts.append(idx + 1)
+                idx = find(newline, idx + 1)
+            self._line_starts = starts
+        return self._line_starts
 
-    def copy(self):
-        return Position(self.idx, self.ln, self.col, self.fn, self.ftxt)
+    def line_col(self, idx):
+        starts = self.line_starts()
+        ln = bisect_right(starts, idx) - 1
+        if self.binary:
+            # Columns count characters, not bytes
+            return ln, len(bytes(self.data[starts[ln]:idx]).decode('utf-8', 'replace'))
+        return ln, idx - starts[ln]
@@ -1,47 +1,112 @@
+import mmap
 import os
 from .lexer import Lexer
 from .parser import Parser
 from .interpreter import Interpreter
-from .runtime import Context, SymbolTable
-from .values import Number, String, BuiltInFunction
+from .direct_interpreter import DirectInterpreter
+from .scope import resolve_scopes
+from .compiler import Compiler
+from .vm import VM
+from .transpiler import Transpiler
+from .tiering import Tiering
+from .optimizer import Optimizer
+from .runtime import Context, GlobalSymbolTable, ReturnSignal, BreakSignal, ContinueSignal, ErrorSignal
+from .values import BuiltInFunction, BUILTINS, NULL, box
 
 # Global symbols and built-ins for the LRL language
-global_symbol_table = SymbolTable()
+global_symbol_table = GlobalSymbolTable()
 # booleans and constants
-global_symbol_table.set("null", Number.null)
-global_symbol_table.set("false", Number.false)
-global_symbol_table.set("true", Number.true)
-# builtins matching sample.lrl API
-global_symbol_table.set("say", BuiltInFunction.say)
-global_symbol_table.set("get_int", BuiltInFunction.get_int)
-global_symbol_table.set("get_float", BuiltInFunction.get_float)
-global_symbol_table.set("get_string", BuiltInFunction.get_string)
+global_symbol_table.set("null", NULL)
+global_symbol_table.set("false", NULL)
+global_symbol_table.set("true", 1)
+# builtins matching sample.lrl API, plus any registered with @builtin
+for builtin_name in BUILTINS:
+    global_symbol_table.set(builtin_name, BuiltInFunction(builtin_name))
+
+# Execution backends accepted by run_text/run_file
+BACKENDS = ('tree', 'direct', 'vm', 'python')
+# The backends that promote hot functions (see lrl.tiering)
+TIERED_BACKENDS = ('tree', 'direct')
 
 # --- Runner functions ---
 
-def run_text(fn: str, text: str):
+def run_text(fn: str, text, backend: str = 'tree', tiering: Tiering = None, optimize: bool = False):
+    # `text` may also be a bytes-like UTF-8 buffer, such as an mmap.
+    # The tree-walking backends compile hot functions as set by `tiering`
+    # (a default Tiering when None); its promotions are recorded on it.
+    # With `optimize`, the program goes through lrl.optimizer first.
+    # Tokens are produced lazily and parsed as they are scanned, so the full
+    # token list is never materialised.
     lexer = Lexer(fn, text)
-    tokens, error = lexer.make_tokens()
-    if error:
-        return None, error
-
+    tokens = lexer.generate_tokens()
     parser = Parser(tokens)
     ast = parser.parse()
+    if ast.error:
+        # An illegal character later in the file takes precedence, as it
+        # would if the file had been tokenised up front.
+        for _ in tokens:
+            pass
+    if lexer.error:
+        return None, lexer.error
     if ast.error:
         return None, ast.error
+    node = Optimizer().run(ast.node) if optimize else ast.node
 
-    interpreter = Interpreter()
-    context = Context('<program>')
+    context = Context('<program>', source=lexer.source)
     context.symbol_table = global_symbol_table
+    value, error = run_program(fn, node, context, backend, tiering)
+    # Numbers and strings are plain Python values until they leave the program
+    return (box(value) if value is not None else None), error
+
+def run_program(fn, node, context, backend, tiering):
+    if backend == 'vm':
+        code = Compiler().compile(resolve_scopes(node, global_symbol_table))
+        try:
+            return VM().run(code, context)
+        except (BreakSignal, ContinueSignal):
+            # A break/continue that left every function ends the program
+            return None, None
 
-    result = interpreter.visit(ast.node, context)
+    if backend == 'python':
+        program = Transpiler().transpile(resolve_scopes(node, global_symbol_table), fn)
+        return program.run(context)
+
+    if tiering is None:
+        tiering = Tiering()
+
+    if backend == 'direct':
+        interpreter = DirectInterpreter()
+        interpreter.tiering = tiering if tiering.enabled else None
+        interpreter.frame_stack = VM(interpreter)
+        try:
+            return interpreter.visit(interpreter.resolve(node, global_symbol_table), context), None
+        except ErrorSignal as signal:
+            return None, signal.error
+        except (ReturnSignal, BreakSignal, ContinueSignal):
+            # A top-level return/break/continue ends the program
+            return None, None
+
+    interpreter = Interpreter()
+    interpreter.tiering = tiering if tiering.enabled else None
+    interpreter.frame_stack = VM(interpreter)
+    result = interpreter.visit(interpreter.resolve(node, global_symbol_table), context)
     return result.value, result.error
 
-def run_file(path: str):
+def run_file(path: str, backend: str = 'tree', stream: bool = False, tiering: Tiering = None, optimize: bool = False):
     if not path.endswith('.lrl'):
         raise SystemExit('Only .lrl files are allowed')
     if not os.path.exists(path):
         raise SystemExit(f'File not found: {path}')
-    with open(path, 'r') as f:
-        code = f.read()
-    return run_text(path, code)
+    if stream:
+        # Scan the memory-mapped file directly instead of reading it into a
+        # string; pages are loaded as the lexer reaches them.
+        with open(path, 'rb') as f:
+            try:
+                code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                code = b''  # empty files cannot be mapped
+    else:
+        # Keep line endings as written so both modes lex the same text
+        with open(path, 'r', newline='') as f:
+            code = f.read()
+    return run_text(path, code, backend, tiering, optimize)
@@ -47,17 +47,103 @@ class RTResult:
     def should_return(self):
         return (
             self.error or
-            self.func_return_value or
+            # A returned value may be a Python 0
+            self.func_return_value is not None or
             self.loop_should_continue or
             self.loop_should_break
         )
 
+# Signals used by lrl.direct_interpreter.DirectInterpreter, which returns
+# plain values and unwinds with these instead of threading an RTResult
+# through every node.
+class ReturnSignal(Exception):
+    def __init__(self, value):
+        self.value = value
+
+class BreakSignal(Exception):
+    pass
+
+class ContinueSignal(Exception):
+    pass
+
+class ErrorSignal(Exception):
+    def __init__(self, error):
+        self.error = error
+
+class TailCall:
+    """A call in tail position. The interpreters hand it back instead of
+    making the call, and Function.execute runs it in its own loop."""
+    __slots__ = ('function', 'args', 'call_node')
+
+    def __init__(self, function, args, call_node):
+        self.function = function
+        self.args = args
+        self.call_node = call_node
+
 class Context:
-    def __init__(self, display_name, parent=None, parent_entry_pos=None):
+    __slots__ = ('display_name', 'parent', 'parent_entry_pos', 'source', 'symbol_table', 'scope', 'slots')
+
+    def __init__(self, display_name, parent=None, parent_entry_pos=None, source=None):
         self.display_name = display_name
         self.parent = parent
+        # Offset of the call in the parent's source
         self.parent_entry_pos = parent_entry_pos
+        # Source that error offsets in this context refer to
+        self.source = source if source is not None or parent is None else parent.source
         self.symbol_table = None
+        # Frame of a user function call: its lrl.scope.Scope and one slot per
+        # local, indexed by the slot numbers the resolver gave each name
+        self.scope = None
+        self.slots = None
+
+    def lookup(self, name):
+        """Find `name` the way dynamic scoping does: in this frame, then in
+        each caller's frame, then in the top-level symbol table. Only used
+        when a resolved slot or global cell can't answer the read."""
+        ctx = self
+        while ctx is not None:
+            scope = ctx.scope
+            if scope is not None:
+                slot = scope.slots.get(name)
+                if slot is not None:
+                    value = ctx.slots[slot]
+                    if value is not None:
+                        return value
+            elif ctx.symbol_table is not None:
+                return ctx.symbol_table.get(name)
+            ctx = ctx.parent
+        return None
+
+# Contexts of finished user function calls, reused by new_frame. A call that
+# fails keeps its context, since the error's execution trace refers to it.
+free_frames = []
+MAX_FREE_FRAMES = 256
+
+def new_frame(display_name, parent, parent_entry_pos, scope):
+    """Return the Context for a call of a function whose body has `scope`,
+    taking it from the free list when there is one."""
+    if free_frames:
+        ctx = free_frames.pop()
+    else:
+        ctx = Context.__new__(Context)
+        ctx.symbol_table = None
+    ctx.display_name = display_name
+    ctx.parent = parent
+    ctx.parent_entry_pos = parent_entry_pos
+    ctx.source = parent.source
+    ctx.scope = scope
+    ctx.slots = [None] * scope.size
+    return ctx
+
+def release_frames(ctx, caller):
+    """Give back the frames from `ctx` up to, but not including, `caller`.
+    Tail calls leave a chain of them behind a single call."""
+    while ctx is not caller:
+        parent = ctx.parent
+        ctx.parent = ctx.slots = None
+        if len(free_frames) < MAX_FREE_FRAMES:
+            free_frames.append(ctx)
+        ctx = parent
 
 class SymbolTable:
     def __init__(self, parent=None):
@@ -76,3 +162,35 @@ class SymbolTable:
     def remove(self, name):
         if name in self.symbols:
             del self.symbols[name]
+
+class Cell:
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+class GlobalSymbolTable(SymbolTable):
+    """The top-level symbol table. Every name lives in a Cell that the scope
+    resolver binds to global reads and writes, so they skip the dict."""
+
+    def __init__(self):
+        super().__init__()
+        self.cells = {}
+
+    def cell(self, name):
+        cell = self.cells.get(name)
+        if cell is None:
+            cell = self.cells[name] = Cell()
+        return cell
+
+    def get(self, name):
+        cell = self.cells.get(name)
+        return cell.value if cell is not None else None
+
+    def set(self, name, value):
+        self.cell(name).value = value
+
+    def remove(self, name):
+        cell = self.cells.get(name)
+        if cell is not None:
+            cell.value = None
@@ -0,0 +1,109 @@
+from .nodes import walk, iter_child_nodes, VarAccessNode, VarAssignNode, ForNode, FuncDefNode, CallNode, ReturnNode, IfNode, StatementsNode
+
+class Scope:
+    """The locals of one function body. Arguments take the first slots,
+    followed by every name the body assigns (including loop variables and
+    nested function names)."""
+
+    def __init__(self, names):
+        self.names = names
+        # A repeated argument name binds to its last slot, as it did when
+        # arguments were set into a dict one by one
+        self.slots = {name: index for index, name in enumerate(names)}
+
+    @property
+    def size(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return f'<scope {self.names}>'
+
+def bound_name(node):
+    if isinstance(node, (VarAssignNode, ForNode)):
+        return node.var_name_tok.value
+    if isinstance(node, FuncDefNode) and node.var_name_tok:
+        return node.var_name_tok.value
+    return None
+
+def assigned_names(body_node):
+    """Names bound inside a function body, not counting nested bodies."""
+    names = []
+    stack = [body_node]
+    while stack:
+        node = stack.pop()
+        name = bound_name(node)
+        if name is not None and name not in names:
+            names.append(name)
+        if not isinstance(node, FuncDefNode):
+            stack.extend(reversed(list(iter_child_nodes(node))))
+    return names
+
+def resolve_scopes(node, global_table):
+    """Bind every variable reference under `node` to a storage location.
+
+    Sets on each VarAccessNode, VarAssignNode, ForNode and named FuncDefNode:
+      slot    - index into the current function frame, for locals
+      cell    - the global_table Cell, for names outside any function scope
+      dynamic - True for a free name that some function also uses as a
+                local. LRL scopes dynamically (a callee sees its callers'
+                locals), so such reads search the caller frames first;
+                any other global read goes straight to its cell.
+    FuncDefNodes also get the Scope describing their frame, and each
+    CallNode a `tail` flag: True when its result is returned straight from
+    the enclosing function (`return f(...)` or `fun g(...) -> f(...)`),
+    including through the branches of an if and the last statement of a
+    block that are themselves returned (see mark_tail).
+    """
+    root = node
+    shadowable = set()
+    for func_node in walk(root):
+        if isinstance(func_node, CallNode):
+            func_node.tail = False
+        elif isinstance(func_node, FuncDefNode):
+            names = [arg_tok.value for arg_tok in func_node.arg_name_toks]
+            names += [name for name in assigned_names(func_node.body_node) if name not in names]
+            func_node.scope = Scope(names)
+            shadowable.update(names)
+
+    stack = [(root, None)]
+    while stack:
+        node, scope = stack.pop()
+        name = bound_name(node) if not isinstance(node, VarAccessNode) else node.var_name_tok.value
+        if name is not None:
+            if scope is not None and name in scope.slots:
+                node.slot = scope.slots[name]
+                node.cell = None
+                node.dynamic = False
+            else:
+                node.slot = None
+                node.cell = global_table.cell(name)
+                node.dynamic = scope is not None and name in shadowable
+        if isinstance(node, ReturnNode) and scope is not None:
+            mark_tail(node.node_to_return)
+        if isinstance(node, FuncDefNode):
+            if node.should_auto_return:
+                mark_tail(node.body_node)
+            stack.append((node.body_node, node.scope))
+        else:
+            stack.extend((child, scope) for child in iter_child_nodes(node))
+    return root
+
+def mark_tail(node):
+    """Flag the calls whose result `node`, in tail position, evaluates to."""
+    while node is not None:
+        if isinstance(node, CallNode):
+            node.tail = True
+            return
+        if isinstance(node, IfNode):
+            # A branch that gives null instead of its value is not in tail
+            # position
+            for condition, expr, should_return_null in node.cases:
+                if not should_return_null:
+                    mark_tail(expr)
+            if not node.else_case or node.else_case[1]:
+                return
+            node = node.else_case[0]
+        elif isinstance(node, StatementsNode) and node.statements:
+            node = node.statements[-1]
+        else:
+            return
@@ -0,0 +1,507 @@
+from itertools import repeat
+from time import perf_counter
+from .tokens import *
+from .nodes import NumberNode, StatementsNode, IfNode, ReturnNode
+from .values import List, Dict, Set, Function, box, is_true, NUMBER_TYPES, NULL
+from .runtime import ReturnSignal, BreakSignal, ContinueSignal, ErrorSignal, TailCall
+from .errors import RTError
+from .interpreter import loop_range, operator_key, literal_entries, SHORT_CIRCUIT
+from .operations import BINARY_FUNCTIONS, OPERATION_ERRORS
+
+# Calls a function takes before its body is compiled to closures
+HOT_CALL_THRESHOLD = 100
+
+class Promotion:
+    def __init__(self, name, node, source, calls, seconds):
+        self.name = name
+        self.node = node
+        self.source = source
+        self.calls = calls
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f'<promotion {self.name}>'
+
+class Tiering:
+    """Counts calls of user functions run by the tree-walking interpreters
+    and compiles the body of each one that reaches `threshold` calls into
+    closures (see ClosureCompiler). The closures are cached on the
+    FuncDefNode, so every function made from that definition uses them.
+    A threshold of 0 or None turns promotion off."""
+
+    def __init__(self, threshold=HOT_CALL_THRESHOLD):
+        self.threshold = threshold
+        self.promotions = []
+
+    @property
+    def enabled(self):
+        return bool(self.threshold)
+
+    def record_call(self, function, context):
+        """Count a call of `function` running in `context`. Returns its
+        compiled body once it is hot, else None."""
+        function.calls += 1
+        if function.calls < self.threshold or function.definition is None:
+            return None
+        definition = function.definition
+        if definition.compiled is None:
+            start = perf_counter()
+            definition.compiled = ClosureCompiler(function.interpreter).compile_function(definition)
+            self.promotions.append(Promotion(function.name, definition, context.source, function.calls, perf_counter() - start))
+        function.compiled = definition.compiled
+        return function.compiled
+
+    def report(self):
+        """One line per promoted function: where it is defined, how many
+        calls it took and how long compiling it took."""
+        if not self.promotions:
+            return 'tiering: no functions promoted'
+        lines = [f'tiering: {len(self.promotions)} function(s) promoted']
+        for promotion in self.promotions:
+            node = promotion.node
+            line = promotion.source.line_col(node.pos_start)[0] + 1
+            lines.append(f'  {promotion.name} (line {line}) after {promotion.calls} calls, '
+                         f'compiled in {promotion.seconds * 1000:.3f} ms')
+        total = sum(promotion.seconds for promotion in self.promotions)
+        lines.append(f'  total compile time {total * 1000:.3f} ms')
+        return '\n'.join(lines)
+
+def always_returns(node):
+    """Whether evaluating `node` always ends in a return statement."""
+    if isinstance(node, ReturnNode):
+        return True
+    if isinstance(node, StatementsNode):
+        return bool(node.statements) and always_returns(node.statements[-1])
+    if isinstance(node, IfNode):
+        return (node.else_case is not None and always_returns(node.else_case[0])
+                and all(always_returns(expr) for _, expr, _ in node.cases))
+    return False
+
+class ClosureCompiler:
+    """Turns a function body into a tree of Python closures, one per node,
+    each taking the call's Context and returning the node's value.
+
+    The closures follow DirectInterpreter: errors and return/break/continue
+    unwind as the signals from lrl.runtime. What the interpreters look up
+    on every visit (the handler, the operator, whether a name is a slot, a
+    cell or dynamic, literal values) is decided once here, and a return at
+    the end of a body yields its value instead of raising.
+    """
+
+    def __init__(self, interpreter):
+        # Interpreter that owns the function; it makes nested functions and
+        # builds operator errors
+        self.interpreter = interpreter
+
+    def compile_function(self, node):
+        """Entry point for a FuncDefNode's body, called like
+        Interpreter.execute_body: returns the call's value or a TailCall, or
+        None with the error left in `res`."""
+        if node.should_auto_return:
+            body = self.compile(node.body_node)
+        else:
+            body = self.compile_result(node.body_node)
+
+        def run(context, res):
+            try:
+                return body(context)
+            except ReturnSignal as signal:
+                return signal.value
+            except ErrorSignal as signal:
+                res.failure(signal.error)
+                return None
+        return run
+
+    def compile(self, node):
+        return getattr(self, f'compile_{type(node).__name__}')(node)
+
+    # --- Function results ---
+
+    def compile_result(self, node):
+        """Closure giving the return value of a function whose body ends
+        with `node` and does not auto-return."""
+        if isinstance(node, ReturnNode):
+            if node.node_to_return:
+                return self.compile(node.node_to_return)
+            return lambda context: NULL
+        if isinstance(node, StatementsNode):
+            return self.compile_result_statements(node.statements)
+        if isinstance(node, IfNode):
+            cases = [(self.compile(condition), self.compile_result(expr)) for condition, expr, _ in node.cases]
+            if node.else_case:
+                fallback = self.compile_result(node.else_case[0])
+            else:
+                fallback = lambda context: NULL
+            return self.result_chain(cases, fallback)
+        evaluate = self.compile(node)
+
+        def run(context):
+            evaluate(context)
+            return NULL
+        return run
+
+    def compile_result_statements(self, statements):
+        for index, statement in enumerate(statements):
+            # `if ... then return ... end` followed by more statements: the
+            # rest is the implicit else branch
+            if (isinstance(statement, IfNode) and statement.else_case is None and index < len(statements) - 1
+                    and all(always_returns(expr) for _, expr, _ in statement.cases)):
+                cases = [(self.compile(condition), self.compile_result(expr)) for condition, expr, _ in statement.cases]
+                chain = self.result_chain(cases, self.compile_result_statements(statements[index + 1:]))
+                return self.sequence([self.compile(s) for s in statements[:index]], chain)
+        if not statements:
+            return lambda context: NULL
+        return self.sequence([self.compile(s) for s in statements[:-1]], self.compile_result(statements[-1]))
+
+    def result_chain(self, cases, fallback):
+        if len(cases) == 1:
+            (condition, branch), = cases
+
+            def run(context):
+                if is_true(condition(context)):
+                    return branch(context)
+                return fallback(context)
+            return run
+
+        def run(context):
+            for condition, branch in cases:
+                if is_true(condition(context)):
+                    return branch(context)
+            return fallback(context)
+        return run
+
+    def sequence(self, steps, last):
+        if not steps:
+            return last
+        if len(steps) == 1:
+            first, = steps
+
+            def run(context):
+                first(context)
+                return last(context)
+            return run
+
+        def run(context):
+            for step in steps:
+                step(context)
+            return last(context)
+        return run
+
+    # --- Expressions and statements ---
+
+    def compile_NumberNode(self, node):
+        value = node.tok.value
+        return lambda context: value
+
+    def compile_StringNode(self, node):
+        value = node.tok.value
+        return lambda context: value
+
+    def compile_ListNode(self, node):
+        if node.constant is not None:
+            values = node.constant
+            return lambda context: List(list(values))
+        elements = [self.compile(element_node) for element_node in node.element_nodes]
+        return lambda context: List([element(context) for element in elements])
+
+    def compile_DictNode(self, node):
+        entries = [(self.compile(key_node), self.compile(value_node)) for key_node, value_node in node.entry_nodes]
+
+        def run(context):
+            keys = []
+            values = []
+            for key, value in entries:
+                keys.append(key(context))
+                values.append(value(context))
+            filed, error = literal_entries(node, keys, values, context)
+            if error:
+                raise ErrorSignal(error)
+            return Dict(filed)
+        return run
+
+    def compile_SetNode(self, node):
+        elements = [self.compile(element_node) for element_node in node.element_nodes]
+
+        def run(context):
+            filed, error = literal_entries(node, [element(context) for element in elements], repeat(None), context)
+            if error:
+                raise ErrorSignal(error)
+            return Set(filed)
+        return run
+
+    def compile_StatementsNode(self, node):
+        statements = [self.compile(statement) for statement in node.statements]
+        if not statements:
+            return lambda context: NULL
+        return self.sequence(statements[:-1], statements[-1])
+
+    def compile_VarAccessNode(self, node):
+        var_name = node.var_name_tok.value
+
+        def undefined(context):
+            value = context.lookup(var_name)
+            if value is None:
+                raise ErrorSignal(RTError(node.pos_start, node.pos_end, f"'{var_name}' is not defined", context))
+            return value
+
+        if node.slot is not None:
+            slot = node.slot
+
+            def run(context):
+                value = context.slots[slot]
+                return value if value is not None else undefined(context)
+        elif node.dynamic:
+            run = undefined
+        else:
+            cell = node.cell
+
+            def run(context):
+                value = cell.value
+                return value if value is not None else undefined(context)
+        return run
+
+    def compile_store(self, node, evaluate):
+        """Closure that evaluates `evaluate`, stores the value in `node`'s
+        slot or cell and returns it."""
+        if node.slot is not None:
+            slot = node.slot
+
+            def run(context):
+                value = context.slots[slot] = evaluate(context)
+                return value
+        else:
+            cell = node.cell
+
+            def run(context):
+                value = cell.value = evaluate(context)
+                return value
+        return run
+
+    def compile_VarAssignNode(self, node):
+        return self.compile_store(node, self.compile(node.value_node))
+
+    def compile_BinOpNode(self, node):
+        function = BINARY_FUNCTIONS.get(operator_key(node.op_tok))
+        interpreter = self.interpreter
+        if function is None:
+            def unknown(context):
+                raise ErrorSignal(RTError(node.pos_start, node.pos_end, 'Unknown binary operator', context))
+            return unknown
+        left_value = self.compile(node.left_node)
+        right_node = node.right_node
+
+        def operate(left, right, context):
+            try:
+                return function(left, right)
+            except OPERATION_ERRORS:
+                raise ErrorSignal(interpreter.binary_error(node, left, right, context))
+
+        if operator_key(node.op_tok) in SHORT_CIRCUIT:
+            decides = SHORT_CIRCUIT[operator_key(node.op_tok)]
+            right_value = self.compile(right_node)
+
+            def run(context):
+                left = left_value(context)
+                if left.__class__ in NUMBER_TYPES and (left != 0) is decides:
+                    return int(left)
+                return operate(left, right_value(context), context)
+            return run
+
+        if node.fast is not None:
+            return self.quick_binary(node, left_value, self.compile(right_node), operate)
+
+        if isinstance(right_node, NumberNode):
+            # A literal right operand, e.g. `n - 1`, is read once
+            right = right_node.tok.value
+
+            def run(context):
+                left = left_value(context)
+                try:
+                    return function(left, right)
+                except OPERATION_ERRORS:
+                    raise ErrorSignal(interpreter.binary_error(node, left, right, context))
+            return run
+
+        right_value = self.compile(right_node)
+
+        def run(context):
+            left = left_value(context)
+            right = right_value(context)
+            try:
+                return function(left, right)
+            except OPERATION_ERRORS:
+                raise ErrorSignal(interpreter.binary_error(node, left, right, context))
+        return run
+
+    def quick_binary(self, node, left_value, right_value, operate):
+        """A site the interpreter has quickened keeps its fast path behind
+        the same type guard. Operands of other types drop it for good."""
+        fast, left_type, right_type = node.fast, node.left_type, node.right_type
+        quick = True
+
+        def run(context):
+            nonlocal quick
+            left = left_value(context)
+            right = right_value(context)
+            if quick:
+                if left.__class__ is left_type and right.__class__ is right_type:
+                    result = fast(left, right)
+                    if result is not None:
+                        return result
+                else:
+                    quick = False
+            return operate(left, right, context)
+        return run
+
+    def compile_UnaryOpNode(self, node):
+        operand = self.compile(node.node)
+        operator = node.operator
+        if operator is None or node.op_tok.type == TT_PLUS:
+            return operand
+        interpreter = self.interpreter
+
+        def operate(number, context):
+            try:
+                return operator(number)
+            except OPERATION_ERRORS:
+                raise ErrorSignal(interpreter.unary_error(node, number, context))
+
+        if node.fast is None:
+            return lambda context: operate(operand(context), context)
+
+        fast, operand_type = node.fast, node.left_type
+        quick = True
+
+        def run(context):
+            nonlocal quick
+            number = operand(context)
+            if quick:
+                if number.__class__ is operand_type:
+                    return fast(number)
+                quick = False
+            return operate(number, context)
+        return run
+
+    def compile_IfNode(self, node):
+        cases = []
+        for condition, expr, should_return_null in node.cases:
+            cases.append((self.compile(condition), self.compile_discarding(expr, should_return_null)))
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            fallback = self.compile_discarding(expr, should_return_null)
+        else:
+            fallback = lambda context: NULL
+        return self.result_chain(cases, fallback)
+
+    def compile_discarding(self, node, should_return_null):
+        """`node`, giving null instead of its value when `should_return_null`."""
+        evaluate = self.compile(node)
+        if not should_return_null:
+            return evaluate
+
+        def run(context):
+            evaluate(context)
+            return NULL
+        return run
+
+    def compile_ForNode(self, node):
+        start = self.compile(node.start_value_node)
+        end = self.compile(node.end_value_node)
+        step = self.compile(node.step_value_node) if node.step_value_node else lambda context: 1
+        body = self.compile(node.body_node)
+        should_return_null = node.should_return_null
+        slot, cell = node.slot, node.cell
+
+        def run(context):
+            start_value = start(context)
+            end_value = end(context)
+            step_value = step(context)
+            slots = context.slots
+            elements = None if should_return_null else []
+            for i in loop_range(start_value, end_value, step_value):
+                if slot is not None:
+                    slots[slot] = i
+                else:
+                    cell.value = i
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+                if elements is not None:
+                    elements.append(value)
+            return NULL if elements is None else List(elements)
+        return run
+
+    def compile_WhileNode(self, node):
+        condition = self.compile(node.condition_node)
+        body = self.compile(node.body_node)
+        should_return_null = node.should_return_null
+
+        def run(context):
+            elements = None if should_return_null else []
+            while is_true(condition(context)):
+                try:
+                    value = body(context)
+                except ContinueSignal:
+                    continue
+                except BreakSignal:
+                    break
+                if elements is not None:
+                    elements.append(value)
+            return NULL if elements is None else List(elements)
+        return run
+
+    def compile_FuncDefNode(self, node):
+        interpreter = self.interpreter
+        make = lambda context: interpreter.make_function(node)
+        if node.var_name_tok:
+            return self.compile_store(node, make)
+        return make
+
+    def compile_CallNode(self, node):
+        callee = self.compile(node.node_to_call)
+        args = [self.compile(arg_node) for arg_node in node.arg_nodes]
+        if node.tail:
+            return lambda context: TailCall(callee(context), [arg(context) for arg in args], node)
+
+        def run(context):
+            value_to_call = callee(context)
+            res = box(value_to_call).execute([arg(context) for arg in args], context, node)
+            value = res.value
+            if value is None:
+                raise escape(res)
+            return value
+        return run
+
+    def compile_ReturnNode(self, node):
+        if node.node_to_return:
+            value = self.compile(node.node_to_return)
+
+            def run(context):
+                raise ReturnSignal(value(context))
+            return run
+
+        def run(context):
+            raise ReturnSignal(NULL)
+        return run
+
+    def compile_ContinueNode(self, node):
+        def run(context):
+            raise ContinueSignal()
+        return run
+
+    def compile_BreakNode(self, node):
+        def run(context):
+            raise BreakSignal()
+        return run
+
+def escape(res):
+    """The signal for a call result that carries no value: an error, or a
+    break/continue leaking out of a tree-interpreted callee."""
+    if res.error:
+        return ErrorSignal(res.error)
+    if res.loop_should_break:
+        return BreakSignal()
+    return ContinueSignal()
@@ -16,6 +16,9 @@ TT_LPAREN = 'LPAREN'
 TT_RPAREN = 'RPAREN'
 TT_LSQUARE = 'LSQUARE'
 TT_RSQUARE = 'RSQUARE'
+TT_LBRACE = 'LBRACE'
+TT_RBRACE = 'RBRACE'
+TT_COLON = 'COLON'
 TT_DOT = 'DOT'
 TT_EE = 'EE'
 TT_NE = 'NE'
@@ -28,19 +31,23 @@ TT_ARROW = 'ARROW'
 TT_NEWLINE = 'NEWLINE'
 TT_EOF = 'EOF'
 
-KEYWORDS = [
+KEYWORDS = frozenset([
   'and', 'or', 'not',
   'if', 'elif', 'else', 'then', 'end',
   'for', 'to', 'step', 'while', 'fun', 'return', 'continue', 'break',
   'repeat', 'times', 'is'
-]
+])
+# 'in' is a keyword only where a binary operator can appear (see
+# Parser.binary_expr), so older programs may still use it as a name
 
 @dataclass
 class Token:
     type: str
     value: Optional[Any] = None
-    pos_start: Any = None
-    pos_end: Any = None
+    # Offsets into source; resolved to line/column only when rendering errors
+    start: int = 0
+    end: int = 0
+    source: Any = None
 
     def matches(self, type_: str, value: Any) -> bool:
         return self.type == type_ and self.value == value
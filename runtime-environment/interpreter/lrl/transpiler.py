@@ -0,0 +1,786 @@
+import ast
+import itertools
+import operator
+import sys
+from . import operations
+from .tokens import *
+from .nodes import (walk, iter_child_nodes, VarAccessNode, VarAssignNode, BinOpNode, UnaryOpNode, DictNode, SetNode,
+                    ForNode, WhileNode, FuncDefNode, CallNode, BreakNode, ContinueNode, StatementsNode)
+from .values import String, List, Array, Dict, Set, Function, key_of, unhashable, box, NUMBER_TYPES, SCALAR_TYPES
+from .operations import OperationFailed, dict_key
+from .runtime import Context, ReturnSignal, BreakSignal, ContinueSignal
+from .errors import RTError
+from .interpreter import Interpreter, BINARY_OPERATIONS, UNARY_OPERATIONS, loop_range, operator_key, SHORT_CIRCUIT
+from .vm import VM
+
+# Generated code holds values as the other backends do at run time (see
+# lrl.values.box): numbers and strings as Python int/float/str, long
+# concatenations as String ropes, and List, Array, Dict and Set values
+# holding such values. Only functions differ: they become Python `def`s,
+# converted to and from Function values at the boundary. Every variable `x`
+# becomes the Python name `v_x`. Python's rule that a name assigned in a
+# function is local to it is LRL's rule too.
+#
+# Operators run natively when both operands are numbers and otherwise call
+# the lrl.operations helpers, which raise on anything the Value classes
+# reject. The error itself is rebuilt by PythonProgram from the line it was
+# raised on.
+
+class UndefinedName(NameError):
+    def __init__(self, name):
+        super().__init__(name)
+        self.name = name
+
+class ForeignError(Exception):
+    """An RTError from a Value called by generated code, e.g. a built-in.
+    `context` stands for the calling frame until the error is reported."""
+    def __init__(self, error, context):
+        self.error = error
+        self.context = context
+
+# Per LRL operator: the expression used when both operands are numbers, the
+# helper used otherwise, and whether the native expression is a Python bool
+# that has to become 0 or 1
+BINARY_TEMPLATES = {
+    TT_PLUS: ('{} + {}', 'op_add', False),
+    TT_MINUS: ('{} - {}', 'op_sub', False),
+    TT_MUL: ('{} * {}', 'op_mul', False),
+    TT_DIV: ('{} / {}', 'op_div', False),
+    TT_POW: ('{} ** {}', 'op_pow', False),
+    TT_EE: ('{} == {}', 'op_eq', True),
+    TT_NE: ('{} != {}', 'op_ne', True),
+    TT_LT: ('{} < {}', 'op_lt', True),
+    TT_GT: ('{} > {}', 'op_gt', True),
+    TT_LTE: ('{} <= {}', 'op_lte', True),
+    TT_GTE: ('{} >= {}', 'op_gte', True),
+    (TT_KEYWORD, 'and'): ('int({} and {})', 'op_and', False),
+    (TT_KEYWORD, 'or'): ('int({} or {})', 'op_or', False),
+    (TT_KEYWORD, 'is'): ('{} == {}', 'op_eq', True),
+    # Never true of two numbers: the helper raises
+    (TT_KEYWORD, 'in'): ('op_in({}, {})', 'op_in', False),
+}
+
+UNARY_TEMPLATES = {
+    TT_MINUS: ('-{}', 'op_neg', False),
+    (TT_KEYWORD, 'not'): ('{} == 0', 'op_not', True),
+}
+
+# Names every generated program can use besides its variables
+RUNTIME = {
+    'NUMBER_TYPES': NUMBER_TYPES,
+    'SCALAR_TYPES': SCALAR_TYPES,
+    'String': String,
+    'loop_range': loop_range,
+    'List': List,
+    'Dict': Dict,
+    'Set': Set,
+    'dict_key': dict_key,
+    'ReturnSignal': ReturnSignal,
+    'BreakSignal': BreakSignal,
+    'ContinueSignal': ContinueSignal,
+}
+RUNTIME.update((template[1], getattr(operations, template[1])) for template in BINARY_TEMPLATES.values())
+RUNTIME.update((template[1], getattr(operations, template[1])) for template in UNARY_TEMPLATES.values())
+
+def has_binding(node):
+    return any(isinstance(child, (VarAssignNode, ForNode, FuncDefNode)) for child in walk(node))
+
+def loop_escapes(node):
+    """Whether a break or continue outside of any loop could leave a
+    function body under `node`. The tree-walking interpreter lets such a
+    signal end the caller's loop iteration, so loops must catch it."""
+    stack = [(node, False)]
+    while stack:
+        node, in_loop = stack.pop()
+        if isinstance(node, (BreakNode, ContinueNode)) and not in_loop:
+            return True
+        if isinstance(node, FuncDefNode):
+            stack.append((node.body_node, False))
+            continue
+        if isinstance(node, (ForNode, WhileNode)):
+            stack.append((node.body_node, True))
+            stack.extend((child, in_loop) for child in iter_child_nodes(node) if child is not node.body_node)
+            continue
+        stack.extend((child, in_loop) for child in iter_child_nodes(node))
+    return False
+
+def value_source(node):
+    """The node an atom for `node`'s value was read from: a block's value is
+    its last statement's, and unary plus passes its operand through."""
+    while True:
+        if isinstance(node, StatementsNode) and node.statements:
+            node = node.statements[-1]
+        elif isinstance(node, UnaryOpNode) and node.op_tok.type == TT_PLUS:
+            node = node.node
+        else:
+            return node
+
+class FunctionState:
+    def __init__(self, node, py_name, params):
+        self.node = node
+        self.py_name = py_name
+        self.params = params
+        self.arg_names = [arg_tok.value for arg_tok in node.arg_name_toks]
+        self.name = node.var_name_tok.value if node.var_name_tok else None
+        self.tail_loop = False
+        # The calls the function makes to itself in tail position
+        self.tail_sites = []
+
+class Transpiler:
+    """Translates an AST from lrl.nodes into the source of a Python module.
+
+    The AST must have been through lrl.scope.resolve_scopes. Each generated
+    line is recorded with the node it evaluates and the names or literals
+    holding that node's operands, so PythonProgram can turn a Python
+    exception back into the RTError the interpreter would report.
+    """
+
+    def __init__(self):
+        self.lines = []
+        # Per generated line (1-based): (node, [(operand atom, operand node)])
+        self.line_info = [None]
+        self.indent = 0
+        self.temps = itertools.count(1)
+        self.functions = itertools.count(1)
+        self.function = None
+        self.loop_depth = 0
+        self.escapes = False
+
+    def transpile(self, node, name='<program>'):
+        self.escapes = loop_escapes(node)
+        atom, kind = self.value(node)
+        self.emit(f'__result__ = {atom}', node, [(atom, node)])
+        return PythonProgram(name, '\n'.join(self.lines) + '\n', self.line_info)
+
+    def emit(self, line, node=None, operands=()):
+        self.lines.append('    ' * self.indent + line)
+        self.line_info.append((node, list(operands)) if node is not None else None)
+
+    def temp(self):
+        return f't{next(self.temps)}'
+
+    def block_end(self, start):
+        # A Python block needs at least one statement
+        if len(self.lines) == start:
+            self.emit('pass')
+
+    # --- Values ---
+    # value() emits the code computing a node and returns an atom naming the
+    # result (a temp, a variable or a literal) and its kind: 'num' when it is
+    # known to be a number, else None. effect() does the same when the result
+    # is not needed.
+
+    def value(self, node):
+        method = getattr(self, f'value_{type(node).__name__}', self.no_value_method)
+        return method(node)
+
+    def effect(self, node):
+        method = getattr(self, f'effect_{type(node).__name__}', None)
+        if method is None:
+            self.value(node)
+        else:
+            method(node)
+
+    def no_value_method(self, node):
+        raise Exception(f'No value_{type(node).__name__} method defined')
+
+    def operands(self, nodes):
+        atoms = []
+        for index, node in enumerate(nodes):
+            atom, kind = self.value(node)
+            if atom.startswith('v_') and any(has_binding(later) for later in nodes[index + 1:]):
+                # A later operand rebinds variables: keep the value read now
+                temp = self.temp()
+                self.emit(f'{temp} = {atom}', node, [(atom, node)])
+                atom = temp
+            atoms.append((atom, kind))
+        return atoms
+
+    def number_guard(self, atoms):
+        return ' and '.join(f'{atom}.__class__ in NUMBER_TYPES' for atom, kind in atoms if kind != 'num')
+
+    def value_NumberNode(self, node):
+        value = node.tok.value
+        # Negative literals come from lrl.optimizer; `-2 ** 2` would be -4
+        return (f'({value!r})' if value < 0 else repr(value)), 'num'
+
+    def value_StringNode(self, node):
+        return repr(node.tok.value), None
+
+    def value_ListNode(self, node):
+        atoms = self.operands(node.element_nodes)
+        temp = self.temp()
+        self.emit(f'{temp} = List([{", ".join(atom for atom, kind in atoms)}])', node,
+                  [(atom, element) for (atom, kind), element in zip(atoms, node.element_nodes)])
+        return temp, None
+
+    def value_DictNode(self, node):
+        parts = [part for entry_node in node.entry_nodes for part in entry_node]
+        atoms = [atom for atom, kind in self.operands(parts)]
+        entries = ', '.join(f'dict_key({key}): {value}' for key, value in zip(atoms[::2], atoms[1::2]))
+        temp = self.temp()
+        self.emit(f'{temp} = Dict({{{entries}}})', node, list(zip(atoms, parts)))
+        return temp, None
+
+    def value_SetNode(self, node):
+        atoms = [atom for atom, kind in self.operands(node.element_nodes)]
+        entries = ', '.join(f'dict_key({atom}): None' for atom in atoms)
+        temp = self.temp()
+        self.emit(f'{temp} = Set({{{entries}}})', node, list(zip(atoms, node.element_nodes)))
+        return temp, None
+
+    def value_StatementsNode(self, node):
+        if not node.statements:
+            return '0', 'num'
+        for statement in node.statements[:-1]:
+            self.effect(statement)
+        return self.value(node.statements[-1])
+
+    def effect_StatementsNode(self, node):
+        for statement in node.statements:
+            self.effect(statement)
+
+    def value_VarAccessNode(self, node):
+        name = node.var_name_tok.value
+        var = f'v_{name}'
+        if node.slot is not None:
+            if name in self.function.arg_names:
+                # Arguments are always bound
+                return var, None
+            # A local read before it is assigned falls back to the callers
+            temp = self.temp()
+            self.emit(f'{temp} = {var} if {var} is not None else lookup({name!r})', node)
+            return temp, None
+        if node.dynamic:
+            temp = self.temp()
+            self.emit(f'{temp} = lookup({name!r})', node)
+            return temp, None
+        return var, None
+
+    def effect_VarAccessNode(self, node):
+        atom, kind = self.value(node)
+        if atom.startswith('v_'):
+            # Still fail on an undefined global
+            self.emit(atom, node, [(atom, node)])
+
+    def value_VarAssignNode(self, node):
+        atom, kind = self.value(node.value_node)
+        var = f'v_{node.var_name_tok.value}'
+        self.emit(f'{var} = {atom}', node, [(atom, node.value_node)])
+        return var, kind
+
+    def value_BinOpNode(self, node):
+        if operator_key(node.op_tok) in SHORT_CIRCUIT:
+            return self.short_circuit(node)
+        (left, left_kind), (right, right_kind) = self.operands([node.left_node, node.right_node])
+        native, helper, is_bool = BINARY_TEMPLATES[operator_key(node.op_tok)]
+        expr = native.format(left, right)
+        if is_bool:
+            expr = f'(1 if {expr} else 0)'
+        guard = self.number_guard([(left, left_kind), (right, right_kind)])
+        if guard:
+            expr = f'{expr} if {guard} else {helper}({left}, {right})'
+        temp = self.temp()
+        self.emit(f'{temp} = {expr}', node, [(left, node.left_node), (right, node.right_node)])
+        return temp, 'num' if is_bool or helper in ('op_and', 'op_or', 'op_in') or not guard else None
+
+    def short_circuit(self, node):
+        """'and'/'or': the right operand is only evaluated in the branch
+        where the left one does not decide the result."""
+        key = operator_key(node.op_tok)
+        native, helper, is_bool = BINARY_TEMPLATES[key]
+        left, left_kind = self.value(node.left_node)
+        if left.startswith('v_') and has_binding(node.right_node):
+            temp = self.temp()
+            self.emit(f'{temp} = {left}', node.left_node, [(left, node.left_node)])
+            left = temp
+        test = f'{left} != 0' if SHORT_CIRCUIT[key] else f'{left} == 0'
+        guard = self.number_guard([(left, left_kind)])
+        if guard:
+            test = f'{guard} and {test}'
+        temp = self.temp()
+        self.emit(f'if {test}:', node, [(left, node.left_node)])
+        self.indent += 1
+        self.emit(f'{temp} = int({left})', node, [(left, node.left_node)])
+        self.indent -= 1
+        self.emit('else:')
+        self.indent += 1
+        right, right_kind = self.value(node.right_node)
+        expr = native.format(left, right)
+        guard = self.number_guard([(left, left_kind), (right, right_kind)])
+        if guard:
+            expr = f'{expr} if {guard} else {helper}({left}, {right})'
+        self.emit(f'{temp} = {expr}', node, [(left, node.left_node), (right, node.right_node)])
+        self.indent -= 1
+        return temp, 'num'
+
+    def value_UnaryOpNode(self, node):
+        atom, kind = self.value(node.node)
+        key = operator_key(node.op_tok)
+        if key == TT_PLUS:
+            return atom, kind
+        native, helper, is_bool = UNARY_TEMPLATES[key]
+        expr = native.format(atom)
+        if is_bool:
+            expr = f'(1 if {expr} else 0)'
+        guard = self.number_guard([(atom, kind)])
+        if guard:
+            expr = f'{expr} if {guard} else {helper}({atom})'
+        temp = self.temp()
+        self.emit(f'{temp} = {expr}', node, [(atom, node.node)])
+        return temp, 'num' if is_bool or not guard else None
+
+    def condition(self, node):
+        """Emit what a condition needs and return (Python truth expression,
+        node, operands) for the line that tests it."""
+        if isinstance(node, BinOpNode) and BINARY_TEMPLATES[operator_key(node.op_tok)][2]:
+            (left, left_kind), (right, right_kind) = self.operands([node.left_node, node.right_node])
+            native, helper, is_bool = BINARY_TEMPLATES[operator_key(node.op_tok)]
+            expr = native.format(left, right)
+            guard = self.number_guard([(left, left_kind), (right, right_kind)])
+            if guard:
+                expr = f'({expr} if {guard} else {helper}({left}, {right}))'
+            return expr, node, [(left, node.left_node), (right, node.right_node)]
+        atom, kind = self.value(node)
+        if kind == 'num':
+            return atom, node, [(atom, node)]
+        return f'({atom}.__class__ in SCALAR_TYPES and {atom} or {atom}.__class__ is String)', node, [(atom, node)]
+
+    def value_IfNode(self, node, result=True):
+        temp = self.temp() if result else None
+        depth = 0
+        for index, (condition, expr, should_return_null) in enumerate(node.cases):
+            start = len(self.lines)
+            test, test_node, operands = self.condition(condition)
+            if index > 0 and len(self.lines) == start:
+                # Nothing to compute first: turn the 'else:' into an 'elif'
+                self.lines.pop()
+                self.line_info.pop()
+                self.indent -= 1
+                depth -= 1
+                self.emit(f'elif {test}:', test_node, operands)
+            else:
+                self.emit(f'if {test}:', test_node, operands)
+            self.indent += 1
+            self.branch(expr, should_return_null, temp)
+            self.indent -= 1
+            self.emit('else:')
+            self.indent += 1
+            depth += 1
+        if node.else_case:
+            expr, should_return_null = node.else_case
+            self.branch(expr, should_return_null, temp)
+        elif temp:
+            self.emit(f'{temp} = 0')
+        else:
+            # No else branch to run: drop the trailing 'else:'
+            self.lines.pop()
+            self.line_info.pop()
+        self.indent -= depth
+        return temp, None
+
+    def effect_IfNode(self, node):
+        self.value_IfNode(node, result=False)
+
+    def branch(self, expr, should_return_null, temp):
+        start = len(self.lines)
+        if temp and not should_return_null:
+            atom, kind = self.value(expr)
+            self.emit(f'{temp} = {atom}', expr, [(atom, expr)])
+        else:
+            self.effect(expr)
+            if temp:
+                self.emit(f'{temp} = 0')
+        self.block_end(start)
+
+    def value_ForNode(self, node, result=True):
+        nodes = [node.start_value_node, node.end_value_node]
+        if node.step_value_node:
+            nodes.append(node.step_value_node)
+        atoms = self.operands(nodes)
+        if not node.step_value_node:
+            atoms.append(('1', 'num'))
+        elements = self.temp() if result and not node.should_return_null else None
+        if elements:
+            self.emit(f'{elements} = []')
+        var = f'v_{node.var_name_tok.value}'
+        self.emit(f'for {var} in loop_range({", ".join(atom for atom, kind in atoms)}):', node,
+                  [(atom, operand) for (atom, kind), operand in zip(atoms, nodes)])
+        self.loop_body(node.body_node, elements)
+        return self.loop_result(elements)
+
+    def effect_ForNode(self, node):
+        self.value_ForNode(node, result=False)
+
+    def value_WhileNode(self, node, result=True):
+        elements = self.temp() if result and not node.should_return_null else None
+        if elements:
+            self.emit(f'{elements} = []')
+        self.emit('while True:')
+        self.indent += 1
+        test, test_node, operands = self.condition(node.condition_node)
+        self.emit(f'if not {test}:', test_node, operands)
+        self.indent += 1
+        self.emit('break')
+        self.indent -= 1
+        self.indent -= 1
+        self.loop_body(node.body_node, elements)
+        return self.loop_result(elements)
+
+    def effect_WhileNode(self, node):
+        self.value_WhileNode(node, result=False)
+
+    def loop_result(self, elements):
+        if not elements:
+            return '0', 'num'
+        self.emit(f'{elements} = List({elements})')
+        return elements, None
+
+    def loop_body(self, body_node, elements):
+        self.indent += 1
+        self.loop_depth += 1
+        catch = self.escapes and any(isinstance(child, CallNode) for child in walk(body_node))
+        if catch:
+            self.emit('try:')
+            self.indent += 1
+        start = len(self.lines)
+        if elements:
+            atom, kind = self.value(body_node)
+            self.emit(f'{elements}.append({atom})', body_node, [(atom, body_node)])
+        else:
+            self.effect(body_node)
+        self.block_end(start)
+        if catch:
+            # A break or continue escaping a function called in the body
+            self.indent -= 1
+            self.emit('except BreakSignal:')
+            self.emit('    break')
+            self.emit('except ContinueSignal:')
+            self.emit('    continue')
+        self.loop_depth -= 1
+        self.indent -= 1
+
+    def value_FuncDefNode(self, node):
+        py_name = f'f{next(self.functions)}'
+        arg_names = [arg_tok.value for arg_tok in node.arg_name_toks]
+        if len(set(arg_names)) == len(arg_names):
+            params = [f'v_{name}' for name in arg_names]
+        else:
+            # Python rejects repeated parameters; the last one wins in LRL
+            params = [f'p{index}' for index in range(len(arg_names))]
+        outer = self.function, self.loop_depth, self.temps
+        self.function = FunctionState(node, py_name, params)
+        self.loop_depth = 0
+        self.temps = itertools.count(1)
+        self.function.tail_sites = self.self_tail_calls(node)
+        self.function.tail_loop = bool(self.function.tail_sites)
+
+        self.emit(f'def {py_name}({", ".join(params)}):', node)
+        self.indent += 1
+        if self.function.tail_loop:
+            # The tail calls made so far, for the execution trace (see
+            # PythonProgram.runtime_error): from a single call site a count,
+            # with that call as this line's node, else the line of each
+            initial = '[]' if len(self.function.tail_sites) > 1 else '0'
+            self.emit(f'tail_calls = {initial}', self.function.tail_sites[0])
+        local_names = [name for name in node.scope.names if name not in arg_names]
+        if local_names:
+            self.emit(' = '.join(f'v_{name}' for name in local_names) + ' = None')
+        if self.function.tail_loop:
+            self.emit('while True:')
+            self.indent += 1
+        if params != [f'v_{name}' for name in arg_names]:
+            for param, name in zip(params, arg_names):
+                self.emit(f'v_{name} = {param}')
+        start = len(self.lines)
+        if node.should_auto_return:
+            atom, kind = self.value(node.body_node)
+            self.emit(f'return {atom}', node.body_node, [(atom, node.body_node)])
+        else:
+            self.effect(node.body_node)
+            self.emit('return 0')
+        self.block_end(start)
+        if self.function.tail_loop:
+            self.indent -= 1
+        self.indent -= 1
+        self.function, self.loop_depth, self.temps = outer
+
+        if node.var_name_tok:
+            var = f'v_{node.var_name_tok.value}'
+            self.emit(f'{var} = {py_name}')
+            return var, None
+        return py_name, None
+
+    def self_tail_calls(self, node):
+        return [child for child in self.function_calls(node.body_node) if self.is_self_tail_call(child)]
+
+    def function_calls(self, body_node):
+        # Calls in the body outside of loops and nested functions
+        stack = [body_node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, CallNode):
+                yield node
+            if not isinstance(node, (FuncDefNode, ForNode, WhileNode)):
+                stack.extend(iter_child_nodes(node))
+
+    def is_self_tail_call(self, node):
+        function = self.function
+        return (node.tail and function.name is not None and self.loop_depth == 0 and
+                isinstance(node.node_to_call, VarAccessNode) and
+                node.node_to_call.var_name_tok.value == function.name and
+                len(node.arg_nodes) == len(function.params))
+
+    def value_CallNode(self, node):
+        atoms = self.operands([node.node_to_call] + node.arg_nodes)
+        callee = atoms[0][0]
+        args = [atom for atom, kind in atoms[1:]]
+        operands = [(atom, operand) for (atom, kind), operand in zip(atoms, [node.node_to_call] + node.arg_nodes)]
+        if self.function is not None and self.function.tail_loop and self.is_self_tail_call(node):
+            # A tail call to the function itself loops instead of recursing
+            self.emit(f'if {callee} is {self.function.py_name}:', node, operands)
+            self.indent += 1
+            if len(self.function.tail_sites) > 1:
+                self.emit(f'tail_calls.append({len(self.lines)})')
+            else:
+                self.emit('tail_calls += 1')
+            if args:
+                self.emit(f'{", ".join(self.function.params)} = {", ".join(args)}', node, operands[1:])
+            self.emit('continue')
+            self.indent -= 1
+        temp = self.temp()
+        self.emit(f'{temp} = {callee}({", ".join(args)})', node, operands)
+        return temp, None
+
+    def value_ReturnNode(self, node):
+        if node.node_to_return:
+            atom, kind = self.value(node.node_to_return)
+            operands = [(atom, node.node_to_return)]
+        else:
+            atom, operands = '0', []
+        if self.function is None:
+            # A top-level return ends the program
+            self.emit('raise ReturnSignal(None)', node)
+        else:
+            self.emit(f'return {atom}', node, operands)
+        return '0', 'num'
+
+    def value_ContinueNode(self, node):
+        self.emit('continue' if self.loop_depth else 'raise ContinueSignal()', node)
+        return '0', 'num'
+
+    def value_BreakNode(self, node):
+        self.emit('break' if self.loop_depth else 'raise BreakSignal()', node)
+        return '0', 'num'
+
+class PythonProgram:
+    """A transpiled program: its Python source, the code compiled from it,
+    and the LRL node behind each generated line."""
+
+    filenames = itertools.count(1)
+
+    def __init__(self, name, source, line_info):
+        self.name = name
+        self.source = source
+        self.line_info = line_info
+        # Unique, so frames of this program can be told apart from any other
+        self.filename = f'<lrl {next(PythonProgram.filenames)}: {name}>'
+        self.code = compile(source, self.filename, 'exec')
+
+    def node_at(self, lineno):
+        """The LRL node evaluated by generated line `lineno`."""
+        info = self.line_info[lineno] if 0 < lineno < len(self.line_info) else None
+        return info[0] if info else None
+
+    def span_at(self, lineno):
+        node = self.node_at(lineno)
+        return (node.pos_start, node.pos_end) if node else None
+
+    def run(self, context):
+        global_table = context.symbol_table
+        namespace = dict(RUNTIME)
+        for name, cell in global_table.cells.items():
+            if cell.value is not None:
+                namespace[f'v_{name}'] = self.from_runtime(cell.value, context)
+        namespace['lookup'] = self.lookup_function(namespace)
+        try:
+            exec(self.code, namespace)
+            value = self.to_runtime(namespace['__result__'])
+        except (ReturnSignal, BreakSignal, ContinueSignal):
+            # A top-level return/break/continue ends the program
+            value = None
+        except (OperationFailed, ForeignError, ArithmeticError, LookupError,
+                NameError, TypeError, ValueError, RecursionError) as exception:
+            self.write_back(namespace, global_table)
+            return None, self.runtime_error(exception, context)
+        self.write_back(namespace, global_table)
+        return value, None
+
+    def write_back(self, namespace, global_table):
+        for key, value in namespace.items():
+            if key.startswith('v_'):
+                global_table.set(key[2:], self.to_runtime(value))
+
+    def lookup_function(self, namespace):
+        filename = self.filename
+
+        def lookup(name):
+            # Dynamic scoping: the nearest caller frame with the name bound,
+            # then the top level
+            key = f'v_{name}'
+            frame = sys._getframe(2)
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename == filename and code.co_name != '<module>' and key in code.co_varnames:
+                    value = frame.f_locals.get(key)
+                    if value is not None:
+                        return value
+                frame = frame.f_back
+            value = namespace.get(key)
+            if value is None:
+                raise UndefinedName(key)
+            return value
+        return lookup
+
+    # --- Conversion at the boundary with the other backends ---
+
+    def to_runtime(self, value):
+        """`value` as the other backends hold it: functions of this program
+        become Function values."""
+        cls = value.__class__
+        if cls in SCALAR_TYPES or cls is String or cls is Array or cls is Set:
+            return value
+        if cls is List or cls is Dict:
+            return self.converted(value, self.to_runtime)
+        foreign = getattr(value, 'lrl_value', None)
+        if foreign is not None:
+            return foreign
+        node = self.node_at(value.__code__.co_firstlineno)
+        function = Function(node.var_name_tok.value if node.var_name_tok else None, node.body_node,
+                            [arg_tok.value for arg_tok in node.arg_name_toks], node.should_auto_return)
+        # Runs on the tree-walking interpreter if called outside this program
+        function.interpreter = Interpreter()
+        function.interpreter.attach_handlers(node.body_node)
+        function.interpreter.frame_stack = VM(function.interpreter)
+        function.scope = node.scope
+        function.definition = node
+        return function
+
+    def from_runtime(self, value, context):
+        """`value`, held as the other backends do, for generated code:
+        Function and built-in values become Python callables."""
+        cls = value.__class__
+        if cls in SCALAR_TYPES or cls is String or cls is Set or cls is Array:
+            return value
+        if cls is List or cls is Dict:
+            return self.converted(value, lambda element: self.from_runtime(element, context))
+        return self.foreign(value, context)
+
+    def converted(self, value, convert):
+        """List or Dict `value` with `convert` applied to its elements, or
+        `value` itself if that leaves them all as they were, as it does
+        unless they include functions."""
+        if value.__class__ is List:
+            elements = [convert(element) for element in value.elements]
+            return List(elements) if any(map(operator.is_not, elements, value.elements)) else value
+        items = value.entries.items()
+        entries = {key: convert(entry) for key, entry in items}
+        return Dict(entries) if any(map(operator.is_not, entries.values(), (entry for key, entry in items))) else value
+
+    def foreign(self, value, context):
+        """Wrap a Value, such as a built-in, so generated code can call it."""
+        program = self
+
+        def call(*args):
+            call_node = program.node_at(sys._getframe(1).f_lineno)
+            caller = Context('<program>', source=context.source)
+            caller.symbol_table = context.symbol_table
+            res = value.execute([program.to_runtime(arg) for arg in args], caller, call_node)
+            if res.error:
+                raise ForeignError(res.error, caller)
+            return program.from_runtime(res.value, context)
+        call.lrl_value = value
+        return call
+
+    # --- Errors ---
+
+    def runtime_error(self, exception, context):
+        frames = []
+        tb = exception.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == self.filename:
+                frames.append((tb.tb_frame, tb.tb_lineno))
+            tb = tb.tb_next
+        # The innermost context of each frame: a function that loops on its
+        # tail calls has one more per call, as the other backends do
+        contexts = [context]
+        for index in range(1, len(frames)):
+            call_node = self.node_at(frames[index - 1][1])
+            func_node = self.node_at(frames[index][0].f_code.co_firstlineno)
+            name = func_node.var_name_tok.value if func_node.var_name_tok else '<anonymous>'
+            caller = Context(name, contexts[-1], call_node.pos_start)
+            tail_calls = frames[index][0].f_locals.get('tail_calls', ())
+            if tail_calls.__class__ is int:
+                # Made from the one call site, the node of the line after the def
+                tail_calls = itertools.repeat(frames[index][0].f_code.co_firstlineno + 1, tail_calls)
+            for lineno in tail_calls:
+                caller = Context(name, caller, self.node_at(lineno).pos_start)
+            contexts.append(caller)
+
+        if isinstance(exception, ForeignError):
+            caller, real = exception.context, contexts[-1]
+            caller.display_name = real.display_name
+            caller.parent = real.parent
+            caller.parent_entry_pos = real.parent_entry_pos
+            caller.source = real.source
+            return exception.error
+
+        if isinstance(exception, RecursionError):
+            # Report the innermost call that could not be made
+            for index in range(len(frames) - 1, -1, -1):
+                node = self.node_at(frames[index][1])
+                if isinstance(node, CallNode):
+                    return RTError(node.pos_start, node.pos_end, 'Maximum recursion depth exceeded', contexts[index])
+            raise exception
+
+        frame, lineno = frames[-1]
+        node, operands = self.line_info[lineno]
+        context = contexts[-1]
+
+        if isinstance(exception, NameError):
+            var_node = node
+            for atom, operand in operands:
+                if atom == getattr(exception, 'name', None):
+                    var_node = value_source(operand)
+            if isinstance(var_node, VarAccessNode):
+                name = var_node.var_name_tok.value
+                return RTError(var_node.pos_start, var_node.pos_end, f"'{name}' is not defined", context)
+            raise exception
+
+        values = [self.operand_value(frame, atom) for atom, operand in operands]
+        stamped = [box(self.to_runtime(value)).copy().set_pos(operand.pos_start, operand.pos_end).set_context(context)
+                   for value, (atom, operand) in zip(values, operands)]
+        error = None
+        if isinstance(node, BinOpNode):
+            error = BINARY_OPERATIONS[operator_key(node.op_tok)](*stamped)[1]
+        elif isinstance(node, UnaryOpNode):
+            error = UNARY_OPERATIONS[operator_key(node.op_tok)](*stamped)[1]
+        elif isinstance(node, CallNode):
+            callee = stamped[0]
+            if isinstance(callee, Function):
+                error = callee.check_args(callee.arity, stamped[1:], context, node)
+            else:
+                error = callee.execute(stamped[1:], context, node).error
+        elif isinstance(node, (DictNode, SetNode)):
+            keys = stamped[::2] if isinstance(node, DictNode) else stamped
+            error = next((unhashable(key) for key in keys if key_of(key) is None), None)
+        if error is None:
+            raise exception
+        return error
+
+    def operand_value(self, frame, atom):
+        if atom in frame.f_locals:
+            return frame.f_locals[atom]
+        if atom in frame.f_globals:
+            return frame.f_globals[atom]
+        return ast.literal_eval(atom)
@@ -1,8 +1,19 @@
 import math
+import operator
 import sys
+from array import array
+from itertools import islice, repeat
 from .errors import RTError
+from .runtime import RTResult, TailCall, new_frame, release_frames
 
 class Value:
+    # Values are shared, not copied, as they flow through evaluation. The
+    # position and context are only filled in on copies made to report an
+    # error (see Interpreter.binary_error). Until then they read as None
+    # from the class.
+    pos_start = pos_end = None
+    context = None
+
     def __init__(self):
         self.set_pos()
         self.set_context()
@@ -58,9 +69,16 @@ class Value:
     def notted(self):
         return None, self.illegal_operation()
 
-    def execute(self, args):
-        from .runtime import RTResult
-        return RTResult().failure(self.illegal_operation())
+    def contained_in(self, other):
+        if isinstance(other, (Dict, Set)):
+            key = key_of(self)
+            if key is None:
+                return None, unhashable(self)
+            return Number(int(key in other.entries)), None
+        return None, self.illegal_operation(other)
+
+    def execute(self, args, context, call_node):
+        return RTResult().failure(RTError(call_node.pos_start, call_node.pos_end, 'Illegal operation', context))
 
     def copy(self):
         raise Exception('No copy method defined')
@@ -77,31 +95,39 @@ class Value:
         )
 
 class Number(Value):
+    # Made on every arithmetic operation, so the position and context are
+    # left to the class defaults
     def __init__(self, value):
-        super().__init__()
         self.value = value
 
     def added_to(self, other):
         if isinstance(other, Number):
             return Number(self.value + other.value).set_context(self.context), None
+        if isinstance(other, Array):
+            return other.operate(operator.add, self, reflected=True)
         return None, Value.illegal_operation(self, other)
 
     def subbed_by(self, other):
         if isinstance(other, Number):
             return Number(self.value - other.value).set_context(self.context), None
+        if isinstance(other, Array):
+            return other.operate(operator.sub, self, reflected=True)
         return None, Value.illegal_operation(self, other)
 
     def multed_by(self, other):
         if isinstance(other, Number):
             return Number(self.value * other.value).set_context(self.context), None
+        if isinstance(other, Array):
+            return other.operate(operator.mul, self, reflected=True)
         return None, Value.illegal_operation(self, other)
 
     def dived_by(self, other):
         if isinstance(other, Number):
             if other.value == 0:
-                from .runtime import RTResult
                 return None, RTError(other.pos_start, other.pos_end, 'Division by zero', self.context)
             return Number(self.value / other.value).set_context(self.context), None
+        if isinstance(other, Array):
+            return other.operate(operator.truediv, self, reflected=True)
         return None, Value.illegal_operation(self, other)
 
     def powed_by(self, other):
@@ -172,14 +198,51 @@ Number.false = Number(0)
 Number.true = Number(1)
 Number.math_PI = Number(math.pi)
 
+# Concatenations giving at least this many characters make a rope
+ROPE_MIN_LENGTH = 256
+
 class String(Value):
+    """Text held flat in `value`, or, for long concatenations, as a rope:
+    the first `count` pieces of the list `parts`, `length` characters in
+    all, joined into `value` the first time it is read.
+
+    Ropes made from one another share `parts` the way Vectors share their
+    storage: concatenating onto a rope whose pieces end at the end of
+    `parts` appends the new piece in place, so building text with
+    `out = out + line` joins each character once, when the result is
+    read, instead of copying `out` on every step. Like Number, leaves the
+    position and context to the class defaults.
+    """
+    parts = None
+
     def __init__(self, value):
-        super().__init__()
         self.value = value
 
+    def __getattr__(self, name):
+        # Only reached for `value` on a rope that has not been read yet
+        if name != 'value' or self.parts is None:
+            raise AttributeError(name)
+        value = self.value = ''.join(islice(self.parts, self.count))
+        return value
+
+    def concatenated(self, text):
+        """This string followed by the Python string `text`."""
+        parts = self.parts
+        if parts is None:
+            value = self.value
+            length = len(value) + len(text)
+            if length < ROPE_MIN_LENGTH:
+                return String(value + text)
+            return rope([value, text], length)
+        if self.count == len(parts):
+            parts.append(text)
+            return rope(parts, self.length + len(text))
+        # Another rope has grown `parts` past this one: start new pieces
+        return rope([self.value, text], self.length + len(text))
+
     def added_to(self, other):
         if isinstance(other, String):
-            return String(self.value + other.value).set_context(self.context), None
+            return self.concatenated(other.value).set_context(self.context), None
         return None, Value.illegal_operation(self, other)
 
     def get_comparison_eq(self, other):
@@ -198,7 +261,8 @@ class String(Value):
         return None, Value.illegal_operation(self, other)
 
     def is_true(self):
-        return len(self.value) > 0
+        # Ropes are never empty
+        return self.parts is not None or len(self.value) > 0
 
     def copy(self):
         c = String(self.value)
@@ -212,37 +276,159 @@ class String(Value):
     def __repr__(self):
         return f'"{self.value}"'
 
+def rope(parts, length):
+    string = String.__new__(String)
+    string.parts = parts
+    string.count = len(parts)
+    string.length = length
+    return string
+
+# Values at run time
+
+# While a program runs, every backend holds numbers as Python int, float or
+# complex and strings as Python str, so an operation on them makes no
+# object; only long concatenations stay String ropes. Lists, Dicts and Sets
+# hold their elements the same way. Numbers and Strings are made by box()
+# where a Value is needed: for built-ins, for the operands of an error and
+# for the result of lrl.runner.run_text.
+NUMBER_TYPES = frozenset((int, float, complex))
+# Types whose Python truth value is LRL's is_true(); anything else but a
+# String rope, which is never empty, is false
+SCALAR_TYPES = frozenset((int, float, complex, str))
+TEXT_TYPES = frozenset((str, String))
+# null (and false) at run time
+NULL = 0
+
+def box(value):
+    """The Value for run-time value `value`: a Number or String for a Python
+    number or str, `value` itself for anything else."""
+    cls = value.__class__
+    if cls is str:
+        return String(value)
+    if cls in NUMBER_TYPES:
+        return Number(value)
+    return value
+
+def unbox(value):
+    """The run-time value for Value `value`, undoing box()."""
+    cls = value.__class__
+    if cls is Number or (cls is String and value.parts is None):
+        return value.value
+    return value
+
+def is_true(value):
+    """is_true() of a run-time value."""
+    if value.__class__ in SCALAR_TYPES:
+        return bool(value)
+    return value.is_true()
+
+class Vector:
+    """An immutable sequence of Python objects, used for List elements.
+
+    A vector is the `start:stop` window of a Python list, its storage.
+    Vectors made from one another share their storage instead of copying
+    it: appending writes past the end of the storage when the vector ends
+    there, and removing the first or last element narrows the window. A
+    vector that does not end at the end of its storage, because another one
+    has already grown it, copies its window before growing, so no vector
+    ever sees another's elements change. Building a list one element at a
+    time is amortised O(1) per element; removing from the middle copies.
+    """
+    __slots__ = ('items', 'start', 'stop')
+
+    def __init__(self, items, start=0, stop=None):
+        # `items` belongs to the vector (and the ones made from it) from here on
+        self.items = items
+        self.start = start
+        self.stop = len(items) if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return islice(self.items, self.start, self.stop)
+
+    def offset(self, index):
+        """The storage offset of element `index`, which counts from the end
+        when negative, like a Python list index."""
+        if index.__class__ is not int:
+            raise TypeError('vector indices must be integers')
+        if index < 0:
+            index += self.stop - self.start
+        if not 0 <= index < self.stop - self.start:
+            raise IndexError('vector index out of range')
+        return self.start + index
+
+    def __getitem__(self, index):
+        return self.items[self.offset(index)]
+
+    def get(self, index):
+        """Element `index` of an int `index`, as for [], or None if there
+        is none."""
+        if index < 0:
+            index += self.stop - self.start
+        if 0 <= index < self.stop - self.start:
+            return self.items[self.start + index]
+        return None
+
+    def storage(self):
+        """Storage this vector may extend in place, and where it starts."""
+        items = self.items
+        # Elements removed from the front are dropped once they make up
+        # most of the storage, when copying costs no more than they did
+        if self.stop == len(items) and self.start <= self.stop // 2:
+            return items, self.start
+        return items[self.start:self.stop], 0
+
+    def appended(self, item):
+        items, start = self.storage()
+        items.append(item)
+        return Vector(items, start, len(items))
+
+    def extended(self, other):
+        # Slice first: `other` may share this vector's storage
+        tail = other.items[other.start:other.stop]
+        items, start = self.storage()
+        items.extend(tail)
+        return Vector(items, start, len(items))
+
+    def removed(self, index):
+        offset = self.offset(index)
+        if offset == self.start:
+            return Vector(self.items, self.start + 1, self.stop)
+        if offset == self.stop - 1:
+            return Vector(self.items, self.start, self.stop - 1)
+        return Vector(self.items[self.start:offset] + self.items[offset + 1:self.stop])
+
 class List(Value):
+    # Operations return a new List, sharing the elements' storage where they
+    # can (see Vector); the operands are never changed. Elements are held as
+    # run-time values (see box). Like Number, leaves the position and
+    # context to the class defaults.
     def __init__(self, elements):
-        super().__init__()
-        self.elements = elements
+        # A Vector, or a Python list the new List takes over
+        self.elements = elements if elements.__class__ is Vector else Vector(elements)
 
     def added_to(self, other):
-        new_list = self.copy()
-        new_list.elements.append(other)
-        return new_list, None
+        return List(self.elements.appended(unbox(other))), None
 
     def subbed_by(self, other):
         if isinstance(other, Number):
-            new_list = self.copy()
             try:
-                new_list.elements.pop(other.value)
-                return new_list, None
+                return List(self.elements.removed(other.value)), None
             except Exception:
                 return None, RTError(other.pos_start, other.pos_end, 'Element index out of bounds', self.context)
         return None, Value.illegal_operation(self, other)
 
     def multed_by(self, other):
         if isinstance(other, List):
-            new_list = self.copy()
-            new_list.elements.extend(other.elements)
-            return new_list, None
+            return List(self.elements.extended(other.elements)), None
         return None, Value.illegal_operation(self, other)
 
     def dived_by(self, other):
         if isinstance(other, Number):
             try:
-                return self.elements[other.value], None
+                return box(self.elements[other.value]), None
             except Exception:
                 return None, RTError(other.pos_start, other.pos_end, 'Element index out of bounds', self.context)
         return None, Value.illegal_operation(self, other)
@@ -257,68 +443,367 @@ class List(Value):
         return ", ".join([str(x) for x in self.elements])
 
     def __repr__(self):
-        return f'[{", ".join([repr(x) for x in self.elements])}]'
+        return f'[{", ".join([repr(box(x)) for x in self.elements])}]'
+
+def elementwise(operation, left, right):
+    """A new array.array holding `operation` applied to each pair of
+    elements of `left` and `right`: array.arrays of the same length, or one
+    of them a Python number used with every element. Integer operands give
+    an integer array, except for a division. Raises ValueError when the
+    lengths differ, OverflowError when an integer result does not fit in
+    64 bits, TypeError for a non-real number and ZeroDivisionError."""
+    left_code = left.typecode if left.__class__ is array else ('q' if left.__class__ is int else 'd')
+    right_code = right.typecode if right.__class__ is array else ('q' if right.__class__ is int else 'd')
+    typecode = 'q' if left_code == right_code == 'q' and operation is not operator.truediv else 'd'
+    if left.__class__ is not array:
+        return array(typecode, map(operation, repeat(left, len(right)), right))
+    if right.__class__ is not array:
+        return array(typecode, map(operation, left, repeat(right, len(left))))
+    if len(left) != len(right):
+        raise ValueError('array lengths differ')
+    return array(typecode, map(operation, left, right))
+
+def number_array(values):
+    """An array.array of Python numbers: 64-bit integers if they all are
+    ints, floats otherwise."""
+    typecode = 'q' if all(value.__class__ is int for value in values) else 'd'
+    return array(typecode, values)
+
+class Array(Value):
+    """A list of numbers held unboxed in an array.array ('q' for integers,
+    'd' for floats). `+ - * /` with a Number or with an Array of the same
+    length apply element by element in one operation and give a new Array.
+    Like Number, leaves the position and context to the class defaults."""
+    def __init__(self, values):
+        # An array.array the new Array takes over
+        self.values = values
+
+    def operate(self, operation, other, reflected=False):
+        """`self <operation> other`, or `other <operation> self` when
+        `reflected`, for Number operators called with an Array."""
+        if isinstance(other, Number):
+            operand = other.value
+        elif isinstance(other, Array):
+            operand = other.values
+        else:
+            return None, Value.illegal_operation(self, other)
+        left, right = (other, self) if reflected else (self, other)
+        try:
+            if reflected:
+                values = elementwise(operation, operand, self.values)
+            else:
+                values = elementwise(operation, self.values, operand)
+            return Array(values), None
+        except ZeroDivisionError:
+            return None, RTError(right.pos_start, right.pos_end, 'Division by zero', self.context)
+        except ValueError:
+            return None, RTError(left.pos_start, right.pos_end,
+                                 f'Array lengths differ ({len(left.values)} and {len(right.values)})', self.context)
+        except OverflowError:
+            return None, RTError(left.pos_start, right.pos_end, 'Array element out of range', self.context)
+        except TypeError:
+            return None, Value.illegal_operation(left, right)
+
+    def added_to(self, other):
+        return self.operate(operator.add, other)
+
+    def subbed_by(self, other):
+        return self.operate(operator.sub, other)
+
+    def multed_by(self, other):
+        return self.operate(operator.mul, other)
+
+    def dived_by(self, other):
+        return self.operate(operator.truediv, other)
+
+    def copy(self):
+        c = Array(self.values)
+        c.set_pos(self.pos_start, self.pos_end)
+        c.set_context(self.context)
+        return c
+
+    def __str__(self):
+        return ", ".join([str(x) for x in self.values])
+
+    def __repr__(self):
+        return f'array([{", ".join([repr(x) for x in self.values])}])'
+
+# Dicts and sets
+
+# Stands for a key a Map did not have
+MISSING = object()
+
+class Map:
+    """An immutable mapping of Python keys, used for Dict and Set entries.
+
+    Maps made from one another share one Python dict, which holds the
+    entries of whichever of them was used last. Adding or replacing entries
+    updates the dict in place and leaves the old map a record of the change,
+    the keys and what they held before, relative to the new one. Reading a
+    map whose entries are held by another makes it the holder again by
+    undoing the changes between the two (redone, in turn, if the other one
+    is read next), so a dict built up one entry at a time costs O(1) per
+    entry, and going back to an older map costs one step per change since.
+    Entries stay in the order they were first added; removing one copies.
+    """
+    __slots__ = ('entries', 'changes', 'newer')
+
+    def __init__(self, entries):
+        # `entries` belongs to the map (and the ones made from it) from here on
+        self.entries = entries
+        self.changes = self.newer = None
+
+    def root(self):
+        """The Python dict of this map's entries, taken over from the map
+        holding it if necessary."""
+        entries = self.entries
+        if entries is not None:
+            return entries
+        path = []
+        holder = self
+        while holder.entries is None:
+            path.append(holder)
+            holder = holder.newer
+        entries = holder.entries
+        for older in reversed(path):
+            # Undo the changes from `older` to `holder`, recording how to
+            # redo them; the last undone is the first redone
+            redo = []
+            for key, entry in reversed(older.changes):
+                redo.append((key, entries.get(key, MISSING)))
+                if entry is MISSING:
+                    del entries[key]
+                else:
+                    entries[key] = entry
+            holder.entries, holder.changes, holder.newer = None, redo, older
+            older.entries, older.changes, older.newer = entries, None, None
+            holder = older
+        return entries
+
+    def __len__(self):
+        return len(self.root())
+
+    def __contains__(self, key):
+        return key in self.root()
+
+    def __getitem__(self, key):
+        return self.root()[key]
+
+    def get(self, key, default=None):
+        return self.root().get(key, default)
+
+    def items(self):
+        return list(self.root().items())
+
+    def updated(self, items):
+        """A map with the (key, entry) pairs `items` added or replacing
+        entries with the same key."""
+        entries = self.root()
+        changes = []
+        for key, entry in items:
+            changes.append((key, entries.get(key, MISSING)))
+            entries[key] = entry
+        newer = Map(entries)
+        self.entries, self.changes, self.newer = None, changes, newer
+        return newer
+
+    def removed(self, key):
+        entries = self.root()
+        if key not in entries:
+            raise KeyError(key)
+        entries = dict(entries)
+        del entries[key]
+        return Map(entries)
+
+def key_of(value):
+    """The Python key a Dict or Set files `value` under, boxed or not: its
+    number or text, so keys are equal when `==` says so. None for any other
+    value, which cannot be a key."""
+    cls = value.__class__
+    if cls in SCALAR_TYPES:
+        return value
+    if cls is Number or cls is String:
+        return value.value
+    return None
+
+def unhashable(value):
+    return RTError(value.pos_start, value.pos_end, 'Key must be a number or a string', value.context)
+
+class Dict(Value):
+    """A mapping from Number and String keys to values, both held as
+    run-time values (see box). `d / key` reads an entry, `key in d` tests
+    for one, `d + {key: value}` adds or replaces entries and `d - key`
+    removes one. Operations give a new Dict sharing its entries' storage
+    with this one (see Map). Like Number, leaves the position and context
+    to the class defaults."""
+    def __init__(self, entries):
+        # A Map, or a Python dict of keys to values the new Dict takes over
+        self.entries = entries if entries.__class__ is Map else Map(entries)
+
+    def added_to(self, other):
+        if isinstance(other, Dict):
+            return Dict(self.entries.updated(other.entries.items())), None
+        return None, Value.illegal_operation(self, other)
+
+    def subbed_by(self, other):
+        key = key_of(other)
+        if key is None:
+            return None, unhashable(other)
+        if key not in self.entries:
+            return None, RTError(other.pos_start, other.pos_end, 'Key not found', self.context)
+        return Dict(self.entries.removed(key)), None
+
+    def dived_by(self, other):
+        key = key_of(other)
+        if key is None:
+            return None, unhashable(other)
+        value = self.entries.get(key)
+        if value is None:
+            return None, RTError(other.pos_start, other.pos_end, 'Key not found', self.context)
+        return box(value), None
+
+    def copy(self):
+        c = Dict(self.entries)
+        c.set_pos(self.pos_start, self.pos_end)
+        c.set_context(self.context)
+        return c
+
+    def __str__(self):
+        return ", ".join([f'{key}: {value}' for key, value in self.entries.items()])
+
+    def __repr__(self):
+        return f'{{{", ".join([f"{box(key)!r}: {box(value)!r}" for key, value in self.entries.items()])}}}'
+
+class Set(Value):
+    """A set of Numbers and Strings, compared as Dict keys are. `x in s`
+    tests for a member, `s + x` adds one, `s - x` removes one and `s * t`
+    is the union. Operations give a new Set, as for Dict; like Number,
+    leaves the position and context to the class defaults."""
+    def __init__(self, entries):
+        # A Map, or a Python dict of keys (to None) the new Set takes over
+        self.entries = entries if entries.__class__ is Map else Map(entries)
+
+    def added_to(self, other):
+        key = key_of(other)
+        if key is None:
+            return None, unhashable(other)
+        return Set(self.entries.updated(((key, None),))), None
+
+    def subbed_by(self, other):
+        key = key_of(other)
+        if key is None:
+            return None, unhashable(other)
+        if key not in self.entries:
+            return None, RTError(other.pos_start, other.pos_end, 'Element not found', self.context)
+        return Set(self.entries.removed(key)), None
+
+    def multed_by(self, other):
+        if isinstance(other, Set):
+            return Set(self.entries.updated(other.entries.items())), None
+        return None, Value.illegal_operation(self, other)
+
+    def copy(self):
+        c = Set(self.entries)
+        c.set_pos(self.pos_start, self.pos_end)
+        c.set_context(self.context)
+        return c
+
+    def __str__(self):
+        return ", ".join([str(key) for key, entry in self.entries.items()])
+
+    def __repr__(self):
+        if not len(self.entries):
+            return 'set([])'
+        return f'{{{", ".join([repr(box(key)) for key, entry in self.entries.items()])}}}'
 
 class BaseFunction(Value):
     def __init__(self, name):
         super().__init__()
         self.name = name or "<anonymous>"
 
-    def generate_new_context(self):
-        from .runtime import Context, SymbolTable
-        new_ctx = Context(self.name, self.context, self.pos_start)
-        new_ctx.symbol_table = SymbolTable(new_ctx.parent.symbol_table)
-        return new_ctx
-
-    def check_args(self, arg_names, args):
-        from .runtime import RTResult
-        res = RTResult()
-        if len(args) > len(arg_names):
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{len(args) - len(arg_names)} too many args passed into {self}", self.context))
-        if len(args) < len(arg_names):
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{len(arg_names) - len(args)} too few args passed into {self}", self.context))
-        return res.success(None)
-
-    def populate_args(self, arg_names, args, exec_ctx):
-        for i in range(len(args)):
-            arg_name = arg_names[i]
-            arg_value = args[i]
-            arg_value.set_context(exec_ctx)
-            exec_ctx.symbol_table.set(arg_name, arg_value)
-
-    def check_and_populate_args(self, arg_names, args, exec_ctx):
-        from .runtime import RTResult
-        res = RTResult()
-        res.register(self.check_args(arg_names, args))
-        if res.should_return():
-            return res
-        self.populate_args(arg_names, args, exec_ctx)
-        return res.success(None)
+    def check_args(self, arity, args, context, call_node):
+        if len(args) > arity:
+            return RTError(call_node.pos_start, call_node.pos_end, f"{len(args) - arity} too many args passed into {self}", context)
+        if len(args) < arity:
+            return RTError(call_node.pos_start, call_node.pos_end, f"{arity - len(args)} too few args passed into {self}", context)
+        return None
+
+# Non-tail calls on the tree-walking backends are nested Python calls, about
+# ten Python frames each. Past MAX_NESTED_CALLS of them, Function.execute
+# hands the call to its interpreter's execute_deep, which runs it, and every
+# call it makes, on the frame stack of lrl.vm.VM. Call depth is then bounded
+# by memory instead of the Python recursion limit.
+MAX_NESTED_CALLS = 50
+# Calls running through Function.execute on the Python stack
+nested_calls = 0
 
 class Function(BaseFunction):
     def __init__(self, name, body_node, arg_names, should_auto_return):
         super().__init__(name)
         self.body_node = body_node
         self.arg_names = arg_names
+        self.arity = len(arg_names)
         self.should_auto_return = should_auto_return
-
-    def execute(self, args):
-        from .runtime import RTResult
-        from .interpreter import Interpreter
+        # Compiled body, set when the function is created by the bytecode VM
+        # or first called by it (see lrl.compiler.function_code)
+        self.code = None
+        # Interpreter that created the function; it evaluates the body (see
+        # Interpreter.execute_body)
+        self.interpreter = None
+        # lrl.scope.Scope of the body: the layout of each call's frame
+        self.scope = None
+        # FuncDefNode the function was made from, the calls made so far and
+        # the body compiled by lrl.tiering once the function is hot
+        self.definition = None
+        self.calls = 0
+        self.compiled = None
+
+    def execute(self, args, context, call_node):
+        global nested_calls
         res = RTResult()
-        interpreter = Interpreter()
-        exec_ctx = self.generate_new_context()
-        res.register(self.check_and_populate_args(self.arg_names, args, exec_ctx))
-        if res.should_return():
-            return res
-        value = res.register(interpreter.visit(self.body_node, exec_ctx))
-        if res.should_return() and res.func_return_value is None:
-            return res
-        ret_value = (value if self.should_auto_return else None) or res.func_return_value or Number.null
-        return res.success(ret_value)
+        caller = context
+        function = self
+        # Calls in tail position come back as a TailCall and are made by
+        # this loop, so tail recursion does not grow the Python stack. The
+        # callee's context still chains to the caller's, which keeps
+        # dynamic scoping and the execution trace intact.
+        while True:
+            if len(args) != function.arity:
+                return res.failure(function.check_args(function.arity, args, context, call_node))
+            exec_ctx = new_frame(function.name, context, call_node.pos_start, function.scope)
+            # Arguments occupy the first slots of the frame
+            exec_ctx.slots[:len(args)] = args
+            try:
+                if nested_calls < MAX_NESTED_CALLS:
+                    nested_calls += 1
+                    try:
+                        value = function.interpreter.execute_body(function, exec_ctx, res)
+                    finally:
+                        nested_calls -= 1
+                else:
+                    value = function.interpreter.execute_deep(function, exec_ctx, res)
+            except RecursionError:
+                return res.failure(RTError(call_node.pos_start, call_node.pos_end, 'Maximum recursion depth exceeded', context))
+            if value is None:
+                return res
+            if value.__class__ is not TailCall:
+                release_frames(exec_ctx, caller)
+                return res.success(value)
+            context, args, call_node = exec_ctx, value.args, value.call_node
+            function = value.function
+            if not isinstance(function, Function):
+                res = box(function).execute(args, context, call_node)
+                if not res.should_return():
+                    release_frames(exec_ctx, caller)
+                return res
 
     def copy(self):
         c = Function(self.name, self.body_node, self.arg_names, self.should_auto_return)
+        c.code = self.code
+        c.interpreter = self.interpreter
+        c.scope = self.scope
+        c.definition = self.definition
+        c.compiled = self.compiled
         c.set_context(self.context)
         c.set_pos(self.pos_start, self.pos_end)
         return c
@@ -326,33 +811,33 @@ class Function(BaseFunction):
     def __repr__(self):
         return f"<function {self.name}>"
 
+# Native built-ins by name: (implementation, arity). An implementation
+# takes the list of argument values, the caller's context and the call node,
+# and returns (value, error) like the operation methods above. Arguments
+# are boxed, and the result unboxed, by BuiltInFunction.execute. An arity
+# of None accepts any number of arguments.
+BUILTINS = {}
+
+def builtin(name, arity=None):
+    """Register the decorated function as the built-in `name`. Register
+    before importing lrl.runner, which binds every entry as a global."""
+    def register(implementation):
+        BUILTINS[name] = (implementation, arity)
+        return implementation
+    return register
+
 class BuiltInFunction(BaseFunction):
     def __init__(self, name):
         super().__init__(name)
+        self.implementation, self.arity = BUILTINS[self.name]
 
-    def execute(self, args):
-        from .runtime import RTResult
-        res = RTResult()
-        exec_ctx = self.generate_new_context()
-        method_name = f'execute_{self.name}'
-        method = getattr(self, method_name, self.no_visit_method)
-        # Support varargs when method.arg_names is None
-        if getattr(method, 'arg_names', []) is None:
-            # populate arg0, arg1, ... without count checking
-            for index, argument in enumerate(args):
-                argument.set_context(exec_ctx)
-                exec_ctx.symbol_table.set(f'arg{index}', argument)
-        else:
-            res.register(self.check_and_populate_args(method.arg_names, args, exec_ctx))
-            if res.should_return():
-                return res
-        return_value = res.register(method(exec_ctx))
-        if res.should_return():
-            return res
-        return res.success(return_value)
-
-    def no_visit_method(self, node, context):
-        raise Exception(f'No execute_{self.name} method defined')
+    def execute(self, args, context, call_node):
+        if self.arity is not None and len(args) != self.arity:
+            return RTResult().failure(self.check_args(self.arity, args, context, call_node))
+        value, error = self.implementation([box(arg) for arg in args], context, call_node)
+        if error:
+            return RTResult().failure(error)
+        return RTResult().success(unbox(value))
 
     def copy(self):
         c = BuiltInFunction(self.name)
@@ -363,80 +848,165 @@ class BuiltInFunction(BaseFunction):
     def __repr__(self):
         return f"<built-in function {self.name}>"
 
-    # Builtins
-    def execute_say(self, exec_ctx):
-        # Print any number of arguments
-        # Args are populated as arg0, arg1, ... in exec_ctx
-        printed_values = []
-        index = 0
-        while True:
-            val = exec_ctx.symbol_table.get(f'arg{index}')
-            if val is None:
-                break
-            printed_values.append(str(val))
-            index += 1
-        output = " ".join(printed_values)
-        # Emit SAY_OUTPUT marker so the UI can pause execution
-        print(f"SAY_OUTPUT:{output}", flush=True)
-        
-        # Wait for a continue signal from the UI (read one line from stdin)
-        # This blocks the Python process until the user clicks Continue
-        try:
-            sys.stdin.readline()
-        except:
-            pass  # If stdin is closed, just continue
-        
-        from .runtime import RTResult
-        return RTResult().success(Number.null)
-    execute_say.arg_names = None  # None means varargs
-
-    def execute_get_int(self, exec_ctx):
-        return self._read_from_stdin(exec_ctx, prompt_type="int")
-    execute_get_int.arg_names = ['arg0']
-
-    def execute_get_float(self, exec_ctx):
-        return self._read_from_stdin(exec_ctx, prompt_type="float")
-    execute_get_float.arg_names = ['arg0']
-
-    def execute_get_string(self, exec_ctx):
-        return self._read_from_stdin(exec_ctx, prompt_type="string")
-    execute_get_string.arg_names = ['arg0']
-
-    def _success_number(self, number):
-        from .runtime import RTResult
-        return RTResult().success(Number(number))
-
-    def _read_from_stdin(self, exec_ctx, prompt_type="string"):
-        from .runtime import RTResult
-
-        prompt_value = exec_ctx.symbol_table.get('arg0')
-        prompt_text = str(prompt_value) if prompt_value is not None else ""
-        request_payload = f"{prompt_type}:{prompt_text}"
-        print(f"INPUT_REQUEST:{request_payload}", flush=True)
+# Builtins
+@builtin('say')
+def builtin_say(args, context, call_node):
+    # Print any number of arguments
+    output = " ".join(str(value) for value in args)
+    # Emit SAY_OUTPUT marker so the UI can pause execution
+    print(f"SAY_OUTPUT:{output}", flush=True)
 
-        while True:
-            user_input = sys.stdin.readline()
-            if user_input == "":
-                return RTResult().failure(
-                    RTError(self.pos_start, self.pos_end, "No input received; stream closed.", self.context)
-                )
-
-            value = user_input.rstrip("\r\n")
-
-            if prompt_type == "int":
-                try:
-                    return self._success_number(int(value))
-                except ValueError:
-                    print(f"Invalid integer: {value}", flush=True)
-                    print(f"INPUT_REQUEST:{request_payload}", flush=True)
-            elif prompt_type == "float":
-                try:
-                    return RTResult().success(Number(float(value)))
-                except ValueError:
-                    print(f"Invalid float: {value}", flush=True)
-                    print(f"INPUT_REQUEST:{request_payload}", flush=True)
-            else:
-                return RTResult().success(String(value))
+    # Wait for a continue signal from the UI (read one line from stdin)
+    # This blocks the Python process until the user clicks Continue
+    try:
+        sys.stdin.readline()
+    except:
+        pass  # If stdin is closed, just continue
+
+    return Number.null, None
+
+@builtin('get_int', 1)
+def builtin_get_int(args, context, call_node):
+    return read_from_stdin(args, context, call_node, prompt_type="int")
+
+@builtin('get_float', 1)
+def builtin_get_float(args, context, call_node):
+    return read_from_stdin(args, context, call_node, prompt_type="float")
+
+@builtin('get_string', 1)
+def builtin_get_string(args, context, call_node):
+    return read_from_stdin(args, context, call_node, prompt_type="string")
+
+def read_from_stdin(args, context, call_node, prompt_type="string"):
+    prompt_text = str(args[0])
+    request_payload = f"{prompt_type}:{prompt_text}"
+    print(f"INPUT_REQUEST:{request_payload}", flush=True)
+
+    while True:
+        user_input = sys.stdin.readline()
+        if user_input == "":
+            return None, RTError(call_node.pos_start, call_node.pos_end, "No input received; stream closed.", context)
+
+        value = user_input.rstrip("\r\n")
+
+        if prompt_type == "int":
+            try:
+                return Number(int(value)), None
+            except ValueError:
+                print(f"Invalid integer: {value}", flush=True)
+                print(f"INPUT_REQUEST:{request_payload}", flush=True)
+        elif prompt_type == "float":
+            try:
+                return Number(float(value)), None
+            except ValueError:
+                print(f"Invalid float: {value}", flush=True)
+                print(f"INPUT_REQUEST:{request_payload}", flush=True)
+        else:
+            return String(value), None
+
+# Numeric arrays
+
+def numbers_of(value, context, call_node):
+    """The Python numbers in Array or List `value`, for the array built-ins."""
+    if isinstance(value, Array):
+        return value.values, None
+    if isinstance(value, List) and all(element.__class__ is int or element.__class__ is float
+                                       for element in value.elements):
+        return value.elements, None
+    return None, RTError(call_node.pos_start, call_node.pos_end, 'Expected an array or a list of numbers', context)
+
+@builtin('array', 1)
+def builtin_array(args, context, call_node):
+    values, error = numbers_of(args[0], context, call_node)
+    if error: return None, error
+    try:
+        return Array(number_array(values)), None
+    except OverflowError:
+        return None, RTError(call_node.pos_start, call_node.pos_end, 'Array element out of range', context)
+
+@builtin('to_list', 1)
+def builtin_to_list(args, context, call_node):
+    values, error = numbers_of(args[0], context, call_node)
+    if error: return None, error
+    return List(list(values)), None
+
+@builtin('sum', 1)
+def builtin_sum(args, context, call_node):
+    values, error = numbers_of(args[0], context, call_node)
+    if error: return None, error
+    return Number(sum(values)), None
+
+@builtin('min', 1)
+def builtin_min(args, context, call_node):
+    return extreme(min, args, context, call_node)
+
+@builtin('max', 1)
+def builtin_max(args, context, call_node):
+    return extreme(max, args, context, call_node)
+
+@builtin('mean', 1)
+def builtin_mean(args, context, call_node):
+    values, error = numbers_of(args[0], context, call_node)
+    if error: return None, error
+    if not values:
+        return None, RTError(call_node.pos_start, call_node.pos_end, 'Mean of an empty array', context)
+    return Number(sum(values) / len(values)), None
+
+def extreme(function, args, context, call_node):
+    values, error = numbers_of(args[0], context, call_node)
+    if error: return None, error
+    if not values:
+        return None, RTError(call_node.pos_start, call_node.pos_end, f'{function.__name__.capitalize()} of an empty array', context)
+    return Number(function(values)), None
+
+@builtin('dot', 2)
+def builtin_dot(args, context, call_node):
+    left, error = numbers_of(args[0], context, call_node)
+    if error: return None, error
+    right, error = numbers_of(args[1], context, call_node)
+    if error: return None, error
+    if len(left) != len(right):
+        return None, RTError(call_node.pos_start, call_node.pos_end,
+                             f'Array lengths differ ({len(left)} and {len(right)})', context)
+    return Number(sum(map(operator.mul, left, right))), None
+
+# Dicts and sets
+
+@builtin('set', 1)
+def builtin_set(args, context, call_node):
+    elements = args[0]
+    if isinstance(elements, List):
+        keys = [key_of(element) for element in elements.elements]
+        if None not in keys:
+            return Set(dict.fromkeys(keys)), None
+    return None, RTError(call_node.pos_start, call_node.pos_end, 'Expected a list of numbers and strings', context)
+
+@builtin('keys', 1)
+def builtin_keys(args, context, call_node):
+    collection = args[0]
+    if isinstance(collection, (Dict, Set)):
+        return List([key for key, entry in collection.entries.items()]), None
+    return None, RTError(call_node.pos_start, call_node.pos_end, 'Expected a dict or a set', context)
+
+@builtin('values', 1)
+def builtin_values(args, context, call_node):
+    collection = args[0]
+    if isinstance(collection, Dict):
+        return List([value for key, value in collection.entries.items()]), None
+    return None, RTError(call_node.pos_start, call_node.pos_end, 'Expected a dict', context)
+
+@builtin('len', 1)
+def builtin_len(args, context, call_node):
+    collection = args[0]
+    if isinstance(collection, String):
+        return Number(collection.length if collection.parts is not None else len(collection.value)), None
+    if isinstance(collection, List):
+        return Number(len(collection.elements)), None
+    if isinstance(collection, (Dict, Set)):
+        return Number(len(collection.entries)), None
+    if isinstance(collection, Array):
+        return Number(len(collection.values)), None
+    return None, RTError(call_node.pos_start, call_node.pos_end, 'Expected a string, list, array, dict or set', context)
 
 # Predeclare builtins we need
 BuiltInFunction.say = BuiltInFunction('say')
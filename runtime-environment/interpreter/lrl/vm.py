@@ -0,0 +1,389 @@
+from itertools import repeat
+from .tokens import TT_MINUS, TT_KEYWORD
+from .bytecode import *
+from .values import Number, List, Dict, Set, Function, box, NUMBER_TYPES, SCALAR_TYPES
+from .runtime import BreakSignal, ContinueSignal, new_frame, release_frames
+from .errors import RTError
+from .interpreter import loop_range, literal_entries, FAST_BINARY, FAST_UNARY, QUICKEN_THRESHOLD, MAX_DEOPTS
+from .compiler import BINARY_OPCODE_ARGS, function_code
+from .operations import BINARY_FUNCTIONS, OPERATION_ERRORS, op_neg, op_not
+
+# lrl.operations helpers by BINARY_OP argument
+BINARY_OP_FUNCTIONS = {arg: BINARY_FUNCTIONS[key] for key, arg in BINARY_OPCODE_ARGS.items()}
+# Fast paths by BINARY_OP argument and by unary opcode
+FAST_BINARY_OPS = {arg: FAST_BINARY[key] for key, arg in BINARY_OPCODE_ARGS.items()}
+FAST_UNARY_OPS = {UNARY_NEG: FAST_UNARY[TT_MINUS], UNARY_NOT: FAST_UNARY[(TT_KEYWORD, 'not')]}
+
+class Frame:
+    def __init__(self, code, ip, stack, context):
+        self.code = code
+        self.ip = ip
+        self.stack = stack
+        self.context = context
+
+class VM:
+    """Runs Code objects produced by lrl.compiler.Compiler.
+
+    User function calls push a Frame instead of recursing in Python, except
+    calls in tail position, which reuse the caller's place on the stack. Values
+    are not stamped with positions on the hot path; when an operation fails
+    the offending instruction's node is looked up in the line table and the
+    error is rebuilt with the same positions the tree-walking Interpreter
+    reports.
+
+    Operator instructions are quickened like the interpreter's operator
+    nodes: once one has seen the same operand types QUICKEN_THRESHOLD times
+    in a row it is rewritten to BINARY_OP_QUICK or UNARY_QUICK, which guard
+    on those types and use the fast path, and rewritten back when the guard
+    fails.
+
+    A tree-walking interpreter hands the VM the calls it nests too deep for
+    the Python stack (see execute_body). That VM compiles the interpreter's
+    functions as it first calls them, and the functions it makes belong to
+    the interpreter, as if the interpreter had made them.
+    """
+
+    def __init__(self, interpreter=None):
+        # The tree-walking interpreter this VM runs deep calls for, if any
+        self.interpreter = interpreter
+
+    def execute_body(self, function, exec_ctx, res):
+        """Run the body of user `function` in its frame `exec_ctx`, called
+        like Interpreter.execute_body: returns the call's value, or None with
+        the error left in `res`. A break or continue that leaves the call
+        without reaching a loop is raised as BreakSignal or ContinueSignal."""
+        code = function.code
+        if code is None:
+            code = function.code = function_code(function.definition)
+        value, error = self.run(code, exec_ctx)
+        if error:
+            res.failure(error)
+            return None
+        return value
+
+    def run(self, code, context):
+        frames = []
+        instructions = code.instructions
+        consts = code.consts
+        names = code.names
+        cells = code.cells
+        stack = []
+        slots = context.slots
+        ip = 0
+
+        while True:
+            op = instructions[ip]
+            arg = instructions[ip + 1]
+            ip += 2
+
+            if op == LOAD_FAST:
+                value = slots[arg]
+                if value is None:
+                    value = context.lookup(code.scope.names[arg])
+                    if value is None:
+                        return None, self.name_error(code, ip, context)
+                stack.append(value)
+
+            elif op == LOAD_CONST:
+                stack.append(consts[arg])
+
+            elif op == LOAD_GLOBAL:
+                value = cells[arg].value
+                if value is None:
+                    value = context.lookup(names[arg])
+                    if value is None:
+                        return None, self.name_error(code, ip, context)
+                stack.append(value)
+
+            elif op == STORE_FAST:
+                slots[arg] = stack[-1]
+
+            elif op == STORE_GLOBAL:
+                cells[arg].value = stack[-1]
+
+            elif op == LOAD_DYNAMIC:
+                value = context.lookup(names[arg])
+                if value is None:
+                    return None, self.name_error(code, ip, context)
+                stack.append(value)
+
+            elif op == POP_TOP:
+                stack.pop()
+
+            elif op == BINARY_OP:
+                right = stack.pop()
+                left = stack[-1]
+                try:
+                    stack[-1] = BINARY_OP_FUNCTIONS[arg](left, right)
+                except OPERATION_ERRORS:
+                    return None, self.binary_error(code.node_at(ip - 2), BINARY_OPERATORS[arg], left, right, context)
+                site = code.feedback.get(ip - 2)
+                if site is None or site.warmup:
+                    self.observe(code, ip - 2, left.__class__, right.__class__)
+
+            elif op == BINARY_OP_QUICK:
+                site = code.quick[arg]
+                right = stack.pop()
+                left = stack[-1]
+                if left.__class__ is site.left_type and right.__class__ is site.right_type:
+                    result = site.fast(left, right)
+                    if result is not None:
+                        stack[-1] = result
+                        continue
+                else:
+                    self.deoptimise(code, ip - 2, site)
+                try:
+                    stack[-1] = BINARY_OP_FUNCTIONS[site.arg](left, right)
+                except OPERATION_ERRORS:
+                    return None, self.binary_error(code.node_at(ip - 2), BINARY_OPERATORS[site.arg], left, right, context)
+
+            elif op == POP_JUMP_IF_FALSE:
+                value = stack.pop()
+                # is_true(), inline
+                if not (value if value.__class__ in SCALAR_TYPES else value.is_true()):
+                    ip = arg
+
+            elif op == JUMP:
+                ip = arg
+
+            elif op == JUMP_IF_FALSE_NUMBER:
+                value = stack[-1]
+                if value.__class__ in NUMBER_TYPES and value == 0:
+                    stack[-1] = int(value)
+                    ip = arg
+
+            elif op == JUMP_IF_TRUE_NUMBER:
+                value = stack[-1]
+                if value.__class__ in NUMBER_TYPES and value != 0:
+                    stack[-1] = int(value)
+                    ip = arg
+
+            elif op == FOR_ITER:
+                i = next(stack[-1], None)
+                if i is None:
+                    ip = arg
+                else:
+                    stack.append(i)
+
+            elif op == CALL:
+                argc, call_node = consts[arg]
+                if argc:
+                    args = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    args = []
+                value_to_call = stack.pop()
+                if isinstance(value_to_call, Function):
+                    callee = value_to_call.code
+                    if callee is None and value_to_call.definition is not None:
+                        # Made by the tree-walking interpreter; see execute_body
+                        callee = value_to_call.code = function_code(value_to_call.definition)
+                else:
+                    callee = None
+                if callee is not None:
+                    if argc != value_to_call.arity:
+                        return None, value_to_call.check_args(value_to_call.arity, args, context, call_node)
+                    # A call followed by a return is a tail call: the callee
+                    # returns straight to our caller, so no frame is kept
+                    if instructions[ip] != RETURN_VALUE or not code.is_function:
+                        frames.append(Frame(code, ip, stack, context))
+                    context = new_frame(value_to_call.name, context, call_node.pos_start, callee.scope)
+                    slots = context.slots
+                    slots[:argc] = args
+                    code = callee
+                    instructions = code.instructions
+                    consts = code.consts
+                    names = code.names
+                    cells = code.cells
+                    stack = []
+                    ip = 0
+                else:
+                    res = box(value_to_call).execute(args, context, call_node)
+                    if res.error:
+                        return None, res.error
+                    stack.append(res.value)
+
+            elif op == RETURN_VALUE:
+                value = stack.pop()
+                if not frames:
+                    return value, None
+                frame = frames.pop()
+                release_frames(context, frame.context)
+                code = frame.code
+                instructions = code.instructions
+                consts = code.consts
+                names = code.names
+                cells = code.cells
+                stack = frame.stack
+                context = frame.context
+                slots = context.slots
+                ip = frame.ip
+                stack.append(value)
+
+            elif op == LIST_APPEND:
+                value = stack.pop()
+                # The loop's List is not visible to the program until the
+                # loop ends, so its storage can be grown in place
+                elements = stack[-arg].elements
+                elements.items.append(value)
+                elements.stop += 1
+
+            elif op == BUILD_LIST:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                stack.append(List(elements))
+
+            elif op == BUILD_DICT:
+                base = len(stack) - 2 * arg
+                entries, error = literal_entries(code.node_at(ip - 2), stack[base::2], stack[base + 1::2], context)
+                if error:
+                    return None, error
+                del stack[base:]
+                stack.append(Dict(entries))
+
+            elif op == BUILD_SET:
+                base = len(stack) - arg
+                entries, error = literal_entries(code.node_at(ip - 2), stack[base:], repeat(None), context)
+                if error:
+                    return None, error
+                del stack[base:]
+                stack.append(Set(entries))
+
+            elif op == LOOP_ESCAPE:
+                while True:
+                    if not frames:
+                        # No caller here is in a loop: leave it to whoever
+                        # called run, which ends the program if no caller is
+                        raise ContinueSignal() if arg else BreakSignal()
+                    frame = frames.pop()
+                    release_frames(context, frame.context)
+                    context = frame.context
+                    # The call was made by the instruction before the return address
+                    loop = frame.code.loop_at(frame.ip - 2)
+                    if loop is not None:
+                        break
+                code = frame.code
+                instructions = code.instructions
+                consts = code.consts
+                names = code.names
+                cells = code.cells
+                stack = frame.stack
+                del stack[loop[2]:]
+                slots = context.slots
+                ip = loop[3] if arg else loop[4]
+
+            elif op == NEW_LIST:
+                stack.append(List([]))
+
+            elif op == UNARY_NEG:
+                number = stack[-1]
+                try:
+                    stack[-1] = op_neg(number)
+                except OPERATION_ERRORS:
+                    number = self.stamp(number, code.node_at(ip - 2).node, context)
+                    return None, number.multed_by(Number(-1))[1]
+                site = code.feedback.get(ip - 2)
+                if site is None or site.warmup:
+                    self.observe(code, ip - 2, number.__class__)
+
+            elif op == UNARY_NOT:
+                number = stack[-1]
+                try:
+                    stack[-1] = op_not(number)
+                except OPERATION_ERRORS:
+                    number = self.stamp(number, code.node_at(ip - 2).node, context)
+                    return None, number.notted()[1]
+                site = code.feedback.get(ip - 2)
+                if site is None or site.warmup:
+                    self.observe(code, ip - 2, number.__class__)
+
+            elif op == UNARY_QUICK:
+                site = code.quick[arg]
+                number = stack[-1]
+                if number.__class__ is site.left_type:
+                    stack[-1] = site.fast(number)
+                    continue
+                self.deoptimise(code, ip - 2, site)
+                # Run the generic instruction that was put back
+                ip -= 2
+
+            elif op == FOR_PREP:
+                step_value = stack.pop()
+                end_value = stack.pop()
+                start_value = stack.pop()
+                stack.append(iter(loop_range(start_value, end_value, step_value)))
+
+            elif op == POP_TO:
+                del stack[arg:]
+
+            elif op == MAKE_FUNCTION:
+                func_code = consts[arg]
+                func_node = func_code.func_node
+                if self.interpreter is not None:
+                    func_value = self.interpreter.make_function(func_node)
+                else:
+                    func_value = Function(
+                        func_node.var_name_tok.value if func_node.var_name_tok else None,
+                        func_node.body_node,
+                        func_code.arg_names,
+                        func_node.should_auto_return
+                    )
+                    func_value.scope = func_code.scope
+                func_value.code = func_code
+                stack.append(func_value)
+
+            else:
+                raise Exception(f'Unknown opcode {op}')
+
+    def observe(self, code, offset, left_type, right_type=None):
+        """Record the operand types of the operator instruction at `offset`
+        and quicken it once they have been the same QUICKEN_THRESHOLD times
+        in a row."""
+        instructions = code.instructions
+        site = code.feedback.get(offset)
+        if site is None:
+            site = code.feedback[offset] = Site(instructions[offset], instructions[offset + 1], QUICKEN_THRESHOLD)
+        if left_type is not site.left_type or right_type is not site.right_type:
+            site.left_type, site.right_type = left_type, right_type
+            site.warmup = QUICKEN_THRESHOLD
+            return
+        site.warmup -= 1
+        if site.warmup:
+            return
+        if site.opcode == BINARY_OP:
+            fast = FAST_BINARY_OPS[site.arg].get((left_type, right_type))
+        else:
+            fast = FAST_UNARY_OPS[site.opcode].get(left_type)
+        if fast is None:
+            return
+        site.fast = fast
+        if site.index is None:
+            site.index = len(code.quick)
+            code.quick.append(site)
+        instructions[offset] = BINARY_OP_QUICK if site.opcode == BINARY_OP else UNARY_QUICK
+        instructions[offset + 1] = site.index
+
+    def deoptimise(self, code, offset, site):
+        code.instructions[offset] = site.opcode
+        code.instructions[offset + 1] = site.arg
+        site.fast = None
+        site.left_type = site.right_type = None
+        site.deopts += 1
+        site.warmup = QUICKEN_THRESHOLD if site.deopts < MAX_DEOPTS else 0
+
+    def name_error(self, code, ip, context):
+        node = code.node_at(ip - 2)
+        return RTError(node.pos_start, node.pos_end, f"'{node.var_name_tok.value}' is not defined", context)
+
+    def stamp(self, value, node, context):
+        return box(value).copy().set_pos(node.pos_start, node.pos_end).set_context(context)
+
+    def binary_error(self, node, method_name, left, right, context):
+        # Errors are rare, so redo the operation on Value copies carrying the
+        # operand positions instead of stamping every value up front.
+        left = self.stamp(left, node.left_node, context)
+        right = self.stamp(right, node.right_node, context)
+        return getattr(left, method_name)(right)[1]